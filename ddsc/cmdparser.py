@@ -4,6 +4,7 @@ Command line parser for the application.
 import os
 import argparse
 import six
+from ddsc.core.shard import Shard
 
 AZURE_DESCRIPTION_STR = "DukeDSClient ({}) Manage projects/folders/files in an Azure Blob Storage"
 LEGACY_DESCRIPTION_STR = "DukeDSClient ({}) Manage projects/folders/files in the duke-data-service"
@@ -87,6 +88,18 @@ def _paths_must_exists(path):
     return path
 
 
+def _shard_str(value):
+    """
+    Parse a shard in i/N format.
+    :param value: str value to parse
+    :return: Shard
+    """
+    try:
+        return Shard.parse(to_unicode(value))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
 def format_destination_path(path):
     """
     Formats command line destination path.
@@ -109,14 +122,15 @@ def _path_has_ok_chars(path):
     return path
 
 
-def _add_folders_positional_arg(arg_parser):
+def _add_folders_positional_arg(arg_parser, required=True):
     """
     Adds folders and/or filenames parameter to a parser.
     :param arg_parser: ArgumentParser parser to add this argument to.
+    :param required: bool: must at least one file or folder be specified
     """
     arg_parser.add_argument("folders",
                             metavar='Folders',
-                            nargs="+",
+                            nargs="+" if required else "*",
                             help="Names of the files and/or folders to upload to the remote project.",
                             type=_paths_must_exists)
 
@@ -308,6 +322,68 @@ def _add_dry_run(arg_parser, help_text):
                             dest='dry_run')
 
 
+def _add_dedupe_arg(arg_parser):
+    """
+    Adds optional --dedupe parameter to a parser. Stored as 'dedupe'.
+    :param arg_parser: ArgumentParser parser to add this argument to.
+    """
+    arg_parser.add_argument("--dedupe",
+                            help="Download files with identical contents once creating the other copies "
+                                 "locally using hard links, reflinks or file copies.",
+                            action='store_true',
+                            default=False,
+                            dest='dedupe')
+
+
+def _add_shard_arg(arg_parser, help_text):
+    """
+    Adds optional --shard parameter to a parser. Stored as 'shard'.
+    :param arg_parser: ArgumentParser parser to add this argument to.
+    :param help_text: str label displayed in usage
+    """
+    arg_parser.add_argument("--shard",
+                            metavar='i/N',
+                            help=help_text,
+                            type=_shard_str,
+                            default=None,
+                            dest='shard')
+
+
+def _add_upload_plan_args(arg_parser):
+    """
+    Adds optional --write-plan and --plan parameters to a parser. Stored as 'write_plan' and 'plan'.
+    :param arg_parser: ArgumentParser parser to add these arguments to.
+    """
+    plan_group = arg_parser.add_mutually_exclusive_group()
+    plan_group.add_argument("--write-plan",
+                            metavar='PlanFile',
+                            help="Create the project and folders without uploading any files then write a plan "
+                                 "file that hosts can upload the files with using --plan.",
+                            type=to_unicode,
+                            default=None,
+                            dest='write_plan')
+    plan_group.add_argument("--plan",
+                            metavar='PlanFile',
+                            help="Upload the files listed in a plan file created by --write-plan. "
+                                 "Do not specify a project or files/folders with this option.",
+                            type=_paths_must_exists,
+                            default=None,
+                            dest='plan')
+
+
+def _add_verify_arg(arg_parser):
+    """
+    Adds optional --verify parameter to a parser. Stored as 'verify'.
+    :param arg_parser: ArgumentParser parser to add this argument to.
+    """
+    arg_parser.add_argument("--verify",
+                            help="Rehash files that already exist in the folder instead of trusting the record "
+                                 "of previous downloads.",
+                            action='store_true',
+                            default=False,
+                            dest='verify')
+
+
 def _skip_config_file_permission_check(arg_parser):
     """
     Adds optional follow_symlinks parameter to a parser.
@@ -390,10 +466,17 @@ class CommandParser(object):
         upload_parser = self.subparsers.add_parser('upload', description=description)
         _add_dry_run(upload_parser, help_text="Instead of uploading displays a list of folders/files that "
                                               "need to be uploaded.")
-        add_project_name_or_id_arg(upload_parser, help_text_suffix="upload files/folders to.")
+        # Projects and folders come from the plan file when uploading with --plan
+        add_project_name_or_id_arg(upload_parser, required=self.azure_mode,
+                                   help_text_suffix="upload files/folders to.")
         self._add_azure_container_arg(upload_parser)
-        _add_folders_positional_arg(upload_parser)
+        _add_folders_positional_arg(upload_parser, required=self.azure_mode)
         _add_follow_symlinks_arg(upload_parser)
+        if not self.azure_mode:
+            _add_upload_plan_args(upload_parser)
+            _add_shard_arg(upload_parser, help_text="Only upload shard i of N (numbered from 1) of the files in the "
+                                                    "plan file so N hosts can each upload a different part of the "
+                                                    "project.")
         upload_parser.add_argument(
             "--no-check",
             help="Skip checking/waiting for uploaded files to be in the valid/downloadable state.",
@@ -447,6 +530,11 @@ class CommandParser(object):
         include_or_exclude = download_parser.add_mutually_exclusive_group(required=False)
         _add_include_arg(include_or_exclude)
         _add_exclude_arg(include_or_exclude)
+        _add_verify_arg(download_parser)
+        _add_dedupe_arg(download_parser)
+        _add_shard_arg(download_parser, help_text="Only download shard i of N (numbered from 1) so N hosts can "
+                                                  "each download a different part of the project into a shared "
+                                                  "folder.")
         download_parser.set_defaults(func=download_func)
 
     def register_share_command(self, share_func):
@@ -21,12 +21,33 @@ AZ_DELIVERY_URL = 'https://datadelivery.genome.duke.edu/api/v2'
 MB_TO_BYTES = 1024 * 1024
 DDS_DEFAULT_UPLOAD_CHUNKS = 100 * MB_TO_BYTES
 DDS_DEFAULT_DOWNLOAD_CHUNK_SIZE = 20 * MB_TO_BYTES
+DDS_DEFAULT_DOWNLOAD_SPLIT_THRESHOLD = 1024 * MB_TO_BYTES
+DDS_DEFAULT_DOWNLOAD_SEGMENT_SIZE = 256 * MB_TO_BYTES
+DEFAULT_DOWNLOAD_SEGMENT_WORKERS = 4
+DEFAULT_DOWNLOAD_FSYNC_BATCH_SIZE = 0  # don't fsync downloaded files
+DEFAULT_DOWNLOAD_SCHEDULE_WINDOW = 1000  # files held waiting for a download worker so the largest start first
+DEFAULT_DOWNLOAD_BATCH_SIZE = 10
+DDS_DEFAULT_DOWNLOAD_BATCH_FILE_SIZE = 1 * MB_TO_BYTES
 AUTH_ENV_KEY_NAME = 'DUKE_DATA_SERVICE_AUTH'
-# when uploading skip .DS_Store, our key file, and ._ (resource fork metadata)
-FILE_EXCLUDE_REGEX_DEFAULT = '^\.DS_Store$|^\.ddsclient$|^\.\_'
+# when uploading skip .DS_Store, our key file, download records and ._ (resource fork metadata)
+FILE_EXCLUDE_REGEX_DEFAULT = r'^\.DS_Store$|^\.ddsclient$|^\.ddsclient-download-manifest.*\.jsonl$|' \
+                             r'^\.ddsclient-download-summary-.*\.json$|^\.ddsclient-download-verification.*\.md5$|' \
+                             r'^\.\_'
 MAX_DEFAULT_WORKERS = 8
 GET_PAGE_SIZE_DEFAULT = 100  # fetch 100 items per page
+GET_PAGE_LOOKAHEAD_DEFAULT = 4  # fetch up to 4 pages at a time when listing all project files
+GET_CACHE_TTL_DEFAULT = 0  # don't reuse GET responses
+GET_CACHE_SIZE_DEFAULT = 256
+PROJECT_INDEX_TTL_DEFAULT = 5 * 60  # find projects by name using an index refreshed within the last five minutes
+AUTH_TOKEN_CACHE_DEFAULT = True  # reuse an unexpired auth token saved by a previous command
+HTTP_POOL_MAXSIZE_DEFAULT = 10  # connections kept open to each host
+HTTP_CONNECT_TIMEOUT_DEFAULT = 15  # seconds to wait for a connection to be established
+HTTP_READ_TIMEOUT_DEFAULT = 5 * 60  # seconds to wait for the server to send data before giving up on a request
+HTTP_KEEP_ALIVE_DEFAULT = True  # reuse connections between requests
+HTTP_TCP_NODELAY_DEFAULT = True  # send small requests immediately instead of waiting to fill a packet
 DEFAULT_FILE_DOWNLOAD_RETRIES = 5
+DEFAULT_DOWNLOAD_URL_TTL = 60 * 60  # assume download urls expire an hour after they are issued
+DEFAULT_DOWNLOAD_URL_REFRESH_MARGIN = 5 * 60  # refresh download urls that expire within five minutes
 
 
 def get_user_config_filename():
@@ -75,13 +96,35 @@ class Config(object):
     UPLOAD_WORKERS = 'upload_workers'                  # how many worker processes used for uploading
     DOWNLOAD_WORKERS = 'download_workers'              # how many worker processes used for downloading
     DOWNLOAD_BYTES_PER_CHUNK = 'download_bytes_per_chunk'  # bytes per chunk we will download
+    DOWNLOAD_SPLIT_THRESHOLD = 'download_split_threshold'  # files this size or larger are downloaded in segments
+    DOWNLOAD_SEGMENT_SIZE = 'download_segment_size'    # bytes per segment when downloading a large file
+    DOWNLOAD_SEGMENT_WORKERS = 'download_segment_workers'  # concurrent range requests used for a large file
+    DOWNLOAD_PREALLOCATE = 'download_preallocate'      # reserve disk space for files before downloading them
+    DOWNLOAD_FSYNC_BATCH_SIZE = 'download_fsync_batch_size'  # number of downloaded files to fsync together
+    DOWNLOAD_SCHEDULE_WINDOW = 'download_schedule_window'  # files waiting for a worker that are ordered by size
+    DOWNLOAD_BATCH_SIZE = 'download_batch_size'        # number of small files downloaded by one worker task
+    DOWNLOAD_BATCH_FILE_SIZE = 'download_batch_file_size'  # files this size or smaller are downloaded in batches
     DEBUG_MODE = 'debug'                               # show stack traces
     D4S2_URL = 'd4s2_url'                              # url for use with the D4S2 (share/deliver service)
     DELIVERY_TOKEN = 'delivery_token'                  # Token to authenticate with D4S2
     FILE_EXCLUDE_REGEX = 'file_exclude_regex'          # allows customization of which filenames will be uploaded
     GET_PAGE_SIZE = 'get_page_size'                    # page size used for GET pagination requests
+    GET_PAGE_LOOKAHEAD = 'get_page_lookahead'          # number of concurrent GET requests when listing
+    GET_CACHE_TTL = 'get_cache_ttl'                    # seconds a command can reuse a GET response (0 disables)
+    GET_CACHE_SIZE = 'get_cache_size'                  # maximum number of GET responses a command keeps
+    PROJECT_INDEX_TTL = 'project_index_ttl'            # seconds the saved project name index is used (0 disables)
+    AUTH_TOKEN_CACHE = 'auth_token_cache'              # save auth tokens for use by later commands
+    HTTP_POOL_MAXSIZE = 'http_pool_maxsize'            # connections kept open to each host
+    HTTP_CONNECT_TIMEOUT = 'http_connect_timeout'      # seconds to wait when connecting (null waits forever)
+    HTTP_READ_TIMEOUT = 'http_read_timeout'            # seconds to wait for data from a server (null waits forever)
+    HTTP_KEEP_ALIVE = 'http_keep_alive'                # reuse connections between requests
+    HTTP_TCP_NODELAY = 'http_tcp_nodelay'              # disable Nagle's algorithm on connections
+    HTTP_SOCKET_SEND_BUFFER_SIZE = 'http_socket_send_buffer_size'  # SO_SNDBUF for connections (default from OS)
+    HTTP_SOCKET_RECEIVE_BUFFER_SIZE = 'http_socket_receive_buffer_size'  # SO_RCVBUF for connections (default from OS)
     STORAGE_PROVIDER_ID = 'storage_provider_id'        # setting to override the default storage provider
     FILE_DOWNLOAD_RETRIES = 'file_download_retries'    # number of times to retry a failed file download
+    DOWNLOAD_URL_TTL = 'download_url_ttl'              # seconds a download url is valid when the url doesn't say
+    DOWNLOAD_URL_REFRESH_MARGIN = 'download_url_refresh_margin'  # refresh urls expiring within this many seconds
     AZURE_STORAGE_ACCOUNT = 'azure_storage_account'    # Azure Storage Account Name
     AZURE_CONTAINER_NAME = 'azure_container_name'      # Container/Bucket/FileSystem name within the Azure Storage Account
     AZURE_DELIVERY_URL = 'azure_delivery_url'          # Azure Data Delivery URL
@@ -182,6 +225,75 @@ class Config(object):
     def download_bytes_per_chunk(self):
         return self.values.get(Config.DOWNLOAD_BYTES_PER_CHUNK, DDS_DEFAULT_DOWNLOAD_CHUNK_SIZE)
 
+    @property
+    def download_split_threshold(self):
+        """
+        Return the file size at which a file will be downloaded in segments using concurrent HTTP Range requests.
+        :return: int: size in bytes, 0 disables segmented downloads
+        """
+        value = self.values.get(Config.DOWNLOAD_SPLIT_THRESHOLD, DDS_DEFAULT_DOWNLOAD_SPLIT_THRESHOLD)
+        return Config.parse_bytes_str(value)
+
+    @property
+    def download_segment_size(self):
+        """
+        Return the number of bytes fetched by each HTTP Range request of a segmented download.
+        :return: int: bytes per segment
+        """
+        value = self.values.get(Config.DOWNLOAD_SEGMENT_SIZE, DDS_DEFAULT_DOWNLOAD_SEGMENT_SIZE)
+        return Config.parse_bytes_str(value)
+
+    @property
+    def download_segment_workers(self):
+        """
+        Return the number of segments of a single large file that will be downloaded at the same time.
+        :return: int: number of concurrent range requests per file
+        """
+        return self.values.get(Config.DOWNLOAD_SEGMENT_WORKERS, DEFAULT_DOWNLOAD_SEGMENT_WORKERS)
+
+    @property
+    def download_preallocate(self):
+        """
+        Return true if disk space should be reserved for a file before it is downloaded.
+        Preallocating keeps large files contiguous but can be slow on filesystems without native support.
+        :return: bool
+        """
+        return self.values.get(Config.DOWNLOAD_PREALLOCATE, True)
+
+    @property
+    def download_fsync_batch_size(self):
+        """
+        Return the number of downloaded files to flush to disk together before recording them as complete.
+        A value of 0 disables flushing downloaded files to disk.
+        :return: int: number of files per fsync batch
+        """
+        return self.values.get(Config.DOWNLOAD_FSYNC_BATCH_SIZE, DEFAULT_DOWNLOAD_FSYNC_BATCH_SIZE)
+
+    @property
+    def download_schedule_window(self):
+        """
+        Return the number of files that can wait for a free download worker. Waiting files are started largest first.
+        :return: int: number of files
+        """
+        return self.values.get(Config.DOWNLOAD_SCHEDULE_WINDOW, DEFAULT_DOWNLOAD_SCHEDULE_WINDOW)
+
+    @property
+    def download_batch_size(self):
+        """
+        Return the maximum number of small files a download worker will download in a single task.
+        :return: int: number of files per batch
+        """
+        return self.values.get(Config.DOWNLOAD_BATCH_SIZE, DEFAULT_DOWNLOAD_BATCH_SIZE)
+
+    @property
+    def download_batch_file_size(self):
+        """
+        Return the file size at or below which files are downloaded in batches.
+        :return: int: size in bytes
+        """
+        value = self.values.get(Config.DOWNLOAD_BATCH_FILE_SIZE, DDS_DEFAULT_DOWNLOAD_BATCH_FILE_SIZE)
+        return Config.parse_bytes_str(value)
+
     @property
     def debug_mode(self):
         """
@@ -231,6 +343,107 @@ class Config(object):
         """
         return self.values.get(Config.GET_PAGE_SIZE, GET_PAGE_SIZE_DEFAULT)
 
+    @property
+    def page_lookahead(self):
+        """
+        Returns the number of pages to fetch concurrently when listing all files in a project.
+        Also limits the number of concurrent permission requests made when listing projects by auth role.
+        :return: int
+        """
+        return self.values.get(Config.GET_PAGE_LOOKAHEAD, GET_PAGE_LOOKAHEAD_DEFAULT)
+
+    @property
+    def get_cache_ttl(self):
+        """
+        Returns the number of seconds a command can reuse the response of a GET request to DukeDS.
+        Responses are discarded when the command changes a related resource. 0 disables caching.
+        :return: float: seconds
+        """
+        return self.values.get(Config.GET_CACHE_TTL, GET_CACHE_TTL_DEFAULT)
+
+    @property
+    def get_cache_size(self):
+        """
+        Returns the maximum number of DukeDS GET responses a command keeps when get_cache_ttl is enabled.
+        :return: int
+        """
+        return self.values.get(Config.GET_CACHE_SIZE, GET_CACHE_SIZE_DEFAULT)
+
+    @property
+    def project_index_ttl(self):
+        """
+        Returns the number of seconds after it was refreshed that the saved index of project names can be
+        used to find a project by name. 0 disables the index.
+        :return: float: seconds
+        """
+        return self.values.get(Config.PROJECT_INDEX_TTL, PROJECT_INDEX_TTL_DEFAULT)
+
+    @property
+    def auth_token_cache(self):
+        """
+        Returns True if auth tokens should be saved in a file only the current user can read so later commands
+        can use them until they expire instead of requesting a new token.
+        :return: bool
+        """
+        return self.values.get(Config.AUTH_TOKEN_CACHE, AUTH_TOKEN_CACHE_DEFAULT)
+
+    @property
+    def http_pool_maxsize(self):
+        """
+        Returns the number of connections to each host kept open for reuse by a DukeDS API client or download worker.
+        :return: int
+        """
+        return self.values.get(Config.HTTP_POOL_MAXSIZE, HTTP_POOL_MAXSIZE_DEFAULT)
+
+    @property
+    def http_connect_timeout(self):
+        """
+        Returns how long to wait for a connection to a host to be established.
+        :return: float: seconds or None to wait forever
+        """
+        return self.values.get(Config.HTTP_CONNECT_TIMEOUT, HTTP_CONNECT_TIMEOUT_DEFAULT)
+
+    @property
+    def http_read_timeout(self):
+        """
+        Returns how long to wait for a host to send data before giving up on a request.
+        This is the time between bytes received not the total time of the request.
+        :return: float: seconds or None to wait forever
+        """
+        return self.values.get(Config.HTTP_READ_TIMEOUT, HTTP_READ_TIMEOUT_DEFAULT)
+
+    @property
+    def http_keep_alive(self):
+        """
+        Returns True if connections should be kept open and reused between requests.
+        :return: bool
+        """
+        return self.values.get(Config.HTTP_KEEP_ALIVE, HTTP_KEEP_ALIVE_DEFAULT)
+
+    @property
+    def http_tcp_nodelay(self):
+        """
+        Returns True if TCP_NODELAY should be set on connections so small requests are sent immediately.
+        :return: bool
+        """
+        return self.values.get(Config.HTTP_TCP_NODELAY, HTTP_TCP_NODELAY_DEFAULT)
+
+    @property
+    def http_socket_send_buffer_size(self):
+        """
+        Returns the size of the socket send buffer (SO_SNDBUF) to use for connections.
+        :return: int: size in bytes or 0 to use the operating system default
+        """
+        return Config.parse_bytes_str(self.values.get(Config.HTTP_SOCKET_SEND_BUFFER_SIZE, 0))
+
+    @property
+    def http_socket_receive_buffer_size(self):
+        """
+        Returns the size of the socket receive buffer (SO_RCVBUF) to use for connections.
+        :return: int: size in bytes or 0 to use the operating system default
+        """
+        return Config.parse_bytes_str(self.values.get(Config.HTTP_SOCKET_RECEIVE_BUFFER_SIZE, 0))
+
     @property
     def storage_provider_id(self):
         """
@@ -247,6 +460,24 @@ class Config(object):
         """
         return self.values.get(Config.FILE_DOWNLOAD_RETRIES, DEFAULT_FILE_DOWNLOAD_RETRIES)
 
+    @property
+    def download_url_ttl(self):
+        """
+        Returns the number of seconds a download url is assumed to be valid for when the url doesn't contain
+        an expiration time.
+        :return: int: seconds
+        """
+        return self.values.get(Config.DOWNLOAD_URL_TTL, DEFAULT_DOWNLOAD_URL_TTL)
+
+    @property
+    def download_url_refresh_margin(self):
+        """
+        Returns the number of seconds before a download url expires that it should be refreshed before
+        starting the download.
+        :return: int: seconds
+        """
+        return self.values.get(Config.DOWNLOAD_URL_REFRESH_MARGIN, DEFAULT_DOWNLOAD_URL_REFRESH_MARGIN)
+
     @property
     def azure_storage_account(self):
         return self.values.get(Config.AZURE_STORAGE_ACCOUNT)
@@ -1,12 +1,18 @@
 """DataServiceApi - communicates with to Duke Data Service REST API."""
 from __future__ import print_function
 import json
+import socket
 import requests
+import threading
 import time
 import datetime
-from ddsc.config import get_user_config_filename
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from ddsc.config import get_user_config_filename, HTTP_POOL_MAXSIZE_DEFAULT, HTTP_CONNECT_TIMEOUT_DEFAULT, \
+    HTTP_READ_TIMEOUT_DEFAULT, HTTP_KEEP_ALIVE_DEFAULT, HTTP_TCP_NODELAY_DEFAULT
 from ddsc.versioncheck import APP_NAME, get_internal_version_str
-from ddsc.core.retry import RetrySettings
+from ddsc.core.retry import RetrySettings, ExponentialBackoff, CircuitBreaker, get_retry_after_seconds
 from ddsc.exceptions import DDSUserException
 
 AUTH_TOKEN_CLOCK_SKEW_MAX = 5 * 60  # 5 minutes
@@ -19,6 +25,7 @@ To cancel this operation, press Ctrl+C.
 CONNECTION_RETRY_MESSAGE = "Connection failed. Retrying."
 DDS_TOTAL_PAGES_HEADER = 'x-total-pages'
 DDS_TOTAL_HEADER = 'x-total'
+DDS_PAGE_HEADER = 'x-page'
 
 
 def get_user_agent_str():
@@ -32,12 +39,13 @@ def get_user_agent_str():
 def retry_connection_exceptions(func):
     """
     Decorator that will retry a function while it fails with various connection exceptions.
+    When the object the function is called on has a circuit_breaker it is used to track the health of the host.
     :param func: function: will be called until it doesn't fail
     :return: value returned by func
     """
     def retry_function(*args, **kwargs):
         status_watcher = args[0]
-        dds_retry = DDSConnectionExceptionsRetry(status_watcher)
+        dds_retry = DDSConnectionExceptionsRetry(status_watcher, getattr(status_watcher, 'circuit_breaker', None))
         return dds_retry.run(func, *args, **kwargs)
     return retry_function
 
@@ -45,27 +53,52 @@ def retry_connection_exceptions(func):
 class DDSConnectionExceptionsRetry(object):
     """
     Retries a function for various connection type exceptions.
+    Waits between retries using exponential backoff with jitter honoring any Retry-After header DukeDS sends.
     """
-    def __init__(self, status_watcher):
+    def __init__(self, status_watcher, circuit_breaker=None):
+        """
+        :param status_watcher: object: has set_status_message(msg) method to show retry messages
+        :param circuit_breaker: CircuitBreaker: optional breaker for the host func sends requests to
+        """
         self.status_watcher = status_watcher
+        self.circuit_breaker = circuit_breaker
         self.current_status_msg = ''
         self.connection_retries = 0
+        self.service_down_retries = 0
+        self.connection_backoff = ExponentialBackoff(RetrySettings.CONNECTION_RETRY_SECONDS,
+                                                     RetrySettings.CONNECTION_RETRY_MAX_SECONDS)
+        self.service_down_backoff = ExponentialBackoff(RetrySettings.SERVICE_DOWN_RETRY_SECONDS,
+                                                       RetrySettings.SERVICE_DOWN_RETRY_MAX_SECONDS)
 
     def run(self, func, *args, **kwargs):
         while True:
             try:
-                result = func(*args, **kwargs)
+                result = self._run_with_circuit_breaker(func, *args, **kwargs)
                 # Clear out status message on success if necessary
                 if self.current_status_msg:
                     self.status_watcher.set_status_message('')
                 return result
             except requests.exceptions.ConnectionError as connnection_error:
+                self._record_failure()
                 self._retry_connection_error(connnection_error)
             except requests.exceptions.ReadTimeout as read_timeout_error:
+                self._record_failure()
                 self._retry_read_timeout_error(read_timeout_error)
             except DataServiceError as data_service_error:
                 self._retry_data_service_error(data_service_error)
 
+    def _run_with_circuit_breaker(self, func, *args, **kwargs):
+        if not self.circuit_breaker:
+            return func(*args, **kwargs)
+        with self.circuit_breaker.sending_request(sleep=self._sleep):
+            result = func(*args, **kwargs)
+        self.circuit_breaker.record_success()
+        return result
+
+    def _record_failure(self):
+        if self.circuit_breaker:
+            self.circuit_breaker.record_failure()
+
     def _retry_connection_error(self, exception):
         """
         Updates internal counter and will re-raise exception if out of retries.
@@ -74,7 +107,7 @@ class DDSConnectionExceptionsRetry(object):
         self.connection_retries += 1
         if self.connection_retries <= RetrySettings.CONNECTION_RETRY_TIMES:
             self._show_status_message_if_necessary(CONNECTION_RETRY_MESSAGE)
-            self._sleep(RetrySettings.CONNECTION_RETRY_SECONDS)
+            self._sleep(self.connection_backoff.get_wait_seconds(self.connection_retries))
         else:
             raise exception
 
@@ -95,8 +128,11 @@ class DDSConnectionExceptionsRetry(object):
         :param data_service_error: DataServiceError
         """
         if data_service_error.status_code == 503:
+            self._record_failure()
+            self.service_down_retries += 1
             self._show_status_message_if_necessary(SERVICE_DOWN_MESSAGE.format(datetime.datetime.utcnow()))
-            self._sleep(RetrySettings.SERVICE_DOWN_RETRY_SECONDS)
+            self._sleep(self.service_down_backoff.get_wait_seconds(self.service_down_retries,
+                                                                   data_service_error.retry_after))
         else:
             raise data_service_error
 
@@ -121,33 +157,80 @@ class ContentType(object):
     form = 'application/x-www-form-urlencoded'
 
 
+class ExcludeResponseFields(object):
+    """
+    Presets for the exclude_response_fields parameter of DataServiceApi listing methods.
+    Each preset drops the response fields a type of caller doesn't use so large listings transfer and parse faster.
+    """
+    TREE = 'tree'          # building a project tree from /projects/<id>/children
+    DOWNLOAD = 'download'  # downloading files listed by /projects/<id>/files
+    SUMMARY = 'summary'    # listing the name and id of projects
+    PRESETS = {
+        # 'current_version' is still needed since it contains the file hash and size
+        TREE: ['audit', 'ancestors', 'project'],
+        # 'ancestors' is still needed to determine where files are downloaded to
+        DOWNLOAD: ['audit', 'project'],
+        SUMMARY: ['audit'],
+    }
+
+    @staticmethod
+    def get_field_names(exclude_response_fields):
+        """
+        Return the field names to exclude for a preset name or an explicit list of field names.
+        :param exclude_response_fields: str|[str]: preset name or list of field names
+        :return: [str]: field names to exclude
+        """
+        if isinstance(exclude_response_fields, str):
+            if exclude_response_fields not in ExcludeResponseFields.PRESETS:
+                raise ValueError("Unknown exclude response fields preset: {}".format(exclude_response_fields))
+            return ExcludeResponseFields.PRESETS[exclude_response_fields]
+        return exclude_response_fields
+
+
 class DataServiceAuth(object):
     """
     Handles authorization refreshing for DataServiceApi.
     """
-    def __init__(self, config, set_status_msg=print):
+    def __init__(self, config, set_status_msg=print, token_cache=None):
         """
         Setup with initial authorization settings from config.
         :param config: ddsc.config.Config settings such as auth, user_key, agent_key
         :param set_status_msg: func(str): show status message to user
+        :param token_cache: TokenCache: optional saved token shared with other commands
         """
         self.config = config
         self._auth = self.config.auth
         self._expires = None
         self.user_agent_str = get_user_agent_str()
         self.set_status_msg = set_status_msg
+        self.token_cache = token_cache
+        self.refresh_lock = threading.Lock()  # lets only one thread at a time refresh the token
 
     def get_auth(self):
         """
         Gets an active token refreshing it if necessary.
+        A token saved in token_cache by another command or process is used before claiming a new token.
+        Threads sharing this object (such as those fetching listing pages) claim at most one new token.
         :return: str valid active authentication token.
         """
         if self.legacy_auth():
             return self._auth
         if not self.auth_expired():
             return self._auth
-        self.claim_new_token()
-        return self._auth
+        with self.refresh_lock:
+            # another thread may have refreshed the token while we were waiting
+            if not self.auth_expired():
+                return self._auth
+            if self.token_cache:
+                saved_auth_data = self.token_cache.load()
+                if saved_auth_data:
+                    self.set_auth_data(saved_auth_data)
+                    if not self.auth_expired():
+                        return self._auth
+            self.claim_new_token()
+            if self.token_cache:
+                self.token_cache.save(self._auth, self._expires)
+            return self._auth
 
     @retry_connection_exceptions
     def claim_new_token(self):
@@ -165,7 +248,7 @@ class DataServiceAuth(object):
         }
         url_suffix = "/software_agents/api_token"
         url = self.config.url + url_suffix
-        response = requests.post(url, headers=headers, data=json.dumps(data))
+        response = requests.post(url, headers=headers, data=json.dumps(data), timeout=self._get_timeout())
         if response.status_code == 404:
             if not self.config.agent_key:
                 raise MissingInitialSetupError()
@@ -182,6 +265,9 @@ class DataServiceAuth(object):
         self._auth = auth
         self._expires = expires
 
+    def _get_timeout(self):
+        return HttpTransportSettings.create_for_config(self.config).get_timeout()
+
     def get_auth_data(self):
         """
         Returns a tuple that can be build to recreate this object's state.
@@ -233,7 +319,7 @@ class OAuthDataServiceAuth(DataServiceAuth):
             "authentication_service_id": self.get_authentication_service_id(),
         }
         url = self.config.url + "/user/api_token"
-        response = requests.get(url, headers=headers, params=data)
+        response = requests.get(url, headers=headers, params=data, timeout=self._get_timeout())
         try:
             response.raise_for_status()
             resp_json = response.json()
@@ -283,6 +369,7 @@ class DataServiceError(Exception):
         self.url_suffix = url_suffix
         self.request_data = request_data
         self.status_code = response.status_code
+        self.retry_after = get_retry_after_seconds(response)
 
 
 class DSResourceNotConsistentError(DataServiceError):
@@ -301,22 +388,156 @@ class DSHashMismatchError(DataServiceError):
     pass
 
 
+class HttpTransportSettings(object):
+    """
+    Connection pool, timeout and socket settings used when sending HTTP requests.
+    """
+    def __init__(self, pool_maxsize=HTTP_POOL_MAXSIZE_DEFAULT, connect_timeout=HTTP_CONNECT_TIMEOUT_DEFAULT,
+                 read_timeout=HTTP_READ_TIMEOUT_DEFAULT, keep_alive=HTTP_KEEP_ALIVE_DEFAULT,
+                 tcp_nodelay=HTTP_TCP_NODELAY_DEFAULT, send_buffer_size=0, receive_buffer_size=0):
+        """
+        :param pool_maxsize: int: connections to each host kept open for reuse
+        :param connect_timeout: float: seconds to wait for a connection or None to wait forever
+        :param read_timeout: float: seconds to wait for data from the server or None to wait forever
+        :param keep_alive: bool: reuse connections between requests sending TCP keep-alive probes while idle
+        :param tcp_nodelay: bool: disable Nagle's algorithm so small requests are sent immediately
+        :param send_buffer_size: int: SO_SNDBUF size in bytes, 0 uses the operating system default
+        :param receive_buffer_size: int: SO_RCVBUF size in bytes, 0 uses the operating system default
+        """
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive
+        self.tcp_nodelay = tcp_nodelay
+        self.send_buffer_size = send_buffer_size
+        self.receive_buffer_size = receive_buffer_size
+
+    @staticmethod
+    def create_for_config(config):
+        """
+        Create settings from the http_* values in config.
+        :param config: ddsc.config.Config: settings to use
+        :return: HttpTransportSettings
+        """
+        return HttpTransportSettings(pool_maxsize=config.http_pool_maxsize,
+                                     connect_timeout=config.http_connect_timeout,
+                                     read_timeout=config.http_read_timeout,
+                                     keep_alive=config.http_keep_alive,
+                                     tcp_nodelay=config.http_tcp_nodelay,
+                                     send_buffer_size=config.http_socket_send_buffer_size,
+                                     receive_buffer_size=config.http_socket_receive_buffer_size)
+
+    def get_timeout(self):
+        """
+        Return the timeout in the form accepted by requests.
+        :return: (float, float): connect and read timeouts
+        """
+        return self.connect_timeout, self.read_timeout
+
+    def get_socket_options(self):
+        """
+        Return options to set on each new connection. These replace urllib3's default of only setting TCP_NODELAY.
+        :return: [(int, int, int)]: level, option name and value for socket.setsockopt
+        """
+        socket_options = []
+        if self.tcp_nodelay:
+            socket_options.append((socket.IPPROTO_TCP, socket.TCP_NODELAY, 1))
+        if self.keep_alive:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+        if self.send_buffer_size:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer_size))
+        if self.receive_buffer_size:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer_size))
+        return socket_options
+
+
+class HttpTransportAdapter(HTTPAdapter):
+    """
+    requests transport adapter that applies HttpTransportSettings to every request it sends.
+    Requests that don't specify a timeout use the settings' timeout so a hung connection can't block forever.
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['settings']
+
+    def __init__(self, settings, pool_maxsize):
+        """
+        :param settings: HttpTransportSettings: settings to apply
+        :param pool_maxsize: int: connections to each host kept open for reuse
+        """
+        self.settings = settings
+        super(HttpTransportAdapter, self).__init__(pool_maxsize=pool_maxsize)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self.settings.get_socket_options()
+        super(HttpTransportAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs['socket_options'] = self.settings.get_socket_options()
+        return super(HttpTransportAdapter, self).proxy_manager_for(proxy, **proxy_kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = self.settings.get_timeout()
+        return super(HttpTransportAdapter, self).send(request, timeout=timeout, **kwargs)
+
+
+class RequestsHttpTransport(object):
+    """
+    Creates the sessions DataServiceApi and file downloads send HTTP requests with.
+    Another HTTP client can be used by passing an object with the same create_session method to DataServiceApi.
+    Sessions must provide the requests.Session get, post, put, delete and close methods and return
+    requests style responses.
+    """
+    def __init__(self, settings=None):
+        """
+        :param settings: HttpTransportSettings: settings to apply to sessions (defaults to HttpTransportSettings())
+        """
+        self.settings = settings or HttpTransportSettings()
+
+    @staticmethod
+    def create_for_config(config):
+        """
+        Create a transport using the http_* values in config.
+        :param config: ddsc.config.Config: settings to use
+        :return: RequestsHttpTransport
+        """
+        return RequestsHttpTransport(HttpTransportSettings.create_for_config(config))
+
+    def create_session(self, pool_maxsize=None):
+        """
+        Create a new session that applies our settings to every request.
+        :param pool_maxsize: int: connections to each host kept open, defaults to settings.pool_maxsize
+        :return: requests.Session
+        """
+        session = requests.Session()
+        adapter = HttpTransportAdapter(self.settings, pool_maxsize or self.settings.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        if not self.settings.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+
 class DataServiceApi(object):
     """
     Sends json messages and receives responses back from Duke Data Service api.
     See https://github.com/Duke-Translational-Bioinformatics/duke-data-service.
     """
-    def __init__(self, auth, url, http=None):
+    def __init__(self, auth, url, http=None, response_cache=None, transport=None):
         """
         Setup for REST api.
         :param auth: str auth token to be send via Authorization header
         :param url: str root url of the data service
-        :param http: object requests style http object to do get/post/put (defaults to new requests Session)
+        :param http: object requests style http object to do get/post/put (defaults to a session from transport)
+        :param response_cache: ResponseCache: optional cache used to reuse GET responses
+        :param transport: RequestsHttpTransport: creates http sessions (defaults to RequestsHttpTransport())
         """
         self.auth = auth
         self.set_status_msg = auth.set_status_msg
         self.base_url = url
         self.http = http
+        self.response_cache = response_cache
+        self.transport = transport or RequestsHttpTransport()
+        self.circuit_breaker = CircuitBreaker()  # tracks failures of requests to the DukeDS API
         if not self.http:
             self.recreate_requests_session()
         self.user_agent_str = get_user_agent_str()
@@ -325,7 +546,7 @@ class DataServiceApi(object):
         """
         Recreate our requests session ( for example in response to connection failures)
         """
-        self.http = requests.Session()
+        self.http = self.transport.create_session()
 
     def close(self):
         self.http.close()
@@ -363,6 +584,7 @@ class DataServiceApi(object):
         """
         (url, data_str, headers) = self._url_parts(url_suffix, data, content_type=content_type)
         resp = self.http.post(url, data_str, headers=headers)
+        self._invalidate_cached_responses(url_suffix)
         return self._check_err(resp, url_suffix, data, allow_pagination=False)
 
     @retry_connection_exceptions
@@ -377,6 +599,7 @@ class DataServiceApi(object):
         """
         (url, data_str, headers) = self._url_parts(url_suffix, data, content_type=content_type)
         resp = self.http.put(url, data_str, headers=headers)
+        self._invalidate_cached_responses(url_suffix)
         return self._check_err(resp, url_suffix, data, allow_pagination=False)
 
     @retry_connection_exceptions
@@ -389,9 +612,14 @@ class DataServiceApi(object):
         :param content_type: str from ContentType that determines how we format the data
         :return: requests.Response containing the result
         """
+        cached_response = self._get_cached_response(url_suffix, data)
+        if cached_response is not None:
+            return cached_response
         (url, data_str, headers) = self._url_parts(url_suffix, data, content_type=content_type)
         resp = self.http.get(url, headers=headers, params=data_str)
-        return self._check_err(resp, url_suffix, data, allow_pagination=False)
+        self._check_err(resp, url_suffix, data, allow_pagination=False)
+        self._add_cached_response(url_suffix, data, resp)
+        return resp
 
     @retry_connection_exceptions
     def _get_single_page(self, url_suffix, data, page_num, page_size=None):
@@ -408,31 +636,88 @@ class DataServiceApi(object):
         if not page_size:
             page_size = self._get_page_size()
         data_with_per_page['per_page'] = page_size
+        cached_response = self._get_cached_response(url_suffix, data_with_per_page)
+        if cached_response is not None:
+            return cached_response
         (url, data_str, headers) = self._url_parts(url_suffix, data_with_per_page,
                                                    content_type=ContentType.form)
         resp = self.http.get(url, headers=headers, params=data_str)
-        return self._check_err(resp, url_suffix, data, allow_pagination=True)
+        self._check_err(resp, url_suffix, data, allow_pagination=True)
+        self._add_cached_response(url_suffix, data_with_per_page, resp)
+        return resp
+
+    def _get_cached_response(self, url_suffix, data):
+        """
+        Return a response stored by an earlier GET request when response caching is enabled.
+        :param url_suffix: str URL path we are sending a GET to
+        :param data: object data we are sending
+        :return: requests.Response or None when there is no cached response
+        """
+        if self.response_cache:
+            return self.response_cache.get(url_suffix, data)
+        return None
+
+    def _add_cached_response(self, url_suffix, data, response):
+        if self.response_cache:
+            self.response_cache.add(url_suffix, data, response)
+
+    def _invalidate_cached_responses(self, url_suffix):
+        """
+        Discard cached responses that a POST/PUT/DELETE to url_suffix may have changed.
+        This is done even when the request fails since the change may have been partially applied.
+        :param url_suffix: str URL path we sent a POST/PUT/DELETE to
+        """
+        if self.response_cache:
+            self.response_cache.invalidate(url_suffix)
 
     def _get_collection(self, url_suffix, data):
         """
         Performs GET for all pages based on x-total-pages in first response headers.
         Merges the json() 'results' arrays.
         If x-total-pages is missing or 1 just returns the response without fetching multiple pages.
+        Use _get_collection_items instead when the items can be processed one at a time.
         :param url_suffix: str URL path we are sending a GET to
         :param data: object data we are sending
         :return: requests.Response containing the result
         """
-        response = self._get_single_page(url_suffix, data, page_num=1)
-        total_pages_str = response.headers.get('x-total-pages')
-        if total_pages_str:
-            total_pages = int(total_pages_str)
-            if total_pages > 1:
+        pages = self._get_collection_pages(url_suffix, data)
+        response = next(pages)
+        multi_response = None
+        for additional_response in pages:
+            if not multi_response:
                 multi_response = MultiJSONResponse(base_response=response, merge_array_field_name="results")
-                for page in range(2, total_pages + 1):
-                    additional_response = self._get_single_page(url_suffix, data, page_num=page)
-                    multi_response.add_response(additional_response)
-                return multi_response
-        return response
+            multi_response.add_response(additional_response)
+        return multi_response or response
+
+    def _get_collection_pages(self, url_suffix, data, page_size=None):
+        """
+        Generator that performs GET for all pages based on x-total-pages in first response headers.
+        Pages after the first are fetched concurrently (see _get_pages_with_lookahead). This is safe since
+        fetching a page has no side effects and the responses are still returned in page order.
+        :param url_suffix: str URL path we are sending a GET to
+        :param data: object data we are sending
+        :param page_size: int page size to fetch, defaults to config.page_size
+        :return: generator of requests.Response
+        """
+        # process first page separately to read total pages
+        response = self._get_single_page(url_suffix, data, page_num=1, page_size=page_size)
+        total_pages = int(response.headers.get('x-total-pages') or 1)
+        yield response
+        if total_pages > 1:
+            for response in self._get_pages_with_lookahead(url_suffix, data, page_size, range(2, total_pages + 1)):
+                yield response
+
+    def _get_collection_items(self, url_suffix, data):
+        """
+        Generator that returns the items in the 'results' array of every page of a collection.
+        Only the pages currently being fetched are held in memory.
+        :param url_suffix: str URL path we are sending a GET to
+        :param data: object data we are sending
+        :return: generator of dict
+        """
+        for response in self._get_collection_pages(url_suffix, data):
+            for item in response.json()["results"]:
+                yield item
 
     @retry_connection_exceptions
     def _delete(self, url_suffix, data, content_type=ContentType.json):
@@ -446,6 +731,7 @@ class DataServiceApi(object):
         """
         (url, data_str, headers) = self._url_parts(url_suffix, data, content_type=content_type)
         resp = self.http.delete(url, headers=headers, params=data_str)
+        self._invalidate_cached_responses(url_suffix)
         return self._check_err(resp, url_suffix, data, allow_pagination=False)
 
     @staticmethod
@@ -485,13 +771,23 @@ class DataServiceApi(object):
         }
         return self._post("/projects", data)
 
-    def get_projects(self):
+    def get_projects(self, exclude_response_fields=None):
         """
         Send GET to /projects returning a list of all projects for the current user.
         Raises DataServiceError on error.
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
         :return: requests.Response containing the successful result
         """
-        return self._get_collection("/projects", {})
+        return self._get_collection("/projects", self._add_exclude_response_fields({}, exclude_response_fields))
+
+    def get_projects_generator(self, exclude_response_fields=None):
+        """
+        Send GET to /projects returning the projects for the current user one at a time.
+        Raises DataServiceError on error.
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
+        :return: generator of dict: DukeDS project JSON
+        """
+        return self._get_collection_items("/projects", self._add_exclude_response_fields({}, exclude_response_fields))
 
     def get_project_by_id(self, id):
         """
@@ -604,11 +900,23 @@ class DataServiceApi(object):
         Send GET to /projects/{project_id}/children filtering by a name.
         :param project_id: str uuid of the project
         :param name_contains: str name to filter folders by (if not None this method works recursively)
-        :param exclude_response_fields: [str]: list of fields to exclude in the response items
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
         :return: requests.Response containing the successful result
         """
         return self._get_children('projects', project_id, name_contains, exclude_response_fields)
 
+    def get_project_children_generator(self, project_id, name_contains, exclude_response_fields=None):
+        """
+        Send GET to /projects/{project_id}/children filtering by a name returning the children one at a time.
+        :param project_id: str uuid of the project
+        :param name_contains: str name to filter folders by (if not None this method works recursively)
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
+        :return: generator of dict: DukeDS file or folder JSON
+        """
+        url_prefix, data = self._get_children_url_and_data('projects', project_id, name_contains,
+                                                           exclude_response_fields)
+        return self._get_collection_items(url_prefix, data)
+
     def get_project_files(self, project_id):
         """
         Send GET to /projects/{project_id}/files returning list of all files in a project.
@@ -618,34 +926,85 @@ class DataServiceApi(object):
         url_prefix = "/projects/{}/files".format(project_id)
         return self._get_collection(url_prefix, {})
 
-    def get_project_files_generator(self, project_id, page_size):
+    def get_project_files_generator(self, project_id, page_size, exclude_response_fields=None):
         """
         Send GET to /projects/{project_id}/files
         :param project_id: str uuid of the project
         :param page_size: int page size to fetch
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
         :return: generator that returns (DDS file download JSON, header metadata) pairs
         """
         url_suffix = "/projects/{}/files".format(project_id)
-        data = {}
-        # process first page separately to read total pages
-        response = self._get_single_page(url_suffix, data, page_size=page_size, page_num=1)
-        total_pages = int(response.headers.get('x-total-pages'))
-        for item in response.json()["results"]:
-            yield item, response.headers
-        # process the rest of the pages
-        for page in range(2, total_pages + 1):
-            response = self._get_single_page(url_suffix, data, page_size=page_size, page_num=page)
+        data = self._add_exclude_response_fields({}, exclude_response_fields)
+        for response in self._get_collection_pages(url_suffix, data, page_size=page_size):
             for item in response.json()["results"]:
                 yield item, response.headers
 
-    def get_folder_children(self, folder_id, name_contains):
+    def get_project_files_page(self, project_id, page_size, page_num, exclude_response_fields=None):
+        """
+        Send GET to /projects/{project_id}/files for a single page. Used to refresh download urls in bulk.
+        :param project_id: str uuid of the project
+        :param page_size: int page size to fetch
+        :param page_num: int page number to fetch
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
+        :return: requests.Response containing the successful result
+        """
+        url_suffix = "/projects/{}/files".format(project_id)
+        data = self._add_exclude_response_fields({}, exclude_response_fields)
+        return self._get_single_page(url_suffix, data, page_size=page_size, page_num=page_num)
+
+    def _get_pages_with_lookahead(self, url_suffix, data, page_size, page_nums):
+        """
+        Generator that fetches pages concurrently while yielding the responses in page order.
+        At most config.page_lookahead page requests are in flight at any time.
+        :param url_suffix: str URL path we are sending a GET to
+        :param data: object data we are sending
+        :param page_size: int page size to fetch
+        :param page_nums: [int]: page numbers to fetch in the order they should be returned
+        :return: generator of requests.Response
+        """
+        def fetch_page(page_num):
+            return self._get_single_page(url_suffix, data, page_size=page_size, page_num=page_num)
+        return self._map_with_lookahead(fetch_page, page_nums)
+
+    def _map_with_lookahead(self, func, items):
+        """
+        Generator that calls func for each item concurrently while yielding the results in the order of items.
+        At most config.page_lookahead calls are in flight at any time. Only use for requests without side effects.
+        :param func: func(item): function that makes a request for an item
+        :param items: iterable of items to pass to func, items can not be None
+        :return: generator of the values returned by func
+        """
+        items = iter(items)
+        lookahead = max(self._get_page_lookahead(), 1)
+        with ThreadPoolExecutor(max_workers=lookahead) as executor:
+            pending_results = deque()
+
+            def submit_next_item():
+                item = next(items, None)
+                if item is not None:
+                    pending_results.append(executor.submit(func, item))
+
+            for _ in range(lookahead):
+                submit_next_item()
+            try:
+                while pending_results:
+                    result = pending_results.popleft().result()
+                    submit_next_item()
+                    yield result
+            finally:
+                for pending_result in pending_results:
+                    pending_result.cancel()
+
+    def get_folder_children(self, folder_id, name_contains, exclude_response_fields=None):
         """
         Send GET to /folders/{folder_id} filtering by a name.
         :param folder_id: str uuid of the folder
         :param name_contains: str name to filter children by (if not None this method works recursively)
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
         :return: requests.Response containing the successful result
         """
-        return self._get_children('folders', folder_id, name_contains)
+        return self._get_children('folders', folder_id, name_contains, exclude_response_fields)
 
     def _get_children(self, parent_name, parent_id, name_contains, exclude_response_fields=None):
         """
@@ -653,16 +1012,42 @@ class DataServiceApi(object):
         :param parent_name: str 'projects' or 'folders'
         :param parent_id: str uuid of project or folder
         :param name_contains: name filtering (if not None this method works recursively)
-        :param exclude_response_fields: [str]: list of fields to exclude in the response items
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
         :return: requests.Response containing the successful result
         """
+        url_prefix, data = self._get_children_url_and_data(parent_name, parent_id, name_contains,
+                                                           exclude_response_fields)
+        return self._get_collection(url_prefix, data)
+
+    @staticmethod
+    def _get_children_url_and_data(parent_name, parent_id, name_contains, exclude_response_fields):
+        """
+        Return the url and parameters for a /<parent_name>/<parent_id>/children request.
+        :param parent_name: str 'projects' or 'folders'
+        :param parent_id: str uuid of project or folder
+        :param name_contains: name filtering (if not None this method works recursively)
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
+        :return: (str, dict): url suffix and data to send
+        """
         data = {}
         if name_contains is not None:
             data['name_contains'] = name_contains
-        if exclude_response_fields:
-            data['exclude_response_fields'] = ' '.join(exclude_response_fields)
+        DataServiceApi._add_exclude_response_fields(data, exclude_response_fields)
         url_prefix = "/{}/{}/children".format(parent_name, parent_id)
-        return self._get_collection(url_prefix, data)
+        return url_prefix, data
+
+    @staticmethod
+    def _add_exclude_response_fields(data, exclude_response_fields):
+        """
+        Add the exclude_response_fields parameter to data when there are fields to exclude.
+        :param data: dict: data we are sending
+        :param exclude_response_fields: str|[str]: ExcludeResponseFields preset or list of fields to exclude
+        :return: dict: data
+        """
+        if exclude_response_fields:
+            field_names = ExcludeResponseFields.get_field_names(exclude_response_fields)
+            data['exclude_response_fields'] = ' '.join(field_names)
+        return data
 
     def create_upload(self, project_id, filename, content_type, size,
                       hash_value, hash_alg, storage_provider_id=None, chunked=True):
@@ -827,6 +1212,21 @@ class DataServiceApi(object):
         :param username: str: optional username to filter by
         :return: requests.Response containing the successful result
         """
+        return self._get_collection('/users', self._get_users_data(full_name, email, username))
+
+    def get_users_generator(self, full_name=None, email=None, username=None):
+        """
+        Send GET request to /users for users with optional full_name, email, and/or username filtering
+        returning the users one at a time.
+        :param full_name: str name of the user we are searching for
+        :param email: str: optional email to filter by
+        :param username: str: optional username to filter by
+        :return: generator of dict: DukeDS user JSON
+        """
+        return self._get_collection_items('/users', self._get_users_data(full_name, email, username))
+
+    @staticmethod
+    def _get_users_data(full_name, email, username):
         data = {}
         if full_name:
             data['full_name_contains'] = full_name
@@ -834,7 +1234,7 @@ class DataServiceApi(object):
             data['email'] = email
         if username:
             data['username'] = username
-        return self._get_collection('/users', data)
+        return data
 
     def get_user_by_id(self, id):
         """
@@ -867,6 +1267,18 @@ class DataServiceApi(object):
         """
         return self._get_single_item("/projects/" + project_id + "/permissions/" + user_id, {})
 
+    def get_user_project_permissions_generator(self, project_ids, user_id):
+        """
+        Send GET requests to /projects/{project_id}/permissions/{user_id} for each project concurrently.
+        DukeDS has no endpoint that returns a user's permissions for all projects so one request is made per project.
+        At most config.page_lookahead requests are in flight at any time.
+        :param project_ids: [str]: uuids of the projects
+        :param user_id: str uuid of the user
+        :return: generator of requests.Response in the same order as project_ids
+        """
+        return self._map_with_lookahead(lambda project_id: self.get_user_project_permission(project_id, user_id),
+                                        project_ids)
+
     def get_project_permissions(self, project_id):
         """
         Send GET request to /projects/{project_id}/permissions/.
@@ -929,6 +1341,14 @@ class DataServiceApi(object):
         """
         return self._get_collection("/auth_roles", {"context": context})
 
+    def get_auth_roles_generator(self, context):
+        """
+        Send GET request to get auth_roles for a context returning them one at a time.
+        :param context: str which roles do we want 'project' or 'system'
+        :return: generator of dict: DukeDS auth role JSON
+        """
+        return self._get_collection_items("/auth_roles", {"context": context})
+
     def get_project_transfers(self, project_id):
         """
         Send GET request to get list of transfers for a project
@@ -1233,6 +1653,14 @@ class DataServiceApi(object):
         config = self.auth.config
         return config.page_size
 
+    def _get_page_lookahead(self):
+        """
+        Return how many pages of a multi-page DukeDS result we should fetch concurrently
+        :return: int
+        """
+        config = self.auth.config
+        return config.page_lookahead
+
     def set_status_message(self, msg):
         print(msg)
 
@@ -1279,8 +1707,8 @@ class MultiJSONResponse(object):
         """
         key = self.merge_array_field_name
         response_json = response.json()
-        value = self.combined_json[key]
-        self.combined_json[self.merge_array_field_name] = value + response_json[key]
+        # extend in place so merging many pages doesn't copy the accumulated array for each page
+        self.combined_json[key].extend(response_json[key])
 
 
 class ActivityRelationTypes(object):
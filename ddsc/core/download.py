@@ -1,13 +1,30 @@
 import sys
+import json
+import hashlib
 import requests
 from requests.exceptions import HTTPError
+from urllib.parse import urlparse, parse_qs
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import os
 import multiprocessing
 import time
 import queue
+import threading
+import heapq
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from ddsc.core.localstore import HashUtil
-from ddsc.core.ddsapi import DDS_TOTAL_HEADER
-from ddsc.core.util import humanize_bytes, transfer_speed_str
+from ddsc.core.ddsapi import DDS_TOTAL_HEADER, DDS_PAGE_HEADER, ExcludeResponseFields, HttpTransportSettings, \
+    RequestsHttpTransport
+from ddsc.core.downloadmanifest import DownloadManifest, get_download_manifest_filename
+from ddsc.core.downloadwriter import DirectoryCache, FileSyncBatch, preallocate_file, copy_downloaded_file, \
+    COPY_METHOD_COPY
+from ddsc.core.downloadscheduler import DownloadScheduler
+from ddsc.core.downloadverification import DownloadVerificationResults, get_download_verification_filename
+from ddsc.core.util import humanize_bytes, transfer_speed_str, remaining_time_str
+from ddsc.core.retry import RetrySettings, ExponentialBackoff, get_retry_after_seconds, get_circuit_breaker
 
 SWIFT_EXPIRED_STATUS_CODE = 401
 S3_EXPIRED_STATUS_CODE = 403
@@ -17,6 +34,16 @@ The downloaded files have been verified and confirmed to match one of these hash
 You do not need to retry the download.
 For more information, visit https://github.com/Duke-GCB/DukeDSClient/wiki/MD5-Hash-Conflicts.
 """
+PART_FILE_SUFFIX = '.part'
+PART_STATE_FILE_SUFFIX = '.part.json'
+# sequential downloads flush the .part file to disk and record the written size after every 64MB
+PART_CHECKPOINT_BYTES = 64 * 1024 * 1024
+
+PROGRESS_REDRAW_SECONDS = 0.5
+
+# requests.Session for each (process id, storage host) so download workers reuse connections across files
+_download_sessions = {}
+_download_sessions_lock = threading.Lock()
 
 
 class MD5FileHash(object):
@@ -28,18 +55,28 @@ class MD5FileHash(object):
         hash_util.add_file(file_path)
         return hash_util.hash.hexdigest()
 
+    @staticmethod
+    def create_hasher():
+        return hashlib.md5()
+
 
 class FileHash(object):
     algorithm_to_get_hash_value = {
         MD5FileHash.algorithm: MD5FileHash.get_hash_value
     }
+    algorithm_to_create_hasher = {
+        MD5FileHash.algorithm: MD5FileHash.create_hasher
+    }
 
-    def __init__(self, algorithm, expected_hash_value, file_path):
+    def __init__(self, algorithm, expected_hash_value, file_path, computed_hash_value=None):
         self.algorithm = algorithm
         self.expected_hash_value = expected_hash_value
         self.file_path = file_path
+        self.computed_hash_value = computed_hash_value
 
     def _get_hash_value(self):
+        if self.computed_hash_value is not None:
+            return self.computed_hash_value
         get_hash_value_func = self.algorithm_to_get_hash_value.get(self.algorithm)
         if get_hash_value_func:
             return get_hash_value_func(self.file_path)
@@ -49,19 +86,21 @@ class FileHash(object):
         return self._get_hash_value() == self.expected_hash_value
 
     @staticmethod
-    def get_supported_file_hashes(dds_hashes, file_path):
+    def get_supported_file_hashes(dds_hashes, file_path, computed_hash_values=None):
         """
         Returns a list of FileHashes for each dict in dds_hashes.
         :param dds_hashes: [dict]: list of dicts with 'algorithm', and 'value' keys
         :param file_path: str: path to file to have hash checked
+        :param computed_hash_values: dict: optional algorithm to hash value already computed for file_path
         :return: [FileHash]
         """
+        computed_hash_values = computed_hash_values or {}
         file_hashes = []
         for hash_info in dds_hashes:
             algorithm = hash_info.get('algorithm')
             hash_value = hash_info.get('value')
             if algorithm in FileHash.algorithm_to_get_hash_value:
-                file_hashes.append(FileHash(algorithm, hash_value, file_path))
+                file_hashes.append(FileHash(algorithm, hash_value, file_path, computed_hash_values.get(algorithm)))
         return file_hashes
 
     @staticmethod
@@ -93,6 +132,9 @@ class FileHashStatus(object):
     def has_a_valid_hash(self):
         return self.status in [self.STATUS_OK, self.STATUS_WARNING]
 
+    def has_mismatched_hashes(self):
+        return self.status == self.STATUS_WARNING
+
     def get_status_line(self):
         return "{} {} {} {}".format(self.file_hash.file_path,
                                     self.file_hash.expected_hash_value,
@@ -104,7 +146,7 @@ class FileHashStatus(object):
             raise ValueError("Hash validation error: {}".format(self.get_status_line()))
 
     @staticmethod
-    def determine_for_hashes(dds_hashes, file_path):
+    def determine_for_hashes(dds_hashes, file_path, computed_hash_values=None):
         """
         Compares dds_hashes against file_path using the associated algorithms recording a status property.
         The status property will bet set as follows:
@@ -114,9 +156,10 @@ class FileHashStatus(object):
         Raises ValueError if no hashes found.
         :param dds_hashes: [dict]: list of dicts with 'algorithm', and 'value' keys
         :param file_path: str: path to file to have hash checked
+        :param computed_hash_values: dict: optional algorithm to hash value already computed for file_path
         :return: FileHashStatus
         """
-        file_hashes = FileHash.get_supported_file_hashes(dds_hashes, file_path)
+        file_hashes = FileHash.get_supported_file_hashes(dds_hashes, file_path, computed_hash_values)
         valid_file_hashes, failed_file_hashes = FileHash.separate_valid_and_failed_hashes(file_hashes)
         if valid_file_hashes:
             first_ok_file_hash = valid_file_hashes[0]
@@ -131,6 +174,46 @@ class FileHashStatus(object):
         raise ValueError("Unable to validate: No supported hashes found for file {}".format(file_path))
 
 
+class IncrementalFileHashes(object):
+    """
+    Computes hashes for each supported algorithm in dds_hashes as data is downloaded
+    so the file doesn't need to be read back to verify it.
+    """
+    def __init__(self, dds_hashes):
+        self.hashers = {}
+        for hash_info in dds_hashes:
+            algorithm = hash_info.get('algorithm')
+            create_hasher_func = FileHash.algorithm_to_create_hasher.get(algorithm)
+            if create_hasher_func and algorithm not in self.hashers:
+                self.hashers[algorithm] = create_hasher_func()
+
+    def add_chunk(self, chunk):
+        for hasher in self.hashers.values():
+            hasher.update(chunk)
+
+    def add_file_prefix(self, file_path, num_bytes, block_size):
+        """
+        Add the first num_bytes of file_path to the hashes. Used when resuming a partial download.
+        :param file_path: str: path to the file to read
+        :param num_bytes: int: number of bytes to read from the start of the file
+        :param block_size: int: size of chunks when reading the file
+        """
+        with open(file_path, "rb") as infile:
+            remaining = num_bytes
+            while remaining > 0:
+                chunk = infile.read(min(block_size, remaining))
+                if not chunk:
+                    break
+                self.add_chunk(chunk)
+                remaining -= len(chunk)
+
+    def get_hash_values(self):
+        """
+        :return: dict: algorithm to hex digest
+        """
+        return dict((algorithm, hasher.hexdigest()) for algorithm, hasher in self.hashers.items())
+
+
 class FileDownloadState(object):
     """
     Contains details passed between foreground ProjectFileDownloader and background download_file function
@@ -142,20 +225,72 @@ class FileDownloadState(object):
     EXPIRED_URL = 'expired_url'  # backend url expired before we got a chance to download it
     ERROR = 'error'  # an error occurred during download
 
-    def __init__(self, project_file, output_path, config):
+    def __init__(self, project_file, output_path, config, url_issued_at=None, listing_page_num=None):
+        """
+        :param project_file: ProjectFile: file to download including its download url
+        :param output_path: str: local path to write the file to
+        :param config: ddsc.config.Config: configuration settings
+        :param url_issued_at: float: epoch time the download url was issued, defaults to now
+        :param listing_page_num: int: page of the project file listing the download url came from
+        """
         self.file_id = project_file.id
+        self.file_version_id = project_file.file_version_id
         self.size = project_file.size
         self.hashes = project_file.hashes
         self.output_path = output_path
-        self.url = project_file.file_url['host'] + project_file.file_url['url']
+        self.url_ttl = config.download_url_ttl
+        self.listing_page_num = listing_page_num
+        self.set_url(project_file.file_url['host'] + project_file.file_url['url'], url_issued_at or time.time())
         self.retries = config.file_download_retries
         self.download_bytes_per_chunk = config.download_bytes_per_chunk
+        self.split_threshold = config.download_split_threshold
+        self.segment_size = config.download_segment_size
+        self.segment_workers = config.download_segment_workers
+        self.preallocate = config.download_preallocate
+        self.http_transport_settings = HttpTransportSettings.create_for_config(config)
         self.state = self.NEW
         self.status = None
         self.msg = 'New state'
+        self.computed_hash_values = None  # hashes computed while downloading when available
+        self.retry_after = None  # seconds the storage host asked us to wait after a failed download
+        # (path, hash values) of a verified file with the same contents to copy instead of downloading
+        self.copy_source = None
+
+    def set_url(self, url, issued_at):
+        """
+        Set the url to download from and when it expires.
+        :param url: str: download url
+        :param issued_at: float: epoch time the url was issued
+        """
+        self.url = url
+        self.url_expires_at = get_url_expiration(url, issued_at, self.url_ttl)
 
-    def calculate_file_hash_status(self):
-        return FileHashStatus.determine_for_hashes(self.hashes, self.output_path)
+    def url_expires_before(self, deadline):
+        return self.url_expires_at < deadline
+
+    def calculate_file_hash_status(self, file_path=None):
+        return FileHashStatus.determine_for_hashes(self.hashes, file_path or self.output_path,
+                                                   self.computed_hash_values)
+
+    def get_content_key(self):
+        """
+        Return a key identifying the contents of this file. Files with the same key have identical contents.
+        :return: (int, str): size and md5 hash value or None when the file doesn't have an md5 hash
+        """
+        for dds_hash in self.hashes:
+            if dds_hash.get('algorithm') == MD5FileHash.algorithm:
+                return self.size, dds_hash.get('value')
+        return None
+
+    def use_segmented_download(self):
+        """
+        Should this file be downloaded in segments using concurrent HTTP Range requests.
+        Requires os.pwrite so segments can be written into the file at their offsets.
+        :return: bool: True when the file is large enough to be split into multiple segments
+        """
+        if not self.split_threshold or not hasattr(os, 'pwrite'):
+            return False
+        return self.size >= self.split_threshold and self.size > self.segment_size
 
     def is_ok_state(self):
         return self.state == self.GOOD or self.state == self.ALREADY_COMPLETE
@@ -178,10 +313,11 @@ class FileDownloadState(object):
         self.msg = msg
         return self
 
-    def mark_error(self, msg):
+    def mark_error(self, msg, retry_after=None):
         self.state = self.ERROR
         self.status = None
         self.msg = msg
+        self.retry_after = retry_after
         return self
 
     def raise_for_status(self):
@@ -191,54 +327,341 @@ class FileDownloadState(object):
             raise ValueError(self.msg)
 
 
+class PartialDownload(object):
+    """
+    Tracks a download written to a sidecar .part file so an interrupted download can be resumed.
+    A small JSON state file records which remote file the .part data belongs to, how it is being written
+    (sequentially or in segments) and which segments have been completely written.
+    Sequential downloads also record how many bytes have been written since a preallocated .part file
+    is already its final size.
+    Lives only within the process downloading the file.
+    """
+    SEQUENTIAL = 'sequential'
+    SEGMENTED = 'segmented'
+
+    def __init__(self, file_download_state):
+        self.file_id = file_download_state.file_id
+        self.size = file_download_state.size
+        self.hashes = file_download_state.hashes
+        self.output_path = file_download_state.output_path
+        self.part_path = self.output_path + PART_FILE_SUFFIX
+        self.state_path = self.output_path + PART_STATE_FILE_SUFFIX
+        self.mode = None
+        self.completed_segments = []
+        self.written_size = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(file_download_state):
+        """
+        Create a PartialDownload picking up any previous progress that belongs to the same remote file.
+        Leftover .part data that belongs to a different file (or different contents) is removed.
+        :param file_download_state: FileDownloadState: details about the file to download
+        :return: PartialDownload
+        """
+        partial_download = PartialDownload(file_download_state)
+        state = partial_download._read_state()
+        if state and partial_download._state_matches(state) and os.path.exists(partial_download.part_path):
+            partial_download.mode = state.get('mode')
+            partial_download.completed_segments = [tuple(segment) for segment in state.get('completed_segments', [])]
+            partial_download.written_size = state.get('written_size') or 0
+        else:
+            partial_download.discard()
+        return partial_download
+
+    def _read_state(self):
+        try:
+            with open(self.state_path) as infile:
+                return json.load(infile)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _state_matches(self, state):
+        return state.get('file_id') == self.file_id and state.get('size') == self.size and \
+            state.get('hashes') == self.hashes
+
+    def save(self):
+        """
+        Write the state file atomically so a crash never leaves a half written state record.
+        """
+        state = {
+            'file_id': self.file_id,
+            'size': self.size,
+            'hashes': self.hashes,
+            'mode': self.mode,
+            'completed_segments': self.completed_segments,
+            'written_size': self.written_size,
+        }
+        temp_state_path = self.state_path + '.tmp'
+        with open(temp_state_path, 'w') as outfile:
+            json.dump(state, outfile)
+        os.replace(temp_state_path, self.state_path)
+
+    def start(self, mode):
+        """
+        Prepare to write the .part file in mode discarding previous progress written in a different mode.
+        :param mode: str: SEQUENTIAL or SEGMENTED
+        """
+        if self.mode != mode:
+            self.discard()
+            self.mode = mode
+            self.written_size = 0
+        self.save()
+
+    def get_sequential_written_size(self):
+        """
+        Return the number of bytes already written to the .part file by a previous sequential download.
+        :return: int: offset to resume downloading from
+        """
+        try:
+            part_size = os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+        if part_size > self.size:
+            self.discard()
+            self.start(self.SEQUENTIAL)
+            return 0
+        return min(self.written_size, part_size)
+
+    def set_sequential_written_size(self, written_size):
+        self.written_size = written_size
+        self.save()
+
+    def is_segment_complete(self, start, end):
+        return (start, end) in self.completed_segments
+
+    def add_completed_segment(self, start, end):
+        with self.lock:
+            self.completed_segments.append((start, end))
+            self.save()
+
+    def finalize(self):
+        """
+        Atomically move the completed .part file to the output path and remove the state file.
+        """
+        os.replace(self.part_path, self.output_path)
+        self._remove_if_exists(self.state_path)
+
+    def discard(self):
+        """
+        Remove the .part and state files so the next download starts from the beginning.
+        """
+        self._remove_if_exists(self.part_path)
+        self._remove_if_exists(self.state_path)
+        self.mode = None
+        self.completed_segments = []
+        self.written_size = 0
+
+    @staticmethod
+    def _remove_if_exists(path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get_url_expiration(url, issued_at, default_ttl):
+    """
+    Determine when a download url expires. Signed urls from Swift (temp_url_expires), S3 (X-Amz-Date and
+    X-Amz-Expires or Expires) and Azure (se) contain their expiration. Other urls are assumed to expire
+    default_ttl seconds after they were issued.
+    :param url: str: download url
+    :param issued_at: float: epoch time the url was issued
+    :param default_ttl: int: seconds the url is valid for when it doesn't contain an expiration
+    :return: float: epoch time the url expires
+    """
+    params = parse_qs(urlparse(url).query)
+    try:
+        if 'temp_url_expires' in params:
+            return float(params['temp_url_expires'][0])
+        if 'X-Amz-Date' in params and 'X-Amz-Expires' in params:
+            signed_at = datetime.strptime(params['X-Amz-Date'][0], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+            return signed_at.timestamp() + float(params['X-Amz-Expires'][0])
+        if 'Expires' in params:
+            return float(params['Expires'][0])
+        if 'se' in params:
+            expires = datetime.strptime(params['se'][0], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+            return expires.timestamp()
+    except ValueError:
+        pass
+    return issued_at + default_ttl
+
+
+def get_listing_issued_time(headers):
+    """
+    Return when a project file listing page was generated based on the response Date header.
+    The result is never later than the current time so clock skew can only cause an early refresh.
+    :param headers: dict: response headers for the listing page
+    :return: float: epoch time
+    """
+    current_time = time.time()
+    date_str = headers.get('Date')
+    if date_str:
+        try:
+            return min(parsedate_to_datetime(date_str).timestamp(), current_time)
+        except (TypeError, ValueError):
+            pass
+    return current_time
+
+
+def get_listing_page_num(headers):
+    page_num = headers.get(DDS_PAGE_HEADER)
+    if page_num:
+        return int(page_num)
+    return None
+
+
 class URLExpiredException(Exception):
     pass
 
 
+class RangeNotSupportedException(Exception):
+    pass
+
+
+class DownloadProgressCounters(object):
+    """
+    Shared memory byte counters with one slot per download worker process.
+    Each worker only adds to its own slot so no locking is needed between processes,
+    and the parent can total them in O(workers) whenever it redraws progress.
+    """
+    def __init__(self, num_workers):
+        self.num_workers = num_workers
+        self.bytes_downloaded = multiprocessing.Array('q', num_workers, lock=False)
+        self.next_slot = multiprocessing.Value('i', 0)
+
+    def claim_slot(self):
+        """
+        Reserve a slot for the calling worker process.
+        :return: int: index into bytes_downloaded
+        """
+        with self.next_slot.get_lock():
+            slot = self.next_slot.value % self.num_workers
+            self.next_slot.value += 1
+        return slot
+
+    def get_total_bytes_downloaded(self):
+        return sum(self.bytes_downloaded)
+
+
+class WorkerProgressCounter(object):
+    """
+    Adds bytes downloaded by the current worker process to its slot in DownloadProgressCounters.
+    """
+    def __init__(self, progress_counters):
+        self.bytes_downloaded = progress_counters.bytes_downloaded
+        self.slot = progress_counters.claim_slot()
+
+    def add_bytes_downloaded(self, num_bytes):
+        self.bytes_downloaded[self.slot] += num_bytes
+
+
+# Set in each download worker process by init_download_worker
+_worker_progress_counter = None
+
+
+def init_download_worker(progress_counters):
+    """
+    Pool initializer that connects the worker process to the parent's shared progress counters.
+    :param progress_counters: DownloadProgressCounters: counters shared with the parent process
+    """
+    global _worker_progress_counter
+    _worker_progress_counter = WorkerProgressCounter(progress_counters)
+
+
+def add_bytes_downloaded(num_bytes):
+    """
+    Record progress for the current worker process. Does nothing outside of a download worker.
+    Callers downloading from multiple threads must serialize calls.
+    :param num_bytes: int: number of newly downloaded bytes
+    """
+    if _worker_progress_counter:
+        _worker_progress_counter.add_bytes_downloaded(num_bytes)
+
+
 class ProjectFileDownloader(object):
-    def __init__(self, config, dest_directory, project, path_filter):
+    def __init__(self, config, dest_directory, project, path_filter, verify=False, dedupe=False, shard=None):
         self.config = config
         self.dest_directory = dest_directory
         self.project = project
         self.dds_connection = project.dds_connection
         self.num_workers = config.download_workers
         self.path_filter = path_filter
-        self.async_download_results = []
-        self.message_queue = multiprocessing.Manager().Queue()
+        self.verify = verify  # when True rehash existing files even if the download manifest says they are unchanged
+        self.dedupe = dedupe  # when True files with the same contents are only downloaded once
+        self.downloaded_contents = {}  # content key -> FileDownloadState of a verified file with those contents
+        self.pending_duplicates = {}  # content key -> [FileDownloadState] waiting for that content to download
+        self.pending_copies = deque()  # FileDownloadState waiting for a download worker to copy its contents
+        self.files_copied = 0
+        self.shard = shard  # when set only the files assigned to this shard are downloaded
+        self.download_manifest = DownloadManifest(dest_directory, get_download_manifest_filename(shard))
+        self.directory_cache = DirectoryCache()
+        self.file_sync_batch = None
+        if config.download_fsync_batch_size:
+            self.file_sync_batch = FileSyncBatch(config.download_fsync_batch_size)
+        self.download_scheduler = DownloadScheduler(config.download_schedule_window, config.download_batch_size,
+                                                    config.download_batch_file_size, self.num_workers)
+        self.pending_downloads = 0  # worker tasks that have been started but not finished
+        # heap of (not before time, sequence number, FileDownloadState) for failed downloads waiting to be retried
+        self.delayed_retries = []
+        self.delayed_retry_sequence = itertools.count()
+        # filled by pool callbacks with FileDownloadState, a list of them for batches, or exceptions
+        self.completed_downloads = queue.Queue()
+        self.progress_counters = DownloadProgressCounters(self.num_workers)
         self.files_downloaded = 0
         self.files_to_download = None
-        self.file_download_statuses = {}
-        self.download_status_list = []
+        self.files_to_download_is_estimate = False
+        self.listing_complete = False
+        self.bytes_to_download = 0  # size of the files sent to download workers
+        # verification results are streamed to a file instead of kept for every file
+        self.verification_results = DownloadVerificationResults(dest_directory,
+                                                                get_download_verification_filename(shard))
         self.spinner_chars = "|/-\\"
         self.start_time = None
+        self.last_progress_time = 0
+        self.refreshed_listing_page_num = None  # page of the project file listing last read to refresh urls
+        self.refreshed_listing_urls = {}  # file_id -> (url, issued_at) for files on that page
 
     def run(self):
         self.start_time = time.time()
-        self._download_files()
+        self.download_manifest.load()
+        try:
+            self._download_files()
+        finally:
+            self._flush_file_sync_batch()
+            self.download_manifest.save()
+            self.verification_results.close()
+            self._write_shard_download_summary()
         self._show_downloaded_files_status()
 
     def _download_files(self):
-        pool = multiprocessing.Pool(self.num_workers)
+        pool = multiprocessing.Pool(self.num_workers, initializer=init_download_worker,
+                                    initargs=(self.progress_counters,))
         try:
-            for project_file in self._get_project_files():
-                self._download_file(pool, project_file)
-                while self._work_queue_is_full():
+            for project_file, headers in self._get_project_files():
+                self._download_file(project_file, headers)
+                self._dispatch_scheduled_downloads(pool)
+                while self.download_scheduler.is_full():
                     self._wait_for_and_retry_failed_downloads(pool)
+                    self._dispatch_scheduled_downloads(pool)
+            self.listing_complete = True
+            self._dispatch_scheduled_downloads(pool)
             while self._work_queue_is_not_empty():
                 self._wait_for_and_retry_failed_downloads(pool)
+                self._dispatch_scheduled_downloads(pool)
+            self.show_progress_bar()  # progress redraws are throttled so show the final counts
         finally:
             pool.close()
 
     def _show_downloaded_files_status(self):
-        print("\nVerifying contents of {} downloaded files using file hashes.".format(self.files_to_download))
-        all_good = True
-        files_with_mismatched_hashes = 0
-        for download_status in self.download_status_list:
-            if not download_status.has_a_valid_hash():
-                all_good = False
-            if download_status.status == FileHashStatus.STATUS_WARNING:
-                files_with_mismatched_hashes += 1
-            print(download_status.get_status_line())
+        verification_results = self.verification_results
+        print("\nVerified contents of {} downloaded files using file hashes.".format(verification_results.files))
+        if verification_results.files:
+            print("Wrote file hashes to {}.".format(verification_results.path))
+        for failed_status_line in verification_results.failed_status_lines:
+            print(failed_status_line)
+        all_good = verification_results.all_good()
+        files_with_mismatched_hashes = verification_results.files_with_mismatched_hashes
+        if self.files_copied:
+            print("Copied {} files with duplicate contents instead of downloading them.".format(self.files_copied))
         if all_good:
             print("All downloaded files have been verified successfully.")
             if files_with_mismatched_hashes:
@@ -246,85 +669,340 @@ class ProjectFileDownloader(object):
         else:
             raise ValueError("ERROR: Downloaded file(s) do not match the expected hashes.")
 
+    def _write_shard_download_summary(self):
+        """
+        Write the verification summary of a sharded download. Called even when the download fails so the
+        summary includes the file that stopped it.
+        """
+        if self.shard:
+            verification_results = self.verification_results
+            summary_path = self.shard.write_download_summary(self.dest_directory, {
+                'project_id': self.project.id,
+                'files': verification_results.files,
+                'files_with_mismatched_hashes': verification_results.files_with_mismatched_hashes,
+                'failed_files': verification_results.failed_status_lines,
+                'all_good': verification_results.all_good(),
+            })
+            print("Wrote verification summary for shard {} to {}.".format(self.shard, summary_path))
+
     def _get_project_files(self):
-        project_files_generator = self.project.get_project_files_generator(self.config.page_size)
-        if self.path_filter:
-            # fetch all files so we can determine an accurate filtered count
-            project_files = self._filter_project_files(project_files_generator)
-            self._print_path_filter_warnings()
-            self.files_to_download = len(project_files)
+        project_files_generator = self.project.get_project_files_generator(self.config.page_size,
+                                                                           ExcludeResponseFields.DOWNLOAD)
+        if self.path_filter or self.shard:
+            # start downloading matching files while the rest of the listing is fetched
+            for project_file, headers in self._filter_project_files(project_files_generator):
+                yield project_file, headers
             self.show_progress_bar()
-            for project_file in project_files:
-                yield project_file
+            self._print_path_filter_warnings()
         else:
             for project_file, headers in project_files_generator:
                 if self.files_to_download is None:
                     self.files_to_download = int(headers.get(DDS_TOTAL_HEADER))
                     self.show_progress_bar()
-                yield project_file
+                yield project_file, headers
 
     def _filter_project_files(self, project_files_generator):
-        project_files = []
+        """
+        Generator of the project files included by path_filter and shard.
+        While the listing is being fetched files_to_download is an estimate based on the fraction of
+        files seen so far that were included. Once the listing is complete it is the exact count.
+        :param project_files_generator: generator of (ProjectFile, headers) pairs
+        :return: generator of (ProjectFile, headers) pairs
+        """
+        files_seen = 0
+        files_included = 0
+        self.files_to_download_is_estimate = True
         for project_file, headers in project_files_generator:
-            if self.path_filter.include_path(project_file.path):
-                project_files.append(project_file)
-        return project_files
+            files_seen += 1
+            total_files = int(headers.get(DDS_TOTAL_HEADER))
+            include_file = self._include_project_file(project_file)
+            if include_file:
+                files_included += 1
+            self.files_to_download = max(files_included, int(round(files_included * total_files / files_seen)))
+            if include_file:
+                yield project_file, headers
+        self.files_to_download = files_included
+        self.files_to_download_is_estimate = False
+
+    def _include_project_file(self, project_file):
+        if self.shard and not self.shard.includes(project_file.id):
+            return False
+        if self.path_filter:
+            return self.path_filter.include_path(project_file.path)
+        return True
 
     def _print_path_filter_warnings(self):
         if self.path_filter:
             unused_paths = self.path_filter.get_unused_paths()
             if unused_paths:
-                print('WARNING: Path(s) not found: {}.'.format(','.join(unused_paths)))
+                print('\nWARNING: Path(s) not found: {}.'.format(','.join(unused_paths)))
 
-    def _download_file(self, pool, project_file):
+    def _download_file(self, project_file, headers):
         output_path = project_file.get_local_path(self.dest_directory)
-        output_path_parent = os.path.dirname(output_path)
-        if not os.path.exists(output_path_parent):
-            os.makedirs(output_path_parent)
-        file_download_state = FileDownloadState(project_file, output_path, self.config)
-        self._async_download_file(pool, file_download_state)
+        self.directory_cache.make_parent_directory(output_path)
+        file_download_state = FileDownloadState(project_file, output_path, self.config,
+                                                url_issued_at=get_listing_issued_time(headers),
+                                                listing_page_num=get_listing_page_num(headers))
+        if not self.verify:
+            manifest_entry = self.download_manifest.find_matching_entry(project_file, output_path)
+            if manifest_entry:
+                self._record_unchanged_file(file_download_state, manifest_entry)
+                return
+        if self.dedupe:
+            self._download_or_copy_file(file_download_state)
+        else:
+            self._schedule_download(file_download_state)
+
+    def _download_or_copy_file(self, file_download_state):
+        """
+        Download file_download_state unless a file with the same contents has been or is being downloaded.
+        Files waiting on a download of the same contents are copied once that download completes.
+        :param file_download_state: FileDownloadState: file to download
+        """
+        content_key = file_download_state.get_content_key()
+        if content_key:
+            if content_key in self.downloaded_contents:
+                self._copy_downloaded_contents(self.downloaded_contents[content_key], file_download_state)
+                return
+            if content_key in self.pending_duplicates:
+                self.pending_duplicates[content_key].append(file_download_state)
+                return
+            self.pending_duplicates[content_key] = []
+        self._schedule_download(file_download_state)
+
+    def _copy_downloaded_contents(self, source_file_download_state, file_download_state):
+        """
+        Queue file_download_state to be created from a verified download of the same contents.
+        A download worker makes the copy (see copy_file) so copying a large file doesn't hold up handling
+        finished downloads. The file is downloaded instead if it can't be copied or verified.
+        :param source_file_download_state: FileDownloadState: verified download with the same contents
+        :param file_download_state: FileDownloadState: file to create
+        """
+        verified_hash = source_file_download_state.status.file_hash
+        file_download_state.copy_source = (source_file_download_state.output_path,
+                                           {verified_hash.algorithm: verified_hash.expected_hash_value})
+        self.pending_copies.append(file_download_state)
+
+    def _add_downloaded_contents(self, file_download_state):
+        """
+        Remember a verified file so later files with the same contents can be copied from it.
+        :param file_download_state: FileDownloadState: file in an ok state
+        :return: [FileDownloadState]: files that were waiting for these contents to be downloaded
+        """
+        content_key = file_download_state.get_content_key()
+        if not self.dedupe or not content_key:
+            return []
+        self.downloaded_contents.setdefault(content_key, file_download_state)
+        return self.pending_duplicates.pop(content_key, [])
+
+    def _schedule_download(self, file_download_state):
+        """
+        Queue file_download_state to be downloaded once a download worker is free.
+        :param file_download_state: FileDownloadState: file to download
+        """
+        self.bytes_to_download += file_download_state.size
+        self.download_scheduler.add(file_download_state)
+
+    def _dispatch_scheduled_downloads(self, pool):
+        """
+        Start retries that have waited long enough, pending copies and scheduled downloads until every download
+        worker is busy or there is nothing left to start.
+        Urls are refreshed here since a file may wait in the scheduler for some time.
+        :param pool: multiprocessing.Pool: pool to download files with
+        """
+        current_time = time.time()
+        while not self._work_queue_is_full() and self.delayed_retries and \
+                self.delayed_retries[0][0] <= current_time:
+            file_download_state = heapq.heappop(self.delayed_retries)[2]
+            self._refresh_url_if_expiring(file_download_state)
+            self._async_download_file(pool, file_download_state)
+        while not self._work_queue_is_full() and self.pending_copies:
+            self._async_copy_file(pool, self.pending_copies.popleft())
+        while not self._work_queue_is_full() and self.download_scheduler.has_pending():
+            file_download_states = self.download_scheduler.pop_batch()
+            for file_download_state in file_download_states:
+                self._refresh_url_if_expiring(file_download_state)
+            self._async_download_files(pool, file_download_states)
+
+    def _refresh_url_if_expiring(self, file_download_state):
+        """
+        Replace the url of file_download_state when it will expire within config.download_url_refresh_margin.
+        Urls are refreshed in bulk by re-reading the project file listing page the file came from, falling back
+        to requesting a url for just this file.
+        :param file_download_state: FileDownloadState: download about to be started
+        """
+        refresh_deadline = time.time() + self.config.download_url_refresh_margin
+        if not file_download_state.url_expires_before(refresh_deadline):
+            return
+        url_and_issued_at = self._get_listing_page_url(file_download_state, refresh_deadline)
+        if not url_and_issued_at:
+            file_download = self.dds_connection.get_file_download(file_download_state.file_id)
+            url_and_issued_at = (file_download.host + file_download.url, time.time())
+        file_download_state.set_url(*url_and_issued_at)
+
+    def _get_listing_page_url(self, file_download_state, refresh_deadline):
+        """
+        Look up a fresh url for file_download_state from its project file listing page.
+        The most recently read page is cached since files are downloaded close to listing order.
+        :param file_download_state: FileDownloadState: download that needs a fresh url
+        :param refresh_deadline: float: epoch time the url must not expire before
+        :return: (str, float): url and time it was issued or None if not found
+        """
+        page_num = file_download_state.listing_page_num
+        if page_num is None:
+            return None
+        url_and_issued_at = None
+        if page_num == self.refreshed_listing_page_num:
+            url_and_issued_at = self.refreshed_listing_urls.get(file_download_state.file_id)
+        if not url_and_issued_at or self._url_expires_before(url_and_issued_at, refresh_deadline):
+            self._read_listing_page_urls(page_num)
+            url_and_issued_at = self.refreshed_listing_urls.get(file_download_state.file_id)
+        return url_and_issued_at
+
+    def _url_expires_before(self, url_and_issued_at, deadline):
+        url, issued_at = url_and_issued_at
+        return get_url_expiration(url, issued_at, self.config.download_url_ttl) < deadline
+
+    def _read_listing_page_urls(self, page_num):
+        issued_at = time.time()
+        project_files = self.project.get_project_files_page(self.config.page_size, page_num,
+                                                            ExcludeResponseFields.DOWNLOAD)
+        self.refreshed_listing_page_num = page_num
+        self.refreshed_listing_urls = {}
+        for project_file in project_files:
+            url = project_file.file_url['host'] + project_file.file_url['url']
+            self.refreshed_listing_urls[project_file.id] = (url, issued_at)
+
+    def _record_unchanged_file(self, file_download_state, manifest_entry):
+        """
+        Mark a file complete based on the hash recorded in the download manifest without reading the file.
+        :param file_download_state: FileDownloadState: file that is already downloaded
+        :param manifest_entry: dict: matching download manifest entry
+        """
+        verified_hash = manifest_entry['hash']
+        file_hash_status = FileHashStatus.determine_for_hashes(
+            file_download_state.hashes, file_download_state.output_path,
+            computed_hash_values={verified_hash['algorithm']: verified_hash['value']})
+        file_download_state.mark_already_complete(file_hash_status)
+        self._record_ok_download(file_download_state)
+        for duplicate_file_download_state in self._add_downloaded_contents(file_download_state):
+            self._copy_downloaded_contents(file_download_state, duplicate_file_download_state)
+        self._show_progress_bar_if_due()
 
     def _async_download_file(self, pool, file_download_state):
-        async_result = pool.apply_async(download_file, (file_download_state, self.message_queue))
-        self.async_download_results.append(async_result)
+        pool.apply_async(download_file, (file_download_state,),
+                         callback=self.completed_downloads.put, error_callback=self.completed_downloads.put)
+        self.pending_downloads += 1
+
+    def _async_copy_file(self, pool, file_download_state):
+        pool.apply_async(copy_file, (file_download_state,),
+                         callback=self.completed_downloads.put, error_callback=self.completed_downloads.put)
+        self.pending_downloads += 1
+
+    def _schedule_retry(self, file_download_state):
+        """
+        Retry a failed download once it has waited long enough. The wait grows exponentially with jitter for each
+        retry so downloads don't retry in lockstep, or is the time the storage host asked us to wait.
+        Waiting retries don't hold a download worker; _dispatch_scheduled_downloads starts them when they are due.
+        :param file_download_state: FileDownloadState: failed download with a refreshed url
+        """
+        retry_num = self.config.file_download_retries - file_download_state.retries
+        backoff = ExponentialBackoff(RetrySettings.FETCH_EXTERNAL_RETRY_SECONDS,
+                                     RetrySettings.FETCH_EXTERNAL_RETRY_MAX_SECONDS)
+        not_before = time.time() + backoff.get_wait_seconds(retry_num, file_download_state.retry_after)
+        self._add_delayed_retry(file_download_state, not_before)
+
+    def _add_delayed_retry(self, file_download_state, not_before):
+        heapq.heappush(self.delayed_retries, (not_before, next(self.delayed_retry_sequence), file_download_state))
+
+    def _async_download_files(self, pool, file_download_states):
+        if len(file_download_states) == 1:
+            self._async_download_file(pool, file_download_states[0])
+        else:
+            pool.apply_async(download_files, (file_download_states,),
+                             callback=self.completed_downloads.put, error_callback=self.completed_downloads.put)
+            self.pending_downloads += 1
 
     def _work_queue_is_full(self):
-        return len(self.async_download_results) >= self.num_workers
+        return self.pending_downloads >= self.num_workers
 
     def _work_queue_is_not_empty(self):
-        return len(self.async_download_results) > 0
+        return self.pending_downloads > 0 or len(self.delayed_retries) > 0
 
     def _wait_for_and_retry_failed_downloads(self, pool):
-        download_results = self._pop_ready_download_results()
+        """
+        Block until a download finishes, the progress bar is due to be redrawn or a delayed retry is due, then
+        process any finished downloads scheduling retries of those that failed.
+        :param pool: multiprocessing.Pool: pool to resubmit downloads to
+        """
+        timeout = min(self._get_seconds_until_progress_due(), self._get_seconds_until_retry_due())
+        download_results = self._pop_completed_download_results(timeout=timeout)
         if download_results:
             self._process_download_results(pool, download_results)
         else:
-            self._try_process_message_queue()
-            time.sleep(0)  # Pause to give up CPU since no results are ready
+            self.show_progress_bar()
 
-    def _try_process_message_queue(self):
-        try:
-            file_id, bytes_downloaded, file_size, file_state = self.message_queue.get_nowait()
-            # This might be out of date for a little bit
-            self.file_download_statuses[file_id] = (bytes_downloaded, file_size, file_state)
+    def _show_progress_bar_if_due(self):
+        """
+        Redraw progress at most every PROGRESS_REDRAW_SECONDS for callers that run once per file.
+        """
+        if not self._get_seconds_until_progress_due():
             self.show_progress_bar()
+
+    def _get_seconds_until_retry_due(self):
+        if not self.delayed_retries:
+            return PROGRESS_REDRAW_SECONDS
+        return max(self.delayed_retries[0][0] - time.time(), 0)
+
+    def _get_seconds_until_progress_due(self):
+        return max(self.last_progress_time + PROGRESS_REDRAW_SECONDS - time.time(), 0)
+
+    def _pop_completed_download_results(self, timeout):
+        """
+        Wait up to timeout seconds for a download to finish returning all finished downloads.
+        Results of batches are flattened into the list. Raises any exception that escaped a download worker.
+        :param timeout: float: seconds to wait for the first finished download
+        :return: [FileDownloadState]: finished downloads, empty if none finished in time
+        """
+        task_results = []
+        try:
+            task_results.append(self.completed_downloads.get(timeout=timeout))
+            while True:
+                task_results.append(self.completed_downloads.get_nowait())
         except queue.Empty:
             pass
+        self.pending_downloads -= len(task_results)
+        download_results = []
+        for task_result in task_results:
+            if isinstance(task_result, BaseException):
+                raise task_result
+            if isinstance(task_result, list):
+                download_results.extend(task_result)
+            else:
+                download_results.append(task_result)
+        return download_results
 
     def show_progress_bar(self):
         files_downloaded, total_bytes_downloaded = self.get_download_progress()
         current_time = time.time()
+        self.last_progress_time = current_time
         bytes_progress = '{} {}'.format(
             humanize_bytes(total_bytes_downloaded),
             self.make_download_speed(current_time, total_bytes_downloaded))
-        sys.stdout.write("\r{} downloaded {} ({} of {} files complete)".format(
+        sys.stdout.write("\r{} downloaded {} ({} of {} files complete){}".format(
             self.make_spinner_char(current_time),
             bytes_progress.ljust(22),
             files_downloaded,
-            self.files_to_download
+            self.get_files_to_download_str(),
+            self.make_remaining_time(current_time, total_bytes_downloaded)
         ))
         sys.stdout.flush()
 
+    def get_files_to_download_str(self):
+        if self.files_to_download_is_estimate:
+            return '~{}'.format(self.files_to_download)
+        return str(self.files_to_download)
+
     def make_spinner_char(self, current_time):
         half_seconds = int(current_time)
         return self.spinner_chars[half_seconds % 4]
@@ -336,100 +1014,420 @@ class ProjectFileDownloader(object):
             transferred_bytes=total_bytes_downloaded
         )
 
+    def make_remaining_time(self, current_time, total_bytes_downloaded):
+        """
+        Predict when the download will finish. Only possible once the listing is complete since the size of
+        the files still to be listed is unknown.
+        :param current_time: float: current time
+        :param total_bytes_downloaded: int: bytes downloaded so far
+        :return: str: end user str
+        """
+        if not self.listing_complete:
+            return ''
+        remaining_time = remaining_time_str(
+            current_time=current_time,
+            start_time=self.start_time,
+            transferred_bytes=total_bytes_downloaded,
+            total_bytes=self.bytes_to_download
+        )
+        if remaining_time:
+            return ' ' + remaining_time
+        return ''
+
     def get_download_progress(self):
-        files_downloaded = 0
-        total_bytes_downloaded = 0
-        for file_id, download_info in self.file_download_statuses.items():
-            bytes_downloaded, file_size, file_state = download_info
-            # do not include files that were already downloaded in bytes downloaded
-            if file_state != FileDownloadState.ALREADY_COMPLETE:
-                total_bytes_downloaded += bytes_downloaded
-            if bytes_downloaded == file_size:
-                files_downloaded += 1
-        return files_downloaded, total_bytes_downloaded
-
-    def _pop_ready_download_results(self):
-        ready_results = []
-        for async_result in self._get_ready_async_results():
-            result = async_result.get()
-            # retrieve the value from the async result
-            ready_results.append(result)
-            # remove the async result from the list to watch
-            self.async_download_results.remove(async_result)
-        return ready_results
-
-    def _get_ready_async_results(self):
-        ready_results = []
-        for async_result in self.async_download_results:
-            if async_result.ready():
-                ready_results.append(async_result)
-        return ready_results
+        return self.files_downloaded, self.progress_counters.get_total_bytes_downloaded()
 
     def _process_download_results(self, pool, download_results):
         for file_download_state in download_results:
-            if file_download_state.is_ok_state():
-                file_id = file_download_state.file_id
-                size = file_download_state.size
-                status = file_download_state.status
-                self.file_download_statuses[file_id] = (size, size, file_download_state.state)
-                self.download_status_list.append(status)
+            if file_download_state.state == FileDownloadState.ALREADY_COMPLETE:
+                # a worker found the file already downloaded so its bytes won't be transferred
+                self.bytes_to_download -= file_download_state.size
+            if file_download_state.copy_source and not file_download_state.is_ok_state():
+                # the contents couldn't be copied so download them instead
+                file_download_state.copy_source = None
+                self._schedule_download(file_download_state)
+            elif file_download_state.is_ok_state():
+                if file_download_state.copy_source:
+                    self.files_copied += 1
+                self._record_ok_download(file_download_state)
+                self._add_to_download_manifest(file_download_state)
+                for duplicate_file_download_state in self._add_downloaded_contents(file_download_state):
+                    self._copy_downloaded_contents(file_download_state, duplicate_file_download_state)
             elif file_download_state.retries:
                 file_download_state.retries -= 1
                 # Refresh url in file_download_state
                 file_download = self.dds_connection.get_file_download(file_download_state.file_id)
-                file_download_state.url = file_download.host + file_download.url
+                file_download_state.set_url(file_download.host + file_download.url, time.time())
                 # Re-run download process
-                self._async_download_file(pool, file_download_state)
+                if file_download_state.state == FileDownloadState.EXPIRED_URL:
+                    # the url has been refreshed so retry as soon as a download worker is free
+                    self._add_delayed_retry(file_download_state, time.time())
+                else:
+                    self._schedule_retry(file_download_state)
             else:
-                raise ValueError("Error downloading {}\n{}".format(
-                    file_download_state.output_path,
-                    file_download_state.msg
-                ))
+                msg = "Error downloading {}\n{}".format(file_download_state.output_path, file_download_state.msg)
+                self.verification_results.add_failed(msg)
+                raise ValueError(msg)
         self.show_progress_bar()
 
+    def _record_ok_download(self, file_download_state):
+        self.files_downloaded += 1
+        self.verification_results.add(file_download_state.status)
+
+    def _add_to_download_manifest(self, file_download_state):
+        """
+        Record a verified download in the download manifest. When fsync is enabled downloads are only
+        recorded once they have been flushed to disk.
+        :param file_download_state: FileDownloadState: download in an ok state
+        """
+        if self.file_sync_batch:
+            for synced_file_download_state in self.file_sync_batch.add(file_download_state):
+                self.download_manifest.add(synced_file_download_state)
+        else:
+            self.download_manifest.add(file_download_state)
+
+    def _flush_file_sync_batch(self):
+        if self.file_sync_batch:
+            for synced_file_download_state in self.file_sync_batch.flush():
+                self.download_manifest.add(synced_file_download_state)
+
+
+def get_download_session(file_download_state):
+    """
+    Return a long lived requests.Session for the storage host of file_download_state.url.
+    Sessions are keyed by process id so a session inherited from a parent process is never reused,
+    and are sized so every segment thread downloading a file can hold its own connection.
+    Timeouts and socket options come from the http_* config settings.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :return: requests.Session
+    """
+    key = (os.getpid(), urlparse(file_download_state.url).netloc)
+    with _download_sessions_lock:
+        session = _download_sessions.get(key)
+        if not session:
+            transport = RequestsHttpTransport(file_download_state.http_transport_settings)
+            session = transport.create_session(pool_maxsize=max(file_download_state.segment_workers, 1))
+            _download_sessions[key] = session
+        return session
+
+
+def download_files(file_download_states):
+    """
+    Download a batch of small files one after another within a single worker task.
+    :param file_download_states: [FileDownloadState]: files to download
+    :return: [FileDownloadState]: result of downloading each file
+    """
+    return [download_file(file_download_state) for file_download_state in file_download_states]
+
+
+def get_download_response(file_download_state, headers):
+    """
+    Send a streaming GET request for file_download_state.url recording the result with the circuit breaker
+    for the storage host. Waits while the circuit is open.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :param headers: dict: headers to send
+    :return: requests.Response
+    """
+    session = get_download_session(file_download_state)
+    circuit_breaker = get_circuit_breaker(file_download_state.url)
+    with circuit_breaker.sending_request():
+        try:
+            response = session.get(file_download_state.url, headers=headers, stream=True)
+        except requests.exceptions.ConnectionError:
+            circuit_breaker.record_failure()
+            raise
+    circuit_breaker.record_response(response)
+    return response
+
 
-def download_file(file_download_state, message_queue=None):
+def copy_file(file_download_state):
+    """
+    Create a file from a verified file with the same contents (file_download_state.copy_source) by hard link,
+    reflink or copy. Linked files share the verified contents so only copies are rehashed.
+    :param file_download_state: FileDownloadState: file to create
+    :return: FileDownloadState: good or in the error state when the file couldn't be copied or verified
+    """
+    source_path, source_hash_values = file_download_state.copy_source
+    try:
+        copy_method = copy_downloaded_file(source_path, file_download_state.output_path)
+    except (IOError, OSError) as error:
+        return file_download_state.mark_error(msg=str(error))
+    computed_hash_values = None
+    if copy_method != COPY_METHOD_COPY:
+        computed_hash_values = source_hash_values
+    file_hash_status = FileHashStatus.determine_for_hashes(
+        file_download_state.hashes, file_download_state.output_path, computed_hash_values=computed_hash_values)
+    if file_hash_status.has_a_valid_hash():
+        return file_download_state.mark_good(file_hash_status)
+    return file_download_state.mark_error(msg=file_hash_status.get_status_line())
+
+
+def download_file(file_download_state):
+    file_download_state.computed_hash_values = None
     if os.path.exists(file_download_state.output_path):
         file_hash_status = file_download_state.calculate_file_hash_status()
         if file_hash_status.has_a_valid_hash():
             return file_download_state.mark_already_complete(file_hash_status)
     try:
+        partial_download = PartialDownload.load(file_download_state)
         file_download_state.state = FileDownloadState.DOWNLOADING
-        written_size = download_url_to_path(file_download_state, message_queue)
-        return compute_download_result(file_download_state, written_size)
+        if file_download_state.use_segmented_download():
+            written_size = download_url_segments_or_whole_to_path(file_download_state, partial_download)
+        else:
+            written_size = download_url_to_path(file_download_state, partial_download)
+        return compute_download_result(file_download_state, partial_download, written_size)
     except URLExpiredException:
         msg = 'Expired URL: {}'.format(file_download_state.url)
         return file_download_state.mark_expired_url(msg)
+    except HTTPError as error:
+        return file_download_state.mark_error(msg=str(error), retry_after=get_retry_after_seconds(error.response))
     except Exception as error:
         return file_download_state.mark_error(msg=str(error))
 
 
-def download_url_to_path(file_download_state, message_queue=None):
+def download_url_to_path(file_download_state, partial_download):
+    """
+    Download a file into partial_download's .part file resuming after any bytes written by a previous attempt.
+    The .part file is preallocated to its final size unless disabled by config.download_preallocate.
+    The written size is saved every PART_CHECKPOINT_BYTES so a killed process can resume near where it stopped.
+    Hashes are computed as the data is written and stored in file_download_state.computed_hash_values.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :param partial_download: PartialDownload: .part file to write to
+    :return: int: number of bytes in the .part file
+    """
+    partial_download.start(PartialDownload.SEQUENTIAL)
+    written_size = partial_download.get_sequential_written_size()
+    if written_size == file_download_state.size:
+        if not os.path.exists(partial_download.part_path):
+            open(partial_download.part_path, 'wb').close()  # an empty file has nothing to download
+        return written_size
+    headers = {}
+    if written_size:
+        headers['Range'] = 'bytes={}-'.format(written_size)
     try:
-        response = requests.get(file_download_state.url, stream=True)
-        written_size = 0
+        response = get_download_response(file_download_state, headers)
         response.raise_for_status()
-        with open(file_download_state.output_path, "wb") as outfile:
-            for chunk in response.iter_content(chunk_size=file_download_state.download_bytes_per_chunk):
-                if chunk:  # filter out keep-alive new chunks
-                    outfile.write(chunk)
-                    written_size += len(chunk)
-                    if message_queue:
-                        message_queue.put((file_download_state.file_id, written_size, file_download_state.size,
-                                           file_download_state.state))
+        if response.status_code != 206:
+            written_size = 0  # the host sent the whole file so start over
+        file_hashes = IncrementalFileHashes(file_download_state.hashes)
+        if written_size:
+            file_hashes.add_file_prefix(partial_download.part_path, written_size,
+                                        file_download_state.download_bytes_per_chunk)
+        fd = os.open(partial_download.part_path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o666)
+        with os.fdopen(fd, "wb") as outfile:
+            if file_download_state.preallocate:
+                preallocate_file(fd, file_download_state.size)
+            outfile.seek(written_size)
+            checkpoint_size = written_size + PART_CHECKPOINT_BYTES
+            try:
+                for chunk in response.iter_content(chunk_size=file_download_state.download_bytes_per_chunk):
+                    if chunk:  # filter out keep-alive new chunks
+                        outfile.write(chunk)
+                        file_hashes.add_chunk(chunk)
+                        written_size += len(chunk)
+                        add_bytes_downloaded(len(chunk))
+                        if written_size >= checkpoint_size:
+                            # the finally below doesn't run if the process is killed so record progress as we go
+                            outfile.flush()
+                            os.fsync(fd)
+                            partial_download.set_sequential_written_size(written_size)
+                            checkpoint_size = written_size + PART_CHECKPOINT_BYTES
+            finally:
+                outfile.flush()
+                partial_download.set_sequential_written_size(written_size)
+        file_download_state.computed_hash_values = file_hashes.get_hash_values()
         return written_size
     except HTTPError:
-        if response.status_code == SWIFT_EXPIRED_STATUS_CODE or response.status_code == S3_EXPIRED_STATUS_CODE:
-            raise URLExpiredException()
+        raise_for_expired_url(response)
         raise
 
 
-def compute_download_result(file_download_state, written_size):
+def raise_for_expired_url(response):
+    """
+    Raise URLExpiredException if the response status code is one the storage backends use for an expired url.
+    :param response: requests.Response: response that failed
+    """
+    if response.status_code == SWIFT_EXPIRED_STATUS_CODE or response.status_code == S3_EXPIRED_STATUS_CODE:
+        raise URLExpiredException()
+
+
+def download_url_segments_or_whole_to_path(file_download_state, partial_download):
+    """
+    Download a large file in segments falling back to a single request when the host doesn't support ranges.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :param partial_download: PartialDownload: .part file to write to
+    :return: int: number of bytes written
+    """
+    try:
+        return download_url_segments_to_path(file_download_state, partial_download)
+    except RangeNotSupportedException:
+        return download_url_to_path(file_download_state, partial_download)
+
+
+def make_download_segments(file_size, segment_size):
+    """
+    Split a file into (start, end) byte ranges of segment_size. The end value is inclusive as in HTTP Range headers.
+    :param file_size: int: total size of the file
+    :param segment_size: int: bytes per segment
+    :return: [(int, int)]: list of inclusive byte ranges
+    """
+    return [(start, min(start + segment_size, file_size) - 1) for start in range(0, file_size, segment_size)]
+
+
+class SegmentedDownloadProgress(object):
+    """
+    Merges progress from the threads downloading segments of a single file.
+    """
+    def __init__(self):
+        self.written_size = 0
+        self.downloaded_size = 0  # bytes downloaded by this attempt and reported with add_bytes_downloaded
+        self.unfinished_segment_sizes = {}  # start offset -> bytes written to segments that haven't completed
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def add_existing(self, num_bytes):
+        """
+        Count bytes written by a previous attempt towards the size of the file.
+        """
+        with self.lock:
+            self.written_size += num_bytes
+
+    def add_written(self, start, num_bytes):
+        """
+        Count bytes written to the segment beginning at start.
+        """
+        with self.lock:
+            self.written_size += num_bytes
+            self.downloaded_size += num_bytes
+            self.unfinished_segment_sizes[start] = self.unfinished_segment_sizes.get(start, 0) + num_bytes
+            add_bytes_downloaded(num_bytes)
+
+    def complete_segment(self, start):
+        """
+        Keep the bytes of the segment beginning at start since it has been recorded as complete.
+        """
+        with self.lock:
+            self.unfinished_segment_sizes.pop(start, None)
+
+    def discard_unfinished(self):
+        """
+        Remove bytes of segments that didn't complete from the progress total since they will be downloaded again.
+        """
+        with self.lock:
+            self._discard(sum(self.unfinished_segment_sizes.values()))
+
+    def discard_downloaded(self):
+        """
+        Remove all bytes downloaded by this attempt from the progress total since the whole file will be downloaded.
+        """
+        with self.lock:
+            self._discard(self.downloaded_size)
+
+    def _discard(self, num_bytes):
+        add_bytes_downloaded(-num_bytes)
+        self.written_size -= num_bytes
+        self.downloaded_size -= num_bytes
+        self.unfinished_segment_sizes = {}
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_stopped(self):
+        return self.stop_event.is_set()
+
+
+def download_url_segments_to_path(file_download_state, partial_download):
+    """
+    Download a file using concurrent HTTP Range requests writing each segment into a preallocated .part file.
+    Segments completed by a previous attempt are skipped.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :param partial_download: PartialDownload: .part file to write to and record completed segments in
+    :return: int: number of bytes written
+    """
+    partial_download.start(PartialDownload.SEGMENTED)
+    progress = SegmentedDownloadProgress()
+    remaining_segments = []
+    for start, end in make_download_segments(file_download_state.size, file_download_state.segment_size):
+        if partial_download.is_segment_complete(start, end):
+            progress.add_existing(end + 1 - start)
+        else:
+            remaining_segments.append((start, end))
+    fd = os.open(partial_download.part_path, os.O_WRONLY | os.O_CREAT, 0o666)
+    try:
+        if file_download_state.preallocate:
+            preallocate_file(fd, file_download_state.size)
+        else:
+            os.ftruncate(fd, file_download_state.size)
+        with ThreadPoolExecutor(max_workers=file_download_state.segment_workers) as executor:
+            futures = [executor.submit(download_url_segment, file_download_state, partial_download, fd, start, end,
+                                       progress)
+                       for start, end in remaining_segments]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                progress.stop()
+                for future in futures:
+                    future.cancel()
+                raise
+    except RangeNotSupportedException:
+        # the executor has finished so no segment thread is still adding to progress
+        progress.discard_downloaded()
+        raise
+    except BaseException:
+        # segments are only recorded once complete so the retry downloads unfinished ones from their start
+        progress.discard_unfinished()
+        raise
+    finally:
+        os.close(fd)
+    return progress.written_size
+
+
+def download_url_segment(file_download_state, partial_download, fd, start, end, progress):
+    """
+    Download bytes start through end (inclusive) of a file writing them at the same offset within fd.
+    :param file_download_state: FileDownloadState: details about the file to download
+    :param partial_download: PartialDownload: records the segment once it has been completely written
+    :param fd: int: file descriptor of the preallocated output file
+    :param start: int: offset of the first byte in this segment
+    :param end: int: offset of the last byte in this segment
+    :param progress: SegmentedDownloadProgress: receives bytes written and signals when to stop
+    """
+    headers = {'Range': 'bytes={}-{}'.format(start, end)}
+    response = get_download_response(file_download_state, headers)
+    try:
+        response.raise_for_status()
+    except HTTPError:
+        raise_for_expired_url(response)
+        raise
+    if response.status_code != 206:
+        response.close()  # release the connection instead of leaving the unread whole-file response open
+        raise RangeNotSupportedException()
+    offset = start
+    for chunk in response.iter_content(chunk_size=file_download_state.download_bytes_per_chunk):
+        if progress.is_stopped():
+            return
+        if chunk:  # filter out keep-alive new chunks
+            os.pwrite(fd, chunk, offset)
+            offset += len(chunk)
+            progress.add_written(start, len(chunk))
+    if offset != end + 1:
+        raise ValueError("Downloaded segment was wrong size. Expected: {} Actual: {}".format(
+            end + 1 - start, offset - start))
+    partial_download.add_completed_segment(start, end)
+    progress.complete_segment(start)
+
+
+def compute_download_result(file_download_state, partial_download, written_size):
     if written_size == file_download_state.size:
-        file_hash_status = file_download_state.calculate_file_hash_status()
+        file_hash_status = file_download_state.calculate_file_hash_status(partial_download.part_path)
         if file_hash_status.has_a_valid_hash():
+            partial_download.finalize()
+            file_hash_status.file_hash.file_path = file_download_state.output_path
             return file_download_state.mark_good(file_hash_status)
         else:
+            # the .part contents are bad so the next attempt must start over
+            partial_download.discard()
             return file_download_state.mark_error(msg=file_hash_status.get_status_line())
     else:
         msg = "Downloaded file was wrong size. Expected: {} Actual: {}".format(file_download_state.size, written_size)
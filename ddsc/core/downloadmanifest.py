@@ -0,0 +1,130 @@
+"""
+Keeps a record of files downloaded into a directory so later downloads can skip unchanged files without rehashing.
+"""
+
+import os
+import json
+
+DOWNLOAD_MANIFEST_FILENAME = '.ddsclient-download-manifest.jsonl'
+SHARD_DOWNLOAD_MANIFEST_FILENAME_FORMAT = '.ddsclient-download-manifest-{}.jsonl'
+
+
+def get_download_manifest_filename(shard=None):
+    """
+    Return the manifest filename to use. Each shard of a sharded download keeps its own manifest so hosts
+    downloading into a shared directory never write the same file.
+    :param shard: Shard: shard being downloaded or None when downloading all files
+    :return: str: filename
+    """
+    if shard:
+        return SHARD_DOWNLOAD_MANIFEST_FILENAME_FORMAT.format(shard.get_suffix())
+    return DOWNLOAD_MANIFEST_FILENAME
+
+
+class DownloadManifest(object):
+    """
+    JSON lines file in the destination directory with one entry per verified download.
+    Each entry records the remote file (file_id, file_version_id, size and verified hash) along with the
+    size and modification time of the local file once it was verified. When the local file's stat still
+    matches the entry the file can be skipped without reading it.
+    Entries are appended as downloads complete through a file kept open for the run and the file is compacted
+    when saved.
+    """
+    def __init__(self, dest_directory, filename=DOWNLOAD_MANIFEST_FILENAME):
+        """
+        :param dest_directory: str: directory files are downloaded into
+        :param filename: str: name of the manifest file within dest_directory
+        """
+        self.dest_directory = dest_directory
+        self.path = os.path.join(dest_directory, filename)
+        self.entries = {}
+        self.outfile = None
+
+    def load(self):
+        """
+        Read entries from the manifest file if it exists. Later entries for the same path replace earlier ones.
+        Unreadable lines are ignored since they only cause the associated file to be rehashed.
+        """
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as infile:
+                for line in infile:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry['path']] = entry
+                    except (ValueError, KeyError, TypeError):
+                        pass
+
+    def save(self):
+        """
+        Atomically rewrite the manifest file with a single line per path.
+        """
+        if self.outfile:
+            self.outfile.close()
+            self.outfile = None
+        if not os.path.exists(self.dest_directory):
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            for entry in self.entries.values():
+                outfile.write(json.dumps(entry) + '\n')
+        os.replace(temp_path, self.path)
+
+    def _get_relative_path(self, output_path):
+        return os.path.relpath(output_path, self.dest_directory)
+
+    def find_matching_entry(self, project_file, output_path):
+        """
+        Return the manifest entry for output_path if both the remote file and local file are unchanged.
+        :param project_file: ProjectFile: remote file that would be downloaded to output_path
+        :param output_path: str: local path for project_file
+        :return: dict: matching manifest entry or None
+        """
+        entry = self.entries.get(self._get_relative_path(output_path))
+        if not entry or not self._entry_matches_project_file(entry, project_file):
+            return None
+        try:
+            stat_result = os.stat(output_path)
+        except OSError:
+            return None
+        if stat_result.st_size != entry['size'] or stat_result.st_mtime_ns != entry['mtime_ns']:
+            return None
+        return entry
+
+    @staticmethod
+    def _entry_matches_project_file(entry, project_file):
+        if entry.get('file_id') != project_file.id or entry.get('size') != project_file.size:
+            return False
+        if entry.get('file_version_id') != project_file.file_version_id:
+            return False
+        verified_hash = entry.get('hash', {})
+        for hash_info in project_file.hashes:
+            if hash_info.get('algorithm') == verified_hash.get('algorithm') and \
+                    hash_info.get('value') == verified_hash.get('value'):
+                return True
+        return False
+
+    def add(self, file_download_state):
+        """
+        Record a verified download appending the entry to the manifest file.
+        The manifest file is opened with the first entry since dest_directory may not exist before that.
+        :param file_download_state: FileDownloadState: download in an ok state with a hash status
+        """
+        output_path = file_download_state.output_path
+        stat_result = os.stat(output_path)
+        file_hash = file_download_state.status.file_hash
+        entry = {
+            'path': self._get_relative_path(output_path),
+            'file_id': file_download_state.file_id,
+            'file_version_id': file_download_state.file_version_id,
+            'size': stat_result.st_size,
+            'mtime_ns': stat_result.st_mtime_ns,
+            'hash': {
+                'algorithm': file_hash.algorithm,
+                'value': file_hash.expected_hash_value,
+            }
+        }
+        self.entries[entry['path']] = entry
+        if not self.outfile:
+            self.outfile = open(self.path, 'a')
+        self.outfile.write(json.dumps(entry) + '\n')
@@ -0,0 +1,60 @@
+"""
+Decides the order files are handed to download workers. Files waiting for a free worker are started largest first
+so a huge file found late in the project listing doesn't run alone after every other worker has gone idle.
+Small files are grouped into batches so each worker task downloads several of them.
+"""
+
+import heapq
+import math
+
+
+class DownloadScheduler(object):
+    """
+    Holds files waiting for a free download worker and hands them out largest first.
+    Only window_size files are held at a time so the project listing can be streamed without keeping
+    every file in memory.
+    """
+    def __init__(self, window_size, batch_size, batch_file_size, num_workers):
+        """
+        :param window_size: int: maximum number of files waiting to be downloaded
+        :param batch_size: int: maximum number of small files downloaded by a single worker task
+        :param batch_file_size: int: files this size or smaller can be downloaded in a batch
+        :param num_workers: int: number of download workers that batches are spread across
+        """
+        self.window_size = max(window_size, 1)
+        self.batch_size = max(batch_size, 1)
+        self.batch_file_size = batch_file_size
+        self.num_workers = max(num_workers, 1)
+        self.heap = []
+        self.items_added = 0  # keeps files of equal size in the order they were added
+
+    def add(self, item):
+        """
+        Add a file that should be downloaded.
+        :param item: object: file to download with a size property such as FileDownloadState
+        """
+        heapq.heappush(self.heap, (-item.size, self.items_added, item))
+        self.items_added += 1
+
+    def is_full(self):
+        return len(self.heap) >= self.window_size
+
+    def has_pending(self):
+        return len(self.heap) > 0
+
+    def pop_batch(self):
+        """
+        Remove the next work for a download worker. This is the largest waiting file on its own or, when only
+        small files remain, a batch of small files. Batches are kept small enough to spread the waiting files
+        across all workers.
+        :return: [object]: files to download in a single worker task
+        """
+        _, _, item = heapq.heappop(self.heap)
+        batch = [item]
+        if item.size <= self.batch_file_size:
+            # every remaining file is no larger than item so they are all small
+            batch_size = min(self.batch_size, int(math.ceil(float(len(self.heap) + 1) / self.num_workers)))
+            while len(batch) < batch_size and self.heap:
+                _, _, item = heapq.heappop(self.heap)
+                batch.append(item)
+        return batch
@@ -0,0 +1,78 @@
+"""
+Records the hash verification result of each downloaded file as it completes.
+Results are streamed to a checksum file in the destination directory instead of being kept in memory and printed.
+"""
+
+import os
+
+DOWNLOAD_VERIFICATION_FILENAME = '.ddsclient-download-verification.md5'
+SHARD_DOWNLOAD_VERIFICATION_FILENAME_FORMAT = '.ddsclient-download-verification-{}.md5'
+
+
+def get_download_verification_filename(shard=None):
+    """
+    Return the verification results filename to use. Each shard of a sharded download writes its own results.
+    :param shard: Shard: shard being downloaded or None when downloading all files
+    :return: str: filename
+    """
+    if shard:
+        return SHARD_DOWNLOAD_VERIFICATION_FILENAME_FORMAT.format(shard.get_suffix())
+    return DOWNLOAD_VERIFICATION_FILENAME
+
+
+class DownloadVerificationResults(object):
+    """
+    Appends a line per verified file to a checksum file using the BSD tagged format ('MD5 (path) = hash')
+    that `md5sum -c` accepts, with paths relative to the destination directory.
+    Only counts and the status lines of failed files are kept in memory.
+    """
+    def __init__(self, dest_directory, filename=DOWNLOAD_VERIFICATION_FILENAME):
+        """
+        :param dest_directory: str: directory files are downloaded into
+        :param filename: str: name of the results file within dest_directory
+        """
+        self.dest_directory = dest_directory
+        self.path = os.path.join(dest_directory, filename)
+        self.outfile = None
+        self.files = 0
+        self.files_with_mismatched_hashes = 0
+        self.failed_status_lines = []
+
+    def add(self, file_hash_status):
+        """
+        Record the verification result for a downloaded file.
+        The results file is created with the first result since dest_directory may not exist before that.
+        :param file_hash_status: FileHashStatus: verification result for the file
+        """
+        self.files += 1
+        if file_hash_status.has_mismatched_hashes():
+            self.files_with_mismatched_hashes += 1
+        if not file_hash_status.has_a_valid_hash():
+            self.failed_status_lines.append(file_hash_status.get_status_line())
+        if not self.outfile:
+            self.outfile = open(self.path, 'w')
+        self.outfile.write(self._format_line(file_hash_status.file_hash))
+
+    def add_failed(self, status_line):
+        """
+        Record a file that could not be downloaded so it is included with the failed files.
+        :param status_line: str: description of the failure
+        """
+        self.failed_status_lines.append(status_line)
+
+    def _format_line(self, file_hash):
+        path = os.path.relpath(file_hash.file_path, self.dest_directory)
+        prefix = ''
+        if '\\' in path or '\n' in path:
+            # escaped the same way md5sum escapes names it can't otherwise represent on a single line
+            prefix = '\\'
+            path = path.replace('\\', '\\\\').replace('\n', '\\n')
+        return '{}{} ({}) = {}\n'.format(prefix, file_hash.algorithm.upper(), path, file_hash.expected_hash_value)
+
+    def all_good(self):
+        return not self.failed_status_lines
+
+    def close(self):
+        if self.outfile:
+            self.outfile.close()
+            self.outfile = None
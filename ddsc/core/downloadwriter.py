@@ -0,0 +1,154 @@
+"""
+Writes downloaded files to disk: creates output directories, preallocates file space, flushes completed files
+and creates copies of files that have already been downloaded.
+"""
+
+import os
+import errno
+import shutil
+
+# errors posix_fallocate returns when the filesystem can't preallocate space
+PREALLOCATE_UNSUPPORTED_ERRNOS = (errno.EOPNOTSUPP, errno.EINVAL, errno.ENOSYS)
+FICLONE = 0x40049409  # linux ioctl that makes a copy-on-write clone of a file
+COPY_TEMP_SUFFIX = '.copy'
+
+COPY_METHOD_HARDLINK = 'hardlink'
+COPY_METHOD_REFLINK = 'reflink'
+COPY_METHOD_COPY = 'copy'
+
+
+class DirectoryCache(object):
+    """
+    Creates the parent directories of output files remembering which directories already exist
+    so downloading many files into the same directory doesn't stat it for every file.
+    """
+    def __init__(self):
+        self.existing_directories = set()
+
+    def make_parent_directory(self, path):
+        """
+        Create the directory path will be written to if it doesn't already exist.
+        :param path: str: path of a file that will be written
+        """
+        parent_directory = os.path.dirname(path)
+        if parent_directory and parent_directory not in self.existing_directories:
+            os.makedirs(parent_directory, exist_ok=True)
+            self.existing_directories.add(parent_directory)
+
+
+def preallocate_file(fd, size):
+    """
+    Extend the file open as fd to size bytes reserving the disk space up front with posix_fallocate so large
+    files are written contiguously. Falls back to a sparse file when the platform or filesystem can't preallocate.
+    :param fd: int: file descriptor open for writing
+    :param size: int: final size of the file
+    """
+    if size and hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except OSError as error:
+            if error.errno not in PREALLOCATE_UNSUPPORTED_ERRNOS:
+                raise
+    os.ftruncate(fd, size)
+
+
+def fsync_path(path):
+    """
+    Flush the contents of a file or directory to disk.
+    :param path: str: path to flush
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileSyncBatch(object):
+    """
+    Flushes completed downloads to disk in batches so each file doesn't pay for its own fsync.
+    Once batch_size downloads have been added each file is flushed followed by the directories containing them
+    so the renames that moved the files into place are also on disk.
+    """
+    def __init__(self, batch_size):
+        """
+        :param batch_size: int: number of downloads to flush together
+        """
+        self.batch_size = batch_size
+        self.file_download_states = []
+
+    def add(self, file_download_state):
+        """
+        Add a completed download flushing the batch when it is full.
+        :param file_download_state: FileDownloadState: download written to file_download_state.output_path
+        :return: [FileDownloadState]: downloads that have been flushed to disk, empty when the batch isn't full
+        """
+        self.file_download_states.append(file_download_state)
+        if len(self.file_download_states) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """
+        Flush all downloads added since the last flush.
+        :return: [FileDownloadState]: downloads that have been flushed to disk
+        """
+        file_download_states = self.file_download_states
+        self.file_download_states = []
+        directories = set()
+        for file_download_state in file_download_states:
+            fsync_path(file_download_state.output_path)
+            directories.add(os.path.dirname(file_download_state.output_path) or os.curdir)
+        if os.name == 'posix':  # directories can only be opened for flushing on posix systems
+            for directory in sorted(directories):
+                fsync_path(directory)
+        return file_download_states
+
+
+def copy_downloaded_file(source_path, dest_path):
+    """
+    Create dest_path with the contents of source_path using the cheapest method the filesystem supports:
+    a hard link, a reflink (copy-on-write clone) or a full copy. dest_path is replaced atomically.
+    :param source_path: str: path of a file that has been downloaded
+    :param dest_path: str: path to create
+    :return: str: COPY_METHOD_HARDLINK, COPY_METHOD_REFLINK or COPY_METHOD_COPY
+    """
+    if os.path.exists(dest_path) and os.path.samefile(source_path, dest_path):
+        return COPY_METHOD_HARDLINK
+    temp_path = dest_path + COPY_TEMP_SUFFIX
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    try:
+        os.link(source_path, temp_path)
+        copy_method = COPY_METHOD_HARDLINK
+    except OSError:
+        if reflink_file(source_path, temp_path):
+            copy_method = COPY_METHOD_REFLINK
+        else:
+            shutil.copyfile(source_path, temp_path)
+            copy_method = COPY_METHOD_COPY
+    os.replace(temp_path, dest_path)
+    return copy_method
+
+
+def reflink_file(source_path, dest_path):
+    """
+    Create dest_path as a copy-on-write clone of source_path on filesystems that support it (btrfs, xfs).
+    :param source_path: str: path of the file to clone
+    :param dest_path: str: path to create
+    :return: bool: True if the clone was created
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    cloned = False
+    with open(source_path, 'rb') as infile, open(dest_path, 'wb') as outfile:
+        try:
+            fcntl.ioctl(outfile.fileno(), FICLONE, infile.fileno())
+            cloned = True
+        except OSError:
+            pass
+    if not cloned:
+        os.remove(dest_path)
+    return cloned
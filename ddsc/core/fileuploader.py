@@ -5,10 +5,12 @@ from __future__ import print_function
 import math
 import requests
 from multiprocessing import Process, Queue
-from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi, retry_until_resource_is_consistent
+from ddsc.core.ddsapi import DataServiceApi, RequestsHttpTransport, retry_until_resource_is_consistent
+from ddsc.core.tokenbroker import create_worker_auth
 from ddsc.core.util import ProgressQueue, wait_for_processes
 from ddsc.core.localstore import HashData
-from ddsc.core.retry import RetrySettings
+from ddsc.core.retry import RetrySettings, ExponentialBackoff, RETRY_LATER_STATUS_CODES, get_retry_after_seconds, \
+    get_circuit_breaker
 from ddsc.exceptions import DDSUserException
 import traceback
 import sys
@@ -29,7 +31,8 @@ class FileUploader(object):
     3) Sends the complete message to finalize the 'upload'
     4) Sends create_file message to remote store with the 'upload' id
     """
-    def __init__(self, config, data_service, local_file, hash_data, watcher, file_upload_post_processor=None):
+    def __init__(self, config, data_service, local_file, hash_data, watcher, file_upload_post_processor=None,
+                 token_broker=None):
         """
         Setup for sending to remote store.
         :param config: ddsc.config.Config user configuration settings from YAML file/environment
@@ -38,9 +41,11 @@ class FileUploader(object):
         :param hash_data: HashData hash calculated for the local file
         :param watcher: ProgressPrinter we notify of our progress
         :param file_upload_post_processor: object: has run(data_service, file_response) method to run after download
+        :param token_broker: TokenBroker: optional broker that refreshes the auth token for the upload processes
         """
         self.config = config
         self.data_service = data_service
+        self.token_broker = token_broker
         self.upload_operations = FileUploadOperations(self.data_service, watcher)
         self.file_upload_post_processor = file_upload_post_processor
         self.local_file = local_file
@@ -198,25 +203,42 @@ class FileUploadOperations(object):
 
     def _send_file_external_with_retry(self, http_verb, host, url, http_headers, chunk):
         """
-        Send chunk to host, url using http_verb. If http_verb is PUT and a connection error occurs
-        retry a few times. Pauses between retries. Raises if unsuccessful.
+        Send chunk to host, url using http_verb. If http_verb is PUT and a connection error or read timeout occurs
+        or the host responds that it is overloaded retry a few times. Pauses between retries using exponential backoff with
+        jitter honoring any Retry-After header. Raises if a connection error persists.
+        Requests wait while the circuit breaker for host is open.
         """
         count = 0
         retry_times = 1
         if http_verb == 'PUT':
             retry_times = RetrySettings.SEND_EXTERNAL_PUT_RETRY_TIMES
+        backoff = ExponentialBackoff(RetrySettings.SEND_EXTERNAL_RETRY_SECONDS,
+                                     RetrySettings.SEND_EXTERNAL_RETRY_MAX_SECONDS)
+        circuit_breaker = get_circuit_breaker(host)
         while True:
             try:
-                return self.data_service.send_external(http_verb, host, url, http_headers, chunk)
-            except requests.exceptions.ConnectionError:
-                count += 1
-                if count < retry_times:
-                    if count == 1:  # Only show a warning the first time we fail to send a chunk
-                        self._show_retry_warning(host)
-                    time.sleep(RetrySettings.SEND_EXTERNAL_RETRY_SECONDS)
+                with circuit_breaker.sending_request(sleep=time.sleep):
+                    resp = self.data_service.send_external(http_verb, host, url, http_headers, chunk)
+                circuit_breaker.record_response(resp)
+                if resp.status_code not in RETRY_LATER_STATUS_CODES:
+                    return resp
+                retry_after = get_retry_after_seconds(resp)
+                error = None
+            except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout) as connection_error:
+                circuit_breaker.record_failure()
+                retry_after = None
+                error = connection_error
+            count += 1
+            if count < retry_times:
+                if count == 1:  # Only show a warning the first time we fail to send a chunk
+                    self._show_retry_warning(host)
+                time.sleep(backoff.get_wait_seconds(count, retry_after))
+                if error:
                     self.data_service.recreate_requests_session()
-                else:
-                    raise
+            elif error:
+                raise error
+            else:
+                return resp
 
     @staticmethod
     def _show_retry_warning(host):
@@ -279,6 +301,7 @@ class ParallelChunkProcessor(object):
         self.upload_id = file_uploader.upload_id
         self.watcher = file_uploader.watcher
         self.local_file = file_uploader.local_file
+        self.token_broker = file_uploader.token_broker
 
     def run(self):
         """
@@ -337,13 +360,13 @@ class ParallelChunkProcessor(object):
         """
         process = Process(target=upload_async,
                           args=(self.data_service.auth.get_auth_data(), self.config, self.upload_id,
-                                self.local_file.path, index, num_items, progress_queue))
+                                self.local_file.path, index, num_items, progress_queue, self.token_broker))
         process.start()
         return process
 
 
 def upload_async(data_service_auth_data, config, upload_id,
-                 filename, index, num_chunks_to_send, progress_queue):
+                 filename, index, num_chunks_to_send, progress_queue, token_broker=None):
     """
     Method run in another process called from ParallelChunkProcessor.make_and_start_process.
     :param data_service_auth_data: tuple of auth data for rebuilding DataServiceAuth
@@ -353,10 +376,10 @@ def upload_async(data_service_auth_data, config, upload_id,
     :param index: int offset into filename where we will start sending bytes from (must multiply by upload_bytes_per_chunk)
     :param num_chunks_to_send: int number of chunks of config.upload_bytes_per_chunk size to send.
     :param progress_queue: ProgressQueue queue to send notifications of progress or errors
+    :param token_broker: TokenBroker: optional broker to request new auth tokens from
     """
-    auth = DataServiceAuth(config)
-    auth.set_auth_data(data_service_auth_data)
-    data_service = DataServiceApi(auth, config.url)
+    auth = create_worker_auth(config, data_service_auth_data, token_broker)
+    data_service = DataServiceApi(auth, config.url, transport=RequestsHttpTransport.create_for_config(config))
     sender = ChunkSender(data_service, upload_id, filename, config.upload_bytes_per_chunk, index, num_chunks_to_send,
                          progress_queue)
     try:
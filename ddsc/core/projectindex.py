@@ -0,0 +1,138 @@
+"""
+Index of project names to ids saved between commands so a project can be found by name without listing
+every project the user has access to. Entries are only trusted for a short time and every project found
+through the index is fetched by id to make sure it still has the name.
+"""
+
+import os
+import json
+import time
+import tempfile
+from ddsc.core.util import get_service_user_hash
+
+PROJECT_INDEX_FILENAME = '~/.ddsclient-project-index.json'
+PROJECT_INDEX_VERSION = 1
+
+
+class ProjectIndex(object):
+    """
+    Maps project names to the ids of projects with that name for a single DukeDS user.
+    The index is read lazily and rewritten whenever it changes.
+    """
+    def __init__(self, filename, owner, ttl, get_time=time.time):
+        """
+        :param filename: str: path to the index file
+        :param owner: str: identifies the DukeDS service and user the index was created for
+        :param ttl: float: seconds after a full refresh that the index can be used
+        :param get_time: func(): returns the current time in seconds
+        """
+        self.filename = os.path.expanduser(filename)
+        self.owner = owner
+        self.ttl = ttl
+        self.get_time = get_time
+        self.name_to_ids = None  # None until the index is read or refreshed
+        self.updated_at = None
+
+    @staticmethod
+    def create_for_config(config):
+        """
+        Create an index for the DukeDS service and user in config.
+        :param config: ddsc.config.Config: settings to use
+        :return: ProjectIndex or None when the index is disabled
+        """
+        if config.project_index_ttl:
+            return ProjectIndex(PROJECT_INDEX_FILENAME, ProjectIndex.make_owner(config), config.project_index_ttl)
+        return None
+
+    @staticmethod
+    def make_owner(config):
+        """
+        Return a value that identifies the service and user without storing their keys.
+        :param config: ddsc.config.Config: settings to use
+        :return: str: hex digest
+        """
+        return get_service_user_hash(config)
+
+    def lookup_project_ids(self, name):
+        """
+        Return the ids of projects with name.
+        :param name: str: name of the project
+        :return: [str]: uuids of the projects or None if the index is missing or expired
+        """
+        if not self._is_current():
+            return None
+        return self.name_to_ids.get(name, [])
+
+    def replace(self, names_and_ids):
+        """
+        Replace the index with the full list of projects the user has access to.
+        :param names_and_ids: [(str, str)]: name and uuid of each project
+        """
+        self.name_to_ids = {}
+        for name, project_id in names_and_ids:
+            self.name_to_ids.setdefault(name, []).append(project_id)
+        self.updated_at = self.get_time()
+        self._write()
+
+    def add_project(self, name, project_id):
+        """
+        Record a project that was just created. Does nothing when the index is missing or expired.
+        :param name: str: name of the project
+        :param project_id: str: uuid of the project
+        """
+        if self._is_current():
+            project_ids = self.name_to_ids.setdefault(name, [])
+            if project_id not in project_ids:
+                project_ids.append(project_id)
+                self._write()
+
+    def remove_project(self, project_id):
+        """
+        Remove a project that was just deleted. Does nothing when the index is missing or expired.
+        :param project_id: str: uuid of the project
+        """
+        if self._is_current():
+            for name, project_ids in list(self.name_to_ids.items()):
+                if project_id in project_ids:
+                    project_ids.remove(project_id)
+                    if not project_ids:
+                        del self.name_to_ids[name]
+                    self._write()
+
+    def _is_current(self):
+        if self.name_to_ids is None:
+            self._read()
+        return self.name_to_ids is not None and self.get_time() < self.updated_at + self.ttl
+
+    def _read(self):
+        """
+        Load the index from disk ignoring files that are missing, unreadable or for a different owner.
+        """
+        try:
+            with open(self.filename) as infile:
+                data = json.load(infile)
+        except (IOError, OSError, ValueError):
+            return
+        if data.get('version') == PROJECT_INDEX_VERSION and data.get('owner') == self.owner:
+            self.name_to_ids = data['projects']
+            self.updated_at = data['updated_at']
+
+    def _write(self):
+        """
+        Save the index replacing the file atomically. The file is only readable by the current user.
+        Failing to save the index doesn't stop the command from running.
+        """
+        data = {
+            'version': PROJECT_INDEX_VERSION,
+            'owner': self.owner,
+            'updated_at': self.updated_at,
+            'projects': self.name_to_ids,
+        }
+        try:
+            # a unique temporary file keeps commands running at the same time from writing over each other
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.filename), suffix='.tmp')
+            with os.fdopen(fd, 'w') as outfile:
+                json.dump(data, outfile)
+            os.replace(temp_path, self.filename)
+        except (IOError, OSError):
+            pass
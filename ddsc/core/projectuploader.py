@@ -1,5 +1,6 @@
-from ddsc.core.util import ProjectWalker, KindType
-from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi
+from ddsc.core.util import ProjectWalker, KindType, FilteredProject
+from ddsc.core.ddsapi import DataServiceApi, RequestsHttpTransport
+from ddsc.core.tokenbroker import TokenBrokerProcess, create_worker_auth
 from ddsc.core.fileuploader import FileUploader, FileUploadOperations, ParentData, ParallelChunkProcessor
 from ddsc.core.parallel import TaskRunner
 
@@ -22,6 +23,7 @@ class UploadSettings(object):
         self.project_name_or_id = project_name_or_id
         self.project_id = None
         self.file_upload_post_processor = file_upload_post_processor
+        self.token_broker = None  # set while uploading so workers share refreshed auth tokens
 
     def get_data_service_auth_data(self):
         """
@@ -31,16 +33,16 @@ class UploadSettings(object):
         return self.data_service.auth.get_auth_data()
 
     @staticmethod
-    def rebuild_data_service(config, data_service_auth_data):
+    def rebuild_data_service(config, data_service_auth_data, token_broker=None):
         """
         Deserialize value into DataServiceApi object.
         :param config:
         :param data_service_auth_data:
+        :param token_broker: TokenBroker: optional broker to request new auth tokens from
         :return:
         """
-        auth = DataServiceAuth(config)
-        auth.set_auth_data(data_service_auth_data)
-        return DataServiceApi(auth, config.url)
+        auth = create_worker_auth(config, data_service_auth_data, token_broker)
+        return DataServiceApi(auth, config.url, transport=RequestsHttpTransport.create_for_config(config))
 
 
 class UploadContext(object):
@@ -60,6 +62,7 @@ class UploadContext(object):
         self.config = settings.config
         self.project_name_or_id = settings.project_name_or_id
         self.project_id = settings.project_id
+        self.token_broker = settings.token_broker
         self.params = params
         self.message_queue = message_queue
         self.task_id = task_id
@@ -69,7 +72,7 @@ class UploadContext(object):
         Recreate data service from within background worker.
         :return: DataServiceApi
         """
-        return UploadSettings.rebuild_data_service(self.config, self.data_service_auth_data)
+        return UploadSettings.rebuild_data_service(self.config, self.data_service_auth_data, self.token_broker)
 
     def send_message(self, data):
         """
@@ -114,15 +117,31 @@ class ProjectUploader(object):
         # Walks project adding project/folder to small_item_task_builder and adding files to small_files/large_files
         ProjectWalker.walk_project(local_project, self)
 
-        self.sort_files_list(self.small_files)
-        self.add_small_files_to_task_builder()
-        # Run small items in parallel
+        # workers request refreshed auth tokens from a single broker instead of each claiming their own
+        with TokenBrokerProcess(self.settings.config, self.settings.data_service.auth) as token_broker:
+            self.settings.token_broker = token_broker
+            try:
+                self.sort_files_list(self.small_files)
+                self.add_small_files_to_task_builder()
+                # Run small items in parallel
+                self.runner.run()
+
+                # Run parts of each large item in parallel
+                self.sort_files_list(self.large_files)
+                self.upload_large_files()
+            finally:
+                self.settings.token_broker = None
+
+    def create_project_and_folders(self, local_project):
+        """
+        Create the project and folders without uploading any files.
+        Used to prepare a project so other hosts can upload the files into the folders.
+        :param local_project: LocalProject: project to create
+        """
+        filtered_project = FilteredProject(lambda item: not KindType.is_file(item), self.small_item_task_builder)
+        filtered_project.walk_project(local_project)
         self.runner.run()
 
-        # Run parts of each large item in parallel
-        self.sort_files_list(self.large_files)
-        self.upload_large_files()
-
     @staticmethod
     def sort_files_list(files_list):
         """
@@ -183,7 +202,8 @@ class ProjectUploader(object):
         :param parent: LocalFolder/LocalProject: parent of the file
         """
         file_content_sender = FileUploader(self.settings.config, self.settings.data_service, local_file, hash_data,
-                                           self.settings.watcher, self.settings.file_upload_post_processor)
+                                           self.settings.watcher, self.settings.file_upload_post_processor,
+                                           self.settings.token_broker)
         remote_id = file_content_sender.upload(self.settings.project_id, parent.kind, parent.remote_id)
         local_file.set_remote_values_after_send(remote_id, hash_data.alg, hash_data.value)
 
@@ -1,39 +1,40 @@
 import os
-from ddsc.core.ddsapi import DataServiceApi, DataServiceError, DataServiceAuth
+from ddsc.core.ddsapi import DataServiceApi, DataServiceError, DataServiceAuth, ExcludeResponseFields, \
+    RequestsHttpTransport
 from ddsc.core.util import KindType, REMOTE_PATH_SEP, RemotePath
 from ddsc.core.localstore import HashUtil
 from ddsc.core.userutil import UserUtil, DUKE_EMAIL_SUFFIX
+from ddsc.core.responsecache import ResponseCache
 from ddsc.exceptions import DDSUserException
 
 FETCH_ALL_USERS_PAGE_SIZE = 25
 DOWNLOAD_FILE_CHUNK_SIZE = 20 * 1024 * 1024
 
 # Response content that does not need to be generated from the /project/<id>/children list.
-PROJECT_LIST_EXCLUDE_RESPONSE_FIELDS = [
-    'audit',
-    'ancestors',
-    'project',
-]
-# There is also a 'current_file_version' option that is still needed since it contains the
-# file hash and size.
+PROJECT_LIST_EXCLUDE_RESPONSE_FIELDS = ExcludeResponseFields.PRESETS[ExcludeResponseFields.TREE]
 
 
 class RemoteStore(object):
     """
     Fetches project tree data from remote store.
     """
-    def __init__(self, config, data_service=None):
+    def __init__(self, config, data_service=None, project_index=None, token_cache=None):
         """
         Setup to allow fetching project tree.
         :param config: ddsc.config.Config settings to use for connecting to the dataservice.
         :param data_service: DataServiceApi: optional param to specify an existing DataServiceApi object
+        :param project_index: ProjectIndex: optional saved index used to find projects by name
+        :param token_cache: TokenCache: optional saved auth token shared with other commands
         """
         self.config = config
+        self.project_index = project_index
         if data_service:
             self.data_service = data_service
         else:
-            auth = DataServiceAuth(self.config)
-            self.data_service = DataServiceApi(auth, self.config.url)
+            auth = DataServiceAuth(self.config, token_cache=token_cache)
+            self.data_service = DataServiceApi(auth, self.config.url,
+                                               response_cache=ResponseCache.create_for_config(self.config),
+                                               transport=RequestsHttpTransport.create_for_config(self.config))
 
     def fetch_remote_project(self, project_name_or_id, must_exist=False, include_children=True):
         """
@@ -68,20 +69,63 @@ class RemoteStore(object):
         :param project_name_or_id: ProjectNameOrId name or id of the project to lookup
         :return: RemoteProject project we found or None
         """
-        response = self.data_service.get_projects().json()
-        for project in response['results']:
+        if self.project_index and project_name_or_id.is_name:
+            return self._get_my_project_using_index(project_name_or_id.value)
+        for project in self.data_service.get_projects_generator(ExcludeResponseFields.SUMMARY):
             if project_name_or_id.contained_in_dict(project):
                 return RemoteProject(project)
         return None
 
+    def _get_my_project_using_index(self, project_name):
+        """
+        Return the project named project_name using the project index to avoid listing all projects.
+        The project found in the index is fetched by id to make sure it still has this name.
+        When the index is expired or has no single project for this name it is refreshed from the full list.
+        :param project_name: str: name of the project to lookup
+        :return: RemoteProject project we found or None
+        """
+        project_ids = self.project_index.lookup_project_ids(project_name)
+        if project_ids and len(project_ids) == 1:
+            project = self._try_fetch_remote_project_by_id(project_ids[0])
+            if project and project.name == project_name and not project.is_deleted:
+                return project
+        projects = list(self.data_service.get_projects_generator(ExcludeResponseFields.SUMMARY))
+        self.project_index.replace([(project['name'], project['id']) for project in projects])
+        for project in projects:
+            if project['name'] == project_name:
+                return RemoteProject(project)
+        return None
+
+    def _try_fetch_remote_project_by_id(self, project_id):
+        """
+        Fetch a project by id returning None when it no longer exists or we no longer have access to it.
+        :param project_id: str: uuid of the project
+        :return: RemoteProject or None
+        """
+        try:
+            return self.fetch_remote_project_by_id(project_id)
+        except DataServiceError as e:
+            if e.status_code in (403, 404):
+                return None
+            raise
+
+    def add_project_to_index(self, project_name, project_id):
+        """
+        Record a project we created in the project index.
+        :param project_name: str: name of the project
+        :param project_id: str: uuid of the project
+        """
+        if self.project_index:
+            self.project_index.add_project(project_name, project_id)
+
     def _add_project_children(self, project, exclude_response_fields=None):
         """
         Add the rest of the project tree from the remote store to the project object.
         :param project: RemoteProject root of the project tree to add children too
         :param exclude_response_fields: [str]: list of fields to exclude in the children response items
         """
-        response = self.data_service.get_project_children(project.id, '', exclude_response_fields).json()
-        project_children = RemoteProjectChildren(project.id, response['results'])
+        children = self.data_service.get_project_children_generator(project.id, '', exclude_response_fields)
+        project_children = RemoteProjectChildren(project.id, children)
         for child in project_children.get_tree():
             project.add_child(child)
 
@@ -173,9 +217,7 @@ class RemoteStore(object):
         :return: [RemoteUser] list of all users we downloaded
         """
         users = []
-        result = self.data_service.get_users(email=email, username=username)
-        user_list_json = result.json()
-        for user_json in user_list_json['results']:
+        for user_json in self.data_service.get_users_generator(email=email, username=username):
             users.append(RemoteUser(user_json))
         return users
 
@@ -236,8 +278,7 @@ class RemoteStore(object):
         :return: [str]: the list of project names
         """
         names = []
-        response = self.data_service.get_projects().json()
-        for project in response['results']:
+        for project in self.data_service.get_projects_generator(ExcludeResponseFields.SUMMARY):
             names.append(project['name'])
         return names
 
@@ -245,24 +286,24 @@ class RemoteStore(object):
         """
         Return list of top level details for all projects
         """
-        return self.data_service.get_projects().json()['results']
+        return list(self.data_service.get_projects_generator(ExcludeResponseFields.SUMMARY))
 
     def get_projects_with_auth_role(self, auth_role):
         """
-        Return the list of projects that have the specified auth role from the list that the current user has access to.
+        Generator that returns the projects that have the specified auth role from the list that the current user
+        has access to. The permission for each project is fetched concurrently (see
+        DataServiceApi.get_user_project_permissions_generator) and projects are returned as soon as their permission
+        (and those of the projects before them) has been fetched.
         :param auth_role: str: auth role we are filtering for
-        :return: [dict]: list of projects that have auth_role permissions for the current user
+        :return: generator of dict: projects that have auth_role permissions for the current user
         """
         user = self.get_current_user()
-        # user.id
-        projects = []
-        response = self.data_service.get_projects().json()
-        for project in response['results']:
-            project_id = project['id']
-            permissions = self.data_service.get_user_project_permission(project_id, user.id).json()
-            if auth_role == permissions['auth_role']['id']:
-                projects.append(project)
-        return projects
+        projects = list(self.data_service.get_projects_generator(ExcludeResponseFields.SUMMARY))
+        project_ids = [project['id'] for project in projects]
+        permission_responses = self.data_service.get_user_project_permissions_generator(project_ids, user.id)
+        for project, permission_response in zip(projects, permission_responses):
+            if auth_role == permission_response.json()['auth_role']['id']:
+                yield project
 
     def delete_project(self, project_name_or_id):
         """
@@ -272,6 +313,8 @@ class RemoteStore(object):
         project = self._get_my_project(project_name_or_id)
         if project:
             self.data_service.delete_project(project.id)
+            if self.project_index:
+                self.project_index.remove_project(project.id)
         else:
             raise DDSUserException("No project with {} found.\n".format(project_name_or_id.description()))
 
@@ -282,8 +325,7 @@ class RemoteStore(object):
         :param context: str: context for which auth roles to retrieve
         :return: [RemoteAuthRole]: list of active auth_role objects
         """
-        response = self.data_service.get_auth_roles(context).json()
-        return self.get_active_auth_roles_from_json(response)
+        return self._get_active_auth_roles(self.data_service.get_auth_roles_generator(context))
 
     @staticmethod
     def get_active_auth_roles_from_json(json_data):
@@ -293,8 +335,17 @@ class RemoteStore(object):
         :param json_data: list of dictionaries - data from dds in auth_role format
         :return: [RemoteAuthRole] list of active auth_role objects
         """
+        return RemoteStore._get_active_auth_roles(json_data['results'])
+
+    @staticmethod
+    def _get_active_auth_roles(auth_roles_json):
+        """
+        Return the active authorization roles in an array of RemoteAuthRole objects.
+        :param auth_roles_json: [dict]: auth roles from dds, may be a generator
+        :return: [RemoteAuthRole] list of active auth_role objects
+        """
         result = []
-        for auth_role_properties in json_data['results']:
+        for auth_role_properties in auth_roles_json:
             auth_role = RemoteAuthRole(auth_role_properties)
             if not auth_role.is_deprecated:
                 result.append(auth_role)
@@ -511,12 +562,24 @@ class RemoteProjectChildren(object):
     """
     def __init__(self, project_id, data):
         """
-        Specify the project_id and the array of item dictionaries.
+        Specify the project_id and the item dictionaries. data is only iterated once so it may be a generator.
         :param project_id: str: uuid of the project
         :param data: [object]: DukeDS recursive project children
         """
         self.project_id = project_id
-        self.data = data
+        self.parent_id_to_children = self._make_parent_id_to_children(data)
+
+    @staticmethod
+    def _make_parent_id_to_children(data):
+        """
+        Group the item dictionaries by the uuid of their parent in a single pass keeping their original order.
+        :param data: [object]: DukeDS recursive project children
+        :return: dict: parent uuid -> [dict]
+        """
+        parent_id_to_children = {}
+        for child in data:
+            parent_id_to_children.setdefault(child['parent']['id'], []).append(child)
+        return parent_id_to_children
 
     def _get_children_for_parent(self, parent_id):
         """
@@ -524,38 +587,27 @@ class RemoteProjectChildren(object):
         :param parent_id: str: uuid of the parent
         :return: [dict]: children in this list with parent_id parent
         """
-        children = []
-        for child in self.data:
-            parent = child['parent']
-            if parent['id'] == parent_id:
-                children.append(child)
-        return children
+        return self.parent_id_to_children.get(parent_id, [])
 
     def get_tree(self):
         """
         Return array of RemoteFolders(with appropriate children)/RemoteFiles based on the values from constructor.
+        Folders are filled in using a stack instead of recursion so deep projects can't exceed the recursion limit.
         :return: [RemoteFolder/RemoteFile]
         """
-        return self.get_tree_recur(self.project_id, REMOTE_PATH_SEP)
-
-    def get_tree_recur(self, parent_id, parent_path):
-        """
-        Recursively create array RemoteFolders/RemoteFiles.
-        :param parent_id: str: uuid if the parent to find children for
-        :param parent_path: str: remote path of parent to build child paths
-        :return: [RemoteFolder/RemoteFile]
-        """
-        children = []
-        for child_data in self._get_children_for_parent(parent_id):
-            if child_data['kind'] == KindType.folder_str:
-                folder = RemoteFolder(child_data, parent_path)
-                for grand_child in self.get_tree_recur(child_data['id'], folder.remote_path):
-                    folder.add_child(grand_child)
-                children.append(folder)
-            else:
-                file = RemoteFile(child_data, parent_path)
-                children.append(file)
-        return children
+        tree = []
+        # (uuid of the parent to find children for, remote path of the parent, function to add a child)
+        pending_parents = [(self.project_id, REMOTE_PATH_SEP, tree.append)]
+        while pending_parents:
+            parent_id, parent_path, add_child = pending_parents.pop()
+            for child_data in self._get_children_for_parent(parent_id):
+                if child_data['kind'] == KindType.folder_str:
+                    folder = RemoteFolder(child_data, parent_path)
+                    pending_parents.append((child_data['id'], folder.remote_path, folder.add_child))
+                    add_child(folder)
+                else:
+                    add_child(RemoteFile(child_data, parent_path))
+        return tree
 
 
 class RemoteAuthProvider(object):
@@ -636,6 +688,7 @@ class ProjectFile(object):
         self.file_url = json_data['file_url']
         self.hashes = json_data['hashes']
         self.ancestors = json_data['ancestors']
+        self.file_version_id = (json_data.get('current_version') or {}).get('id')
         self.json_data = json_data
         self.kind = KindType.file_str
 
@@ -0,0 +1,116 @@
+"""
+Optional cache of DukeDS GET responses used for the duration of a single command.
+A command often fetches the same metadata (such as the project list or the current user) several times.
+Cached responses are discarded when they expire, when the cache is full or when a related resource is changed.
+"""
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Responses that are always fetched since they contain short lived download urls
+UNCACHED_URL_SUFFIX_REGEX = re.compile(r'^/files/[^/]+/url|^/projects/[^/]+/files')
+# Changing a resource (the first part of the url suffix) also changes responses for these other resources
+RELATED_RESOURCES = {
+    'files': ['files', 'folders', 'projects'],
+    'folders': ['folders', 'projects'],
+    'projects': ['projects', 'project_transfers'],
+    'project_transfers': ['project_transfers', 'projects'],
+    'activities': ['activities', 'relations'],
+    'relations': ['relations', 'activities'],
+    'auth_providers': ['auth_providers', 'users'],
+}
+
+
+def get_resource_name(url_suffix):
+    """
+    Return the name of the top level resource a url suffix refers to.
+    :param url_suffix: str: url path such as /projects/123/children
+    :return: str: resource name such as 'projects'
+    """
+    return url_suffix.strip('/').split('/')[0]
+
+
+class ResponseCache(object):
+    """
+    Least recently used cache of successful GET responses keyed by url suffix and request data.
+    Safe to use from the threads that fetch pages concurrently.
+    """
+    def __init__(self, ttl, max_entries, get_time=time.time):
+        """
+        :param ttl: float: seconds a response can be reused for
+        :param max_entries: int: maximum number of responses to keep
+        :param get_time: func(): returns the current time in seconds
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.get_time = get_time
+        self.entries = OrderedDict()  # key -> (resource name, expiration time, response)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def create_for_config(config):
+        """
+        Create a cache based on the config settings.
+        :param config: ddsc.config.Config: settings to use
+        :return: ResponseCache or None when caching is disabled
+        """
+        if config.get_cache_ttl:
+            return ResponseCache(config.get_cache_ttl, config.get_cache_size)
+        return None
+
+    @staticmethod
+    def _make_key(url_suffix, data):
+        return url_suffix, json.dumps(data, sort_keys=True)
+
+    def get(self, url_suffix, data):
+        """
+        Return a previously stored response for a GET request.
+        :param url_suffix: str: URL path of the GET request
+        :param data: dict: data sent with the GET request
+        :return: requests.Response or None if not cached
+        """
+        if UNCACHED_URL_SUFFIX_REGEX.match(url_suffix):
+            return None
+        key = self._make_key(url_suffix, data)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry:
+                _, expiration_time, response = entry
+                if self.get_time() < expiration_time:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def add(self, url_suffix, data, response):
+        """
+        Store a successful response for a GET request.
+        :param url_suffix: str: URL path of the GET request
+        :param data: dict: data sent with the GET request
+        :param response: requests.Response: response to store
+        """
+        if UNCACHED_URL_SUFFIX_REGEX.match(url_suffix):
+            return
+        key = self._make_key(url_suffix, data)
+        with self.lock:
+            self.entries[key] = (get_resource_name(url_suffix), self.get_time() + self.ttl, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, url_suffix):
+        """
+        Remove stored responses that may have been changed by a POST, PUT or DELETE request to url_suffix.
+        :param url_suffix: str: URL path of the request that changed a resource
+        """
+        resource_name = get_resource_name(url_suffix)
+        resource_names = RELATED_RESOURCES.get(resource_name, [resource_name])
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if entry[0] in resource_names]:
+                del self.entries[key]
@@ -1,20 +1,189 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from contextlib import contextmanager
+from email.utils import parsedate_tz, mktime_tz
+from urllib.parse import urlparse
+
 
 class RetrySettings(object):
+    # Waits between retries grow exponentially: the wait before retry n is a random time between 0 and
+    # min(<name>_MAX_SECONDS, <name>_SECONDS * 2 ** (n - 1)) so processes that failed together don't retry together.
+
     # DukeDS API Retry Settings
     # Settings for retrying a ConnectionError connecting to the DukeDS API
     CONNECTION_RETRY_TIMES = 5
     CONNECTION_RETRY_SECONDS = 1
+    CONNECTION_RETRY_MAX_SECONDS = 30
     # Settings for how long to sleep when we receive 503 from DukeDS API (Weekly system maintenance typically)
-    SERVICE_DOWN_RETRY_SECONDS = 60
+    SERVICE_DOWN_RETRY_SECONDS = 5
+    SERVICE_DOWN_RETRY_MAX_SECONDS = 60
     # How long to sleep when waiting for DukeDS API to be consistent (waits forever)
     RESOURCE_NOT_CONSISTENT_RETRY_SECONDS = 2
 
     # Backend Store Retry Settings
-    # Settings for retrying when a ConnectionError occurs uploading a file chunk
+    # Settings for retrying when a ConnectionError or 429/503 response occurs uploading a file chunk
     SEND_EXTERNAL_PUT_RETRY_TIMES = 4
-    SEND_EXTERNAL_RETRY_SECONDS = 20
+    SEND_EXTERNAL_RETRY_SECONDS = 5
+    SEND_EXTERNAL_RETRY_MAX_SECONDS = 60
     # Times to retry after receiving a 403 uploading a file chunk (we recreate the URL before retrying)
     SEND_EXTERNAL_FORBIDDEN_RETRY_TIMES = 2
-    # Settings for retrying when downloading part of a file
-    FETCH_EXTERNAL_PUT_RETRY_TIMES = 5
-    FETCH_EXTERNAL_RETRY_SECONDS = 20
+    # Settings for waiting before retrying a failed file download (config.file_download_retries sets the times)
+    FETCH_EXTERNAL_RETRY_SECONDS = 5
+    FETCH_EXTERNAL_RETRY_MAX_SECONDS = 60
+
+    # Longest Retry-After response header we will honor
+    RETRY_AFTER_MAX_SECONDS = 5 * 60
+
+    # Circuit breaker settings: when at least CIRCUIT_BREAKER_MIN_FAILURES of the last CIRCUIT_BREAKER_WINDOW
+    # requests to a host failed and they make up CIRCUIT_BREAKER_FAILURE_RATE of the window, requests to the host
+    # wait CIRCUIT_BREAKER_OPEN_SECONDS and are then sent one at a time until one succeeds.
+    CIRCUIT_BREAKER_WINDOW = 20
+    CIRCUIT_BREAKER_MIN_FAILURES = 5
+    CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+    CIRCUIT_BREAKER_OPEN_SECONDS = 10
+
+
+# Response status codes that mean the host is overloaded or unavailable and the request should be retried later
+RETRY_LATER_STATUS_CODES = [429, 502, 503, 504]
+
+
+def get_retry_after_seconds(response):
+    """
+    Return the number of seconds a response asked us to wait in its Retry-After header.
+    :param response: requests.Response: response to check, may be None
+    :return: float: seconds to wait or None when the response doesn't have a valid Retry-After header
+    """
+    if response is None:
+        return None
+    value = response.headers.get('Retry-After')
+    if not isinstance(value, str):
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        parsed_date = parsedate_tz(value)
+        if not parsed_date:
+            return None
+        seconds = mktime_tz(parsed_date) - time.time()
+    return min(max(seconds, 0), RetrySettings.RETRY_AFTER_MAX_SECONDS)
+
+
+class ExponentialBackoff(object):
+    """
+    Calculates how long to wait before retrying using exponential backoff with full jitter.
+    """
+    def __init__(self, base_seconds, max_seconds):
+        """
+        :param base_seconds: float: upper limit of the wait before the first retry
+        :param max_seconds: float: largest upper limit of the wait before any retry
+        """
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+
+    def get_wait_seconds(self, retry_num, retry_after=None):
+        """
+        Return how long to wait before a retry.
+        :param retry_num: int: 1 for the first retry, 2 for the second and so on
+        :param retry_after: float: seconds the host asked us to wait (from a Retry-After header) or None
+        :return: float: seconds to wait
+        """
+        if retry_after is not None:
+            # add a little jitter so clients told to wait the same amount don't all retry at once
+            return retry_after + random.uniform(0, self.base_seconds)
+        exponent = min(retry_num - 1, 32)
+        return random.uniform(0, min(self.max_seconds, self.base_seconds * 2 ** exponent))
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the results of recent requests to a host. When too many of them fail the circuit opens:
+    requests wait until the host has had time to recover and are then sent one at a time until one succeeds.
+    Shared by the threads of a process. The caller is responsible for sleeping so tests can replace the sleep.
+    """
+    def __init__(self, get_time=time.time):
+        """
+        :param get_time: func(): returns the current time in seconds
+        """
+        self.get_time = get_time
+        self.results = deque(maxlen=RetrySettings.CIRCUIT_BREAKER_WINDOW)  # True for each success
+        self.open_until = 0
+        self.recovering = False
+        self.lock = threading.Lock()
+        # reentrant since a retried DukeDS request may refresh the auth token using the same host
+        self.recovery_lock = threading.RLock()
+
+    def get_wait_seconds(self):
+        """
+        Return how long to wait before sending a request to the host.
+        :return: float: seconds, 0 when the circuit is closed
+        """
+        with self.lock:
+            return max(self.open_until - self.get_time(), 0)
+
+    @contextmanager
+    def sending_request(self, sleep=time.sleep):
+        """
+        Context manager to send a request within. Waits while the circuit is open and while the host is
+        recovering only lets one request at a time through.
+        :param sleep: func(seconds): function used to wait
+        """
+        wait_seconds = self.get_wait_seconds()
+        if wait_seconds:
+            sleep(wait_seconds)
+        if self.recovering:
+            with self.recovery_lock:
+                yield
+        else:
+            yield
+
+    def record_success(self):
+        with self.lock:
+            self.results.append(True)
+            self.recovering = False
+
+    def record_failure(self):
+        """
+        Record a failed request opening the circuit when the failure rate is too high.
+        """
+        with self.lock:
+            self.results.append(False)
+            failures = self.results.count(False)
+            failure_rate = float(failures) / len(self.results)
+            if failures >= RetrySettings.CIRCUIT_BREAKER_MIN_FAILURES and \
+                    failure_rate >= RetrySettings.CIRCUIT_BREAKER_FAILURE_RATE:
+                self.open_until = self.get_time() + RetrySettings.CIRCUIT_BREAKER_OPEN_SECONDS
+                self.recovering = True
+                self.results.clear()
+
+    def record_response(self, response):
+        """
+        Record a response as a failure if the host is overloaded or unavailable otherwise as a success.
+        :param response: requests.Response: response received from the host
+        """
+        if response.status_code in RETRY_LATER_STATUS_CODES:
+            self.record_failure()
+        else:
+            self.record_success()
+
+
+# CircuitBreaker for each (process id, host) so a breaker inherited from a parent process is never reused
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url):
+    """
+    Return the circuit breaker for the host of url within the current process.
+    :param url: str: url of a request
+    :return: CircuitBreaker
+    """
+    key = (os.getpid(), urlparse(url).netloc)
+    with _circuit_breakers_lock:
+        circuit_breaker = _circuit_breakers.get(key)
+        if not circuit_breaker:
+            circuit_breaker = CircuitBreaker()
+            _circuit_breakers[key] = circuit_breaker
+        return circuit_breaker
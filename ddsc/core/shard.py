@@ -0,0 +1,67 @@
+"""
+Splits the files in a project between multiple hosts so each can transfer a disjoint subset.
+"""
+
+import os
+import json
+import hashlib
+
+DOWNLOAD_SHARD_SUMMARY_FILENAME_FORMAT = '.ddsclient-download-summary-shard-{}-of-{}.json'
+
+
+class Shard(object):
+    """
+    One of count shards numbered 1 through count. Items are assigned to shards by a stable hash of their key
+    so every host computes the same assignment without coordinating.
+    """
+    def __init__(self, index, count):
+        """
+        :param index: int: shard number between 1 and count
+        :param count: int: total number of shards
+        """
+        if count < 1 or index < 1 or index > count:
+            raise ValueError("Invalid shard {}/{}: shard number must be between 1 and {}.".format(index, count, count))
+        self.index = index
+        self.count = count
+
+    @staticmethod
+    def parse(value):
+        """
+        Create a Shard from a string in i/N format, for example 2/8.
+        :param value: str: shard number and total number of shards separated by '/'
+        :return: Shard
+        """
+        parts = value.split('/')
+        if len(parts) != 2 or not parts[0].strip().isdigit() or not parts[1].strip().isdigit():
+            raise ValueError("Invalid shard {}: expected format i/N for example 1/4.".format(value))
+        return Shard(int(parts[0]), int(parts[1]))
+
+    def includes(self, key):
+        """
+        Does this shard include the item identified by key.
+        :param key: str: stable identifier for an item such as a file uuid
+        :return: bool
+        """
+        key_hash = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return int(key_hash, 16) % self.count == self.index - 1
+
+    def get_suffix(self):
+        return 'shard-{}-of-{}'.format(self.index, self.count)
+
+    def write_download_summary(self, dest_directory, summary):
+        """
+        Write the verification summary for the files this shard downloaded to a file named for the shard so
+        the summaries from all hosts can be merged.
+        :param dest_directory: str: directory files were downloaded into
+        :param summary: dict: verification results
+        :return: str: path to the summary file
+        """
+        path = os.path.join(dest_directory, DOWNLOAD_SHARD_SUMMARY_FILENAME_FORMAT.format(self.index, self.count))
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(dict(summary, shard=str(self)), outfile, indent=2)
+        os.replace(temp_path, path)
+        return path
+
+    def __str__(self):
+        return '{}/{}'.format(self.index, self.count)
@@ -1,13 +1,18 @@
 from __future__ import absolute_import, print_function
 from unittest import TestCase
+import time
 import requests
 import json
 from ddsc.core.ddsapi import MultiJSONResponse, DataServiceApi, DataServiceAuth, SETUP_GUIDE_URL
 from ddsc.core.ddsapi import MissingInitialSetupError, SoftwareAgentNotFoundError, AuthTokenCreationError, \
     UnexpectedPagingReceivedError, DataServiceError, DSResourceNotConsistentError, \
     retry_until_resource_is_consistent, retry_connection_exceptions, CONNECTION_RETRY_MESSAGE, \
-    RetrySettings, OAuthDataServiceAuth, DSHashMismatchError
+    RetrySettings, OAuthDataServiceAuth, DSHashMismatchError, ExcludeResponseFields, HttpTransportSettings, \
+    HttpTransportAdapter, RequestsHttpTransport
+from ddsc.core.responsecache import ResponseCache
 from mock import MagicMock, Mock, patch, ANY, call
+from concurrent.futures import ThreadPoolExecutor
+import socket
 
 
 def fake_response_with_pages(status_code, json_return_value, num_pages=1):
@@ -54,7 +59,7 @@ class TestMultiJSONResponse(TestCase):
 
 class TestDataServiceApi(TestCase):
     def create_mock_auth(self, config_page_size):
-        mock_auth = MagicMock(set_status_msg=print, config=Mock(page_size=config_page_size))
+        mock_auth = MagicMock(set_status_msg=print, config=Mock(page_size=config_page_size, page_lookahead=1))
         mock_auth.get_auth.return_value = 'authkey'
         return mock_auth
 
@@ -691,6 +696,78 @@ class TestDataServiceApi(TestCase):
             call('something.com/v1/projects/123/files', headers=ANY, params={'page': 2, 'per_page': 2})
         ])
 
+    def test_get_project_files_page(self):
+        mock_requests = MagicMock()
+        mock_requests.get.return_value = fake_response_with_pages(status_code=200, json_return_value={'results': []},
+                                                                  num_pages=2)
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=mock_requests)
+        response = api.get_project_files_page(project_id='123', page_size=2, page_num=2)
+        self.assertEqual(response, mock_requests.get.return_value)
+        mock_requests.get.assert_called_with('something.com/v1/projects/123/files', headers=ANY,
+                                             params={'page': 2, 'per_page': 2})
+
+    def test_get_project_files_generator_lookahead(self):
+        mock_requests = MagicMock()
+        pages = [{"results": [{"id": str(page_num)}]} for page_num in range(1, 6)]
+
+        def get_page(url, headers, params):
+            page = params['page']
+            if page == 2:
+                time.sleep(0.05)  # the first concurrent page finishing last must still be returned first
+            return fake_response_with_pages(status_code=200, json_return_value=pages[page - 1], num_pages=5)
+        mock_requests.get.side_effect = get_page
+        mock_auth = self.create_mock_auth(config_page_size=100)
+        mock_auth.config.page_lookahead = 3
+        api = DataServiceApi(auth=mock_auth, url="something.com/v1", http=mock_requests)
+        project_files = api.get_project_files_generator(project_id='123', page_size=1)
+        self.assertEqual([project_file['id'] for project_file, headers in project_files], ['1', '2', '3', '4', '5'])
+        self.assertEqual(sorted(get_call[1]['params']['page'] for get_call in mock_requests.get.call_args_list),
+                         [1, 2, 3, 4, 5])
+
+    def test_get_pages_with_lookahead_bounded(self):
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=MagicMock())
+        api.auth.config.page_lookahead = 2
+        api._get_single_page = Mock(side_effect=lambda url_suffix, data, page_size, page_num: page_num)
+        responses = api._get_pages_with_lookahead('/projects/123/files', {}, 10, range(2, 10))
+        self.assertEqual(next(responses), 2)
+        # the page being returned plus the two page lookahead window
+        self.assertEqual(api._get_single_page.call_count, 3)
+        responses.close()
+        self.assertEqual(api._get_single_page.call_count, 3)
+
+    def test_get_user_project_permissions_generator(self):
+        mock_requests = MagicMock()
+
+        def get_permission(url, headers, params):
+            project_id = url.split('/')[-3]
+            if project_id == '1':
+                time.sleep(0.05)  # the first request finishing last must still be returned first
+            return fake_response(status_code=200, json_return_value={'project': {'id': project_id}})
+        mock_requests.get.side_effect = get_permission
+        mock_auth = self.create_mock_auth(config_page_size=100)
+        mock_auth.config.page_lookahead = 3
+        api = DataServiceApi(auth=mock_auth, url="something.com/v1", http=mock_requests)
+        responses = api.get_user_project_permissions_generator(['1', '2', '3', '4'], 'user1')
+        self.assertEqual([response.json()['project']['id'] for response in responses], ['1', '2', '3', '4'])
+        self.assertEqual(sorted(get_call[0][0] for get_call in mock_requests.get.call_args_list), [
+            'something.com/v1/projects/1/permissions/user1',
+            'something.com/v1/projects/2/permissions/user1',
+            'something.com/v1/projects/3/permissions/user1',
+            'something.com/v1/projects/4/permissions/user1',
+        ])
+
+    def test_map_with_lookahead_bounded(self):
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=MagicMock())
+        api.auth.config.page_lookahead = 2
+        func = Mock(side_effect=lambda item: item * 2)
+        results = api._map_with_lookahead(func, ['a', 'b', 'c', 'd'])
+        self.assertEqual(next(results), 'aa')
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(list(results), ['bb', 'cc', 'dd'])
+
     def test_get_project_permissions(self):
         mock_requests = MagicMock()
         page1 = {
@@ -770,6 +847,143 @@ class TestDataServiceApi(TestCase):
         self.assertEqual(len(results), 1)
         self.assertEqual(results[0]['id'], '8593aeac-9999-11e8-9eb6-529269fb1459')
 
+    def test_get_collection_items(self):
+        mock_requests = MagicMock()
+        mock_requests.get.side_effect = [
+            fake_response_with_pages(status_code=200, json_return_value={"results": [1, 2, 3]}, num_pages=3),
+            fake_response_with_pages(status_code=200, json_return_value={"results": [4, 5]}, num_pages=3),
+            fake_response_with_pages(status_code=200, json_return_value={"results": [6]}, num_pages=3),
+        ]
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1/",
+                             http=mock_requests)
+        items = api._get_collection_items(url_suffix="projects", data={'name': 'test'})
+        self.assertEqual([1, 2, 3, 4, 5, 6], list(items))
+        self.assertEqual([
+            call('something.com/v1/projects', headers=ANY, params={'name': 'test', 'page': 1, 'per_page': 100}),
+            call('something.com/v1/projects', headers=ANY, params={'name': 'test', 'page': 2, 'per_page': 100}),
+            call('something.com/v1/projects', headers=ANY, params={'name': 'test', 'page': 3, 'per_page': 100}),
+        ], mock_requests.get.call_args_list)
+
+    def test_get_collection_items_is_lazy(self):
+        mock_requests = MagicMock()
+        mock_requests.get.side_effect = [
+            fake_response_with_pages(status_code=200, json_return_value={"results": [1, 2]}, num_pages=5),
+        ]
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=2), url="something.com/v1/",
+                             http=mock_requests)
+        items = api._get_collection_items(url_suffix="projects", data={})
+        self.assertEqual(1, next(items))
+        self.assertEqual(1, mock_requests.get.call_count)
+
+    def test_get_collection_items_missing_total_pages(self):
+        mock_requests = MagicMock()
+        mock_requests.get.side_effect = [
+            fake_response(status_code=200, json_return_value={"results": [1, 2]}),
+        ]
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=2), url="something.com/v1/",
+                             http=mock_requests)
+        self.assertEqual([1, 2], list(api._get_collection_items(url_suffix="projects", data={})))
+
+    def test_listing_generators(self):
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=MagicMock())
+        api._get_collection_items = Mock()
+
+        self.assertEqual(api._get_collection_items.return_value, api.get_projects_generator())
+        api._get_collection_items.assert_called_with('/projects', {})
+
+        api.get_project_children_generator('123', 'test', exclude_response_fields=['this', 'that'])
+        api._get_collection_items.assert_called_with('/projects/123/children', {
+            'name_contains': 'test',
+            'exclude_response_fields': 'this that',
+        })
+
+        api.get_users_generator(email='joe@joe.com')
+        api._get_collection_items.assert_called_with('/users', {'email': 'joe@joe.com'})
+
+        api.get_auth_roles_generator('project')
+        api._get_collection_items.assert_called_with('/auth_roles', {'context': 'project'})
+
+    def test_listing_exclude_response_fields(self):
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=MagicMock())
+        api._get_collection = Mock()
+        api._get_collection_items = Mock()
+        api._get_collection_pages = Mock(return_value=[])
+        api._get_single_page = Mock()
+
+        api.get_projects(exclude_response_fields=ExcludeResponseFields.SUMMARY)
+        api._get_collection.assert_called_with('/projects', {'exclude_response_fields': 'audit'})
+
+        api.get_projects_generator(exclude_response_fields=['audit', 'project'])
+        api._get_collection_items.assert_called_with('/projects', {'exclude_response_fields': 'audit project'})
+
+        api.get_folder_children('456', None, exclude_response_fields=ExcludeResponseFields.TREE)
+        api._get_collection.assert_called_with('/folders/456/children', {
+            'exclude_response_fields': 'audit ancestors project'
+        })
+
+        list(api.get_project_files_generator('123', 10, exclude_response_fields=ExcludeResponseFields.DOWNLOAD))
+        api._get_collection_pages.assert_called_with('/projects/123/files', {
+            'exclude_response_fields': 'audit project'
+        }, page_size=10)
+
+        api.get_project_files_page('123', 10, 2, exclude_response_fields=ExcludeResponseFields.DOWNLOAD)
+        api._get_single_page.assert_called_with('/projects/123/files', {
+            'exclude_response_fields': 'audit project'
+        }, page_size=10, page_num=2)
+
+        api.get_projects()
+        api._get_collection.assert_called_with('/projects', {})
+
+    def test_exclude_response_fields_get_field_names(self):
+        self.assertEqual(['audit', 'ancestors', 'project'],
+                         ExcludeResponseFields.get_field_names(ExcludeResponseFields.TREE))
+        self.assertEqual(['audit', 'project'], ExcludeResponseFields.get_field_names(ExcludeResponseFields.DOWNLOAD))
+        self.assertEqual(['audit'], ExcludeResponseFields.get_field_names(ExcludeResponseFields.SUMMARY))
+        self.assertEqual(['hashes'], ExcludeResponseFields.get_field_names(['hashes']))
+        with self.assertRaises(ValueError):
+            ExcludeResponseFields.get_field_names('everything')
+
+    def test_response_cache(self):
+        mock_requests = MagicMock()
+        mock_requests.get.side_effect = [
+            fake_response_with_pages(status_code=200, json_return_value={"results": [{"id": "123"}]}, num_pages=1),
+            fake_response(status_code=200, json_return_value={"id": "user1"}),
+            fake_response_with_pages(status_code=200, json_return_value={"results": [{"id": "456"}]}, num_pages=1),
+        ]
+        mock_requests.post.return_value = fake_response(status_code=201, json_return_value={"id": "456"})
+        response_cache = ResponseCache(ttl=60, max_entries=10)
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=mock_requests, response_cache=response_cache)
+
+        self.assertEqual(["123"], [project['id'] for project in api.get_projects_generator()])
+        self.assertEqual(["123"], [project['id'] for project in api.get_projects_generator()])
+        self.assertEqual("user1", api.get_current_user().json()['id'])
+        self.assertEqual("user1", api.get_current_user().json()['id'])
+        self.assertEqual(2, mock_requests.get.call_count)
+        self.assertEqual(2, response_cache.hits)
+        self.assertEqual(2, response_cache.misses)
+
+        # creating a project discards the cached project list
+        api.create_project('mouse', 'mouse data')
+        self.assertEqual(["456"], [project['id'] for project in api.get_projects_generator()])
+        self.assertEqual("user1", api.get_current_user().json()['id'])
+        self.assertEqual(3, mock_requests.get.call_count)
+
+    def test_response_cache_skips_errors(self):
+        mock_requests = MagicMock()
+        mock_requests.get.side_effect = [
+            fake_response(status_code=404, json_return_value={}),
+            fake_response(status_code=200, json_return_value={"id": "user1"}),
+        ]
+        response_cache = ResponseCache(ttl=60, max_entries=10)
+        api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100), url="something.com/v1",
+                             http=mock_requests, response_cache=response_cache)
+        with self.assertRaises(DataServiceError):
+            api.get_current_user()
+        self.assertEqual("user1", api.get_current_user().json()['id'])
+
     def test_put_create_upload_url(self):
         mock_requests = MagicMock()
         api = DataServiceApi(auth=self.create_mock_auth(config_page_size=100),
@@ -880,6 +1094,25 @@ class TestDataServiceApi(TestCase):
         self.assertEqual(resp, api._put.return_value)
         api._put.assert_called_with('/folders/abc123/move', {'parent': {'kind': 'dds-folder', 'id': 'def456'}})
 
+    def test_get_auth_uses_saved_token(self):
+        config = Mock(url='', user_key='', agent_key='abc', auth=None)
+        token_cache = Mock()
+        token_cache.load.return_value = ('saved', time.time() + 3600)
+        auth = DataServiceAuth(config, token_cache=token_cache)
+        auth.claim_new_token = Mock()
+        self.assertEqual(auth.get_auth(), 'saved')
+        auth.claim_new_token.assert_not_called()
+        token_cache.save.assert_not_called()
+
+    def test_get_auth_claims_and_saves_token_when_saved_token_expired(self):
+        config = Mock(url='', user_key='', agent_key='abc', auth=None)
+        token_cache = Mock()
+        token_cache.load.return_value = ('saved', time.time() + 1)
+        auth = DataServiceAuth(config, token_cache=token_cache)
+        auth.claim_new_token = Mock(side_effect=lambda: auth.set_token('new', 5000.0))
+        self.assertEqual(auth.get_auth(), 'new')
+        token_cache.save.assert_called_with('new', 5000.0)
+
     @patch('ddsc.core.ddsapi.print')
     def test_implements_set_status_message(self, mock_print):
         mock_requests = MagicMock()
@@ -900,6 +1133,62 @@ class TestDataServiceApi(TestCase):
         self.assertEqual(url, 'https://dataservice.duke.edu/#/project/abc123')
 
 
+class TestHttpTransportSettings(TestCase):
+    def test_create_for_config(self):
+        config = Mock(http_pool_maxsize=32, http_connect_timeout=5, http_read_timeout=60, http_keep_alive=False,
+                      http_tcp_nodelay=True, http_socket_send_buffer_size=1024, http_socket_receive_buffer_size=2048)
+        settings = HttpTransportSettings.create_for_config(config)
+        self.assertEqual(settings.pool_maxsize, 32)
+        self.assertEqual(settings.get_timeout(), (5, 60))
+        self.assertEqual(settings.keep_alive, False)
+        self.assertEqual(settings.tcp_nodelay, True)
+        self.assertEqual(settings.send_buffer_size, 1024)
+        self.assertEqual(settings.receive_buffer_size, 2048)
+
+    def test_get_socket_options(self):
+        self.assertEqual(HttpTransportSettings().get_socket_options(), [
+            (socket.IPPROTO_TCP, socket.TCP_NODELAY, 1),
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ])
+        settings = HttpTransportSettings(keep_alive=False, tcp_nodelay=False, send_buffer_size=1024,
+                                         receive_buffer_size=2048)
+        self.assertEqual(settings.get_socket_options(), [
+            (socket.SOL_SOCKET, socket.SO_SNDBUF, 1024),
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, 2048),
+        ])
+
+
+class TestRequestsHttpTransport(TestCase):
+    def test_create_session(self):
+        settings = HttpTransportSettings(pool_maxsize=32, tcp_nodelay=False, keep_alive=False)
+        session = RequestsHttpTransport(settings).create_session()
+        adapter = session.get_adapter('https://api.dataservice.duke.edu/api/v1/projects')
+        self.assertIsInstance(adapter, HttpTransportAdapter)
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter.poolmanager.connection_pool_kw['socket_options'], [])
+        self.assertEqual(session.headers['Connection'], 'close')
+
+        session = RequestsHttpTransport(settings).create_session(pool_maxsize=4)
+        self.assertEqual(session.get_adapter('http://localhost/')._pool_maxsize, 4)
+        self.assertEqual(RequestsHttpTransport().create_session().headers['Connection'], 'keep-alive')
+
+    @patch('ddsc.core.ddsapi.HTTPAdapter.send')
+    def test_adapter_send_applies_timeout(self, mock_send):
+        adapter = HttpTransportAdapter(HttpTransportSettings(connect_timeout=5, read_timeout=60), pool_maxsize=1)
+        request = Mock()
+        adapter.send(request, stream=True)
+        mock_send.assert_called_with(request, timeout=(5, 60), stream=True)
+        adapter.send(request, timeout=1)
+        mock_send.assert_called_with(request, timeout=1)
+
+    def test_data_service_api_uses_transport(self):
+        transport = Mock()
+        api = DataServiceApi(auth=Mock(), url="something.com/v1/", transport=transport)
+        self.assertEqual(api.http, transport.create_session.return_value)
+        api.recreate_requests_session()
+        self.assertEqual(transport.create_session.call_count, 2)
+
+
 class TestDataServiceAuth(TestCase):
     @patch('ddsc.core.ddsapi.get_user_agent_str')
     @patch('ddsc.core.ddsapi.requests')
@@ -953,6 +1242,20 @@ class TestDataServiceAuth(TestCase):
         self.assertIn('500', error_message)
         self.assertIn('service down', error_message)
 
+    def test_get_auth_claims_one_token_for_concurrent_threads(self):
+        config = Mock(url='', user_key='', agent_key='abc', auth=None)
+        auth = DataServiceAuth(config)
+
+        def claim_new_token():
+            time.sleep(0.1)  # give the other threads time to find the expired token
+            auth.set_token('new', time.time() + 3600)
+
+        auth.claim_new_token = Mock(side_effect=claim_new_token)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: auth.get_auth(), range(4)))
+        self.assertEqual(results, ['new'] * 4)
+        self.assertEqual(auth.claim_new_token.call_count, 1)
+
     @patch('ddsc.core.ddsapi.print')
     def test_implements_set_status_message(self, mock_print):
         config = Mock(url='', user_key='', agent_key='abc')
@@ -1077,11 +1380,30 @@ class TestRetryConnectionExceptions(TestCase):
         self.raise_error_once = DataServiceError(mock_response, '', '')
         self.assertEqual('result123', self.func('123'))
         self.assertEqual(1, mock_time.sleep.call_count)
-        mock_time.sleep.assert_called_with(RetrySettings.SERVICE_DOWN_RETRY_SECONDS)
+        sleep_seconds = mock_time.sleep.call_args[0][0]
+        self.assertTrue(0 <= sleep_seconds <= RetrySettings.SERVICE_DOWN_RETRY_SECONDS)
         self.assertEqual(2, len(self.status_messages))
         self.assertIn('Duke Data Service is currently unavailable', self.status_messages[0])
         self.assertEqual('', self.status_messages[1])
 
+    @patch('ddsc.core.ddsapi.time')
+    def test_will_retry_after_503_honoring_retry_after(self, mock_time):
+        mock_response = MagicMock(status_code=503, headers={'Retry-After': '120'})
+        self.raise_error_once = DataServiceError(mock_response, '', '')
+        self.assertEqual('result123', self.func('123'))
+        sleep_seconds = mock_time.sleep.call_args[0][0]
+        self.assertTrue(120 <= sleep_seconds <= 120 + RetrySettings.SERVICE_DOWN_RETRY_SECONDS)
+
+    @patch('ddsc.core.ddsapi.time')
+    def test_waits_while_circuit_breaker_open(self, mock_time):
+        self.circuit_breaker = Mock()
+        self.circuit_breaker.sending_request.return_value = MagicMock()
+        self.raise_error_once = requests.exceptions.ConnectionError()
+        self.assertEqual('result123', self.func('123'))
+        self.circuit_breaker.sending_request.assert_called_with(sleep=ANY)
+        self.circuit_breaker.record_failure.assert_called_with()
+        self.circuit_breaker.record_success.assert_called_with()
+
     @patch('ddsc.core.ddsapi.time')
     def test_will_retry_after_waiting_after_connection_error(self, mock_time):
         self.raise_error_once = requests.exceptions.ConnectionError()
@@ -1099,7 +1421,11 @@ class TestRetryConnectionExceptions(TestCase):
         except requests.exceptions.ConnectionError:
             pass
         self.assertEqual(RetrySettings.CONNECTION_RETRY_TIMES, mock_time.sleep.call_count)
-        mock_time.sleep.assert_called_with(RetrySettings.CONNECTION_RETRY_SECONDS)
+        # waits are random but the upper limit doubles for each retry
+        for retry_num, sleep_call in enumerate(mock_time.sleep.call_args_list, 1):
+            max_seconds = min(RetrySettings.CONNECTION_RETRY_SECONDS * 2 ** (retry_num - 1),
+                              RetrySettings.CONNECTION_RETRY_MAX_SECONDS)
+            self.assertTrue(0 <= sleep_call[0][0] <= max_seconds)
         self.assertEqual(1, len(self.status_messages))
         self.assertEqual(CONNECTION_RETRY_MESSAGE, self.status_messages[0])
 
@@ -1154,7 +1480,7 @@ class TestOAuthDataServiceAuth(TestCase):
             'api_token': '789',
             'expires_on': 123456
         }
-        config = Mock(url='myurl')
+        config = Mock(url='myurl', http_connect_timeout=15, http_read_timeout=300)
         auth = MyOAuthDataServiceAuth(config)
 
         auth.claim_new_token()
@@ -1162,4 +1488,5 @@ class TestOAuthDataServiceAuth(TestCase):
         self.assertEqual(auth._auth, '789')
         self.assertEqual(auth._expires, 123456)
         expected_params = {'access_token': '123', 'authentication_service_id': '456'}
-        mock_requests.get.assert_called_with('myurl/user/api_token', headers=ANY, params=expected_params)
+        mock_requests.get.assert_called_with('myurl/user/api_token', headers=ANY, params=expected_params,
+                                             timeout=(15, 300))
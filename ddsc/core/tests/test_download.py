@@ -1,11 +1,24 @@
 from unittest import TestCase
 from ddsc.core.download import FileHash, FileHashStatus, FileDownloadState, ProjectFileDownloader, DDS_TOTAL_HEADER, \
     download_file, MISMATCHED_FILE_HASH_WARNING, URLExpiredException, download_url_to_path, S3_EXPIRED_STATUS_CODE, \
-    compute_download_result
+    compute_download_result, RangeNotSupportedException, make_download_segments, download_url_segments_to_path, \
+    download_url_segment, PartialDownload, IncrementalFileHashes, get_download_session, DownloadProgressCounters, \
+    WorkerProgressCounter, init_download_worker, add_bytes_downloaded, PROGRESS_REDRAW_SECONDS, get_url_expiration, \
+    get_listing_issued_time, get_listing_page_num, download_files, copy_file
+from ddsc.core.retry import RetrySettings
+from ddsc.core.ddsapi import ExcludeResponseFields, HttpTransportSettings
 from ddsc.core.pathfilter import PathFilter
-import queue
+from ddsc.core.downloadverification import DownloadVerificationResults, DOWNLOAD_VERIFICATION_FILENAME
+from ddsc.core.downloadmanifest import DOWNLOAD_MANIFEST_FILENAME
+from ddsc.core.shard import Shard
+import tempfile
+import hashlib
+import shutil
+import os
 import requests
-from mock.mock import patch, Mock, call, mock_open, ANY
+import time
+from requests.exceptions import HTTPError
+from mock.mock import patch, Mock, call, ANY
 
 
 class TestFileHash(TestCase):
@@ -27,6 +40,20 @@ class TestFileHash(TestCase):
         file_hash = FileHash(algorithm='md5', expected_hash_value='def', file_path='/tmp/fakepath.dat')
         self.assertEqual(file_hash.is_valid(), False)
 
+    @patch('ddsc.core.download.HashUtil')
+    def test_is_valid__computed_hash_value(self, mock_hash_util):
+        file_hash = FileHash(algorithm='md5', expected_hash_value='abc', file_path='/tmp/fakepath.dat',
+                             computed_hash_value='abc')
+        self.assertEqual(file_hash.is_valid(), True)
+        mock_hash_util.assert_not_called()
+
+    def test_get_supported_file_hashes__computed_hash_values(self):
+        dds_hashes = [
+            {"algorithm": "md5", "value": "def"},
+        ]
+        file_hashes = FileHash.get_supported_file_hashes(dds_hashes, '/tmp/data.txt', {'md5': 'xyz'})
+        self.assertEqual(file_hashes[0].computed_hash_value, 'xyz')
+
     def test_get_supported_file_hashes(self):
         dds_hashes = [
             {"algorithm": "sha1", "value": "abc"},
@@ -52,6 +79,26 @@ class TestFileHash(TestCase):
         self.assertEqual(failed_file_hashes[0], failed_hash)
 
 
+class TestIncrementalFileHashes(TestCase):
+    def test_get_hash_values(self):
+        file_hashes = IncrementalFileHashes([
+            {"algorithm": "sha1", "value": "abc"},
+            {"algorithm": "md5", "value": "def"},
+            {"algorithm": "md5", "value": "hij"},
+        ])
+        file_hashes.add_chunk(b'12345')
+        file_hashes.add_chunk(b'67890')
+        self.assertEqual(file_hashes.get_hash_values(), {'md5': hashlib.md5(b'1234567890').hexdigest()})
+
+    def test_add_file_prefix(self):
+        file_hashes = IncrementalFileHashes([{"algorithm": "md5", "value": "def"}])
+        with tempfile.NamedTemporaryFile() as infile:
+            infile.write(b'1234567890')
+            infile.flush()
+            file_hashes.add_file_prefix(infile.name, num_bytes=7, block_size=3)
+        self.assertEqual(file_hashes.get_hash_values(), {'md5': hashlib.md5(b'1234567').hexdigest()})
+
+
 class TestFileHashStatus(TestCase):
     def setUp(self):
         self.file_hash = FileHash(algorithm='md5', expected_hash_value='abc', file_path='/tmp/data.txt')
@@ -65,6 +112,12 @@ class TestFileHashStatus(TestCase):
         file_hash_status.status = FileHashStatus.STATUS_FAILED
         self.assertEqual(file_hash_status.has_a_valid_hash(), False)
 
+    def test_has_mismatched_hashes(self):
+        file_hash_status = FileHashStatus(self.file_hash, status=FileHashStatus.STATUS_OK)
+        self.assertEqual(file_hash_status.has_mismatched_hashes(), False)
+        file_hash_status.status = FileHashStatus.STATUS_WARNING
+        self.assertEqual(file_hash_status.has_mismatched_hashes(), True)
+
     def test_get_status_line(self):
         file_hash_status = FileHashStatus(self.file_hash, status=FileHashStatus.STATUS_OK)
         self.assertEqual(file_hash_status.get_status_line(), '/tmp/data.txt abc md5 OK')
@@ -93,7 +146,7 @@ class TestFileHashStatus(TestCase):
             FileHashStatus.determine_for_hashes(dds_hashes, file_path='/tmp/fakepath.dat')
         self.assertEqual(str(raised_exception.exception),
                          'Unable to validate: No supported hashes found for file /tmp/fakepath.dat')
-        mock_file_hash.get_supported_file_hashes.assert_called_with(dds_hashes, '/tmp/fakepath.dat')
+        mock_file_hash.get_supported_file_hashes.assert_called_with(dds_hashes, '/tmp/fakepath.dat', None)
         mock_file_hash.separate_valid_and_failed_hashes.assert_called_with(
             mock_file_hash.get_supported_file_hashes.return_value
         )
@@ -140,8 +193,9 @@ class TestFileDownloadState(TestCase):
         })
         self.project_file.id = '123'
         self.output_path = '/tmp/dest.txt'
-        self.config = Mock(download_bytes_per_chunk=20 * 1024 * 1024, file_download_retries=2)
-        self.file_download_state = FileDownloadState(self.project_file, self.output_path, self.config)
+        self.config = Mock(download_bytes_per_chunk=20 * 1024 * 1024, file_download_retries=2, download_url_ttl=3600)
+        self.file_download_state = FileDownloadState(self.project_file, self.output_path, self.config,
+                                                     url_issued_at=1000, listing_page_num=3)
 
     def test_constructor(self):
         self.assertEqual(self.file_download_state.file_id, '123')
@@ -151,6 +205,14 @@ class TestFileDownloadState(TestCase):
         self.assertEqual(self.file_download_state.url, 'somehost/data/file.txt')
         self.assertEqual(self.file_download_state.retries, 2)
         self.assertEqual(self.file_download_state.download_bytes_per_chunk, 20 * 1024 * 1024)
+        self.assertEqual(self.file_download_state.url_expires_at, 4600)
+        self.assertEqual(self.file_download_state.listing_page_num, 3)
+
+    def test_set_url(self):
+        self.file_download_state.set_url('otherhost/data/file.txt', 2000)
+        self.assertEqual(self.file_download_state.url, 'otherhost/data/file.txt')
+        self.assertEqual(self.file_download_state.url_expires_before(5599), False)
+        self.assertEqual(self.file_download_state.url_expires_before(5601), True)
 
     @patch('ddsc.core.download.FileHashStatus')
     def test_calculate_file_hash_status(self, mock_file_hash_status):
@@ -177,6 +239,23 @@ class TestFileDownloadState(TestCase):
         self.file_download_state.mark_error(None)
         self.assertEqual(self.file_download_state.is_ok_state(), False)
 
+    def test_get_content_key(self):
+        self.assertEqual(self.file_download_state.get_content_key(), None)
+        self.file_download_state.hashes = [{'algorithm': 'sha1', 'value': 'def'}, {'algorithm': 'md5', 'value': 'abc'}]
+        self.assertEqual(self.file_download_state.get_content_key(), (4000, 'abc'))
+
+    def test_use_segmented_download(self):
+        self.file_download_state.split_threshold = 1000
+        self.file_download_state.segment_size = 500
+        self.assertEqual(self.file_download_state.use_segmented_download(), True)
+        self.file_download_state.split_threshold = 5000
+        self.assertEqual(self.file_download_state.use_segmented_download(), False)
+        self.file_download_state.split_threshold = 0
+        self.assertEqual(self.file_download_state.use_segmented_download(), False)
+        self.file_download_state.split_threshold = 1000
+        self.file_download_state.segment_size = 4000
+        self.assertEqual(self.file_download_state.use_segmented_download(), False)
+
     def test_raise_for_status(self):
         ret = self.file_download_state.mark_error('generic error')
         self.assertEqual(ret, self.file_download_state)
@@ -192,40 +271,114 @@ class TestFileDownloadState(TestCase):
 
 class TestProjectFileDownloader(TestCase):
     def setUp(self):
-        self.config = Mock(download_workers=4)
+        self.config = Mock(download_workers=4, download_url_ttl=3600, download_url_refresh_margin=300, page_size=100,
+                           download_fsync_batch_size=0, download_schedule_window=10, download_batch_size=3,
+                           download_batch_file_size=100, file_download_retries=2)
         self.dest_directory = '/tmp/outdir'
         self.project = Mock()
 
+    @patch('ddsc.core.download.DownloadVerificationResults')
     @patch('ddsc.core.download.multiprocessing')
-    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.DirectoryCache')
     @patch('ddsc.core.download.print')
     @patch('ddsc.core.download.FileDownloadState')
     @patch('ddsc.core.download.time')
-    def test_run(self, mock_time, mock_file_download_state, mock_print, mock_os, mock_multiprocessing):
+    @patch('ddsc.core.download.DownloadManifest')
+    def test_run(self, mock_download_manifest, mock_time, mock_file_download_state, mock_print, mock_directory_cache,
+                 mock_multiprocessing, mock_download_verification_results):
+        mock_download_manifest.return_value.find_matching_entry.return_value = None
+        mock_file_download_state.return_value.url_expires_before.return_value = False
+        mock_file_download_state.return_value.size = 10
         mock_project_file = Mock(file_url={'host': 'somehost', 'url': '/api/file1.txt'})
         self.project.get_project_files_generator.return_value = [
             (mock_project_file, {DDS_TOTAL_HEADER: 1})
         ]
         mock_pool = mock_multiprocessing.Pool.return_value
-        mock_apply_async = mock_pool.apply_async
-        mock_apply_async.return_value.get.return_value.status.get_status_line.return_value = 'Hash Status Line'
+        download_result = Mock(copy_source=None)
+        download_result.status.get_status_line.return_value = 'Hash Status Line'
+        mock_pool.apply_async.side_effect = lambda func, args, callback, error_callback: callback(download_result)
+        mock_time.time.return_value = 0
+        verification_results = mock_download_verification_results.return_value
+        verification_results.files = 1
+        verification_results.path = '/tmp/outdir/.ddsclient-download-verification.md5'
+        verification_results.failed_status_lines = []
+        verification_results.all_good.return_value = True
 
         project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
                                                         path_filter=None)
         project_file_downloader.show_progress_bar = Mock()
         project_file_downloader.run()
 
-        mock_queue = mock_multiprocessing.Manager.return_value.Queue.return_value
+        mock_multiprocessing.Pool.assert_called_with(4, initializer=init_download_worker,
+                                                     initargs=(project_file_downloader.progress_counters,))
         mock_pool.apply_async.assert_called_with(
-            download_file, (mock_file_download_state.return_value, mock_queue)
+            download_file, (mock_file_download_state.return_value,),
+            callback=project_file_downloader.completed_downloads.put,
+            error_callback=project_file_downloader.completed_downloads.put
         )
         output_path = mock_project_file.get_local_path.return_value
-        mock_file_download_state.assert_called_with(mock_project_file, output_path, self.config)
+        mock_file_download_state.assert_called_with(mock_project_file, output_path, self.config,
+                                                    url_issued_at=0, listing_page_num=None)
         mock_print.assert_has_calls([
-            call('\nVerifying contents of 1 downloaded files using file hashes.'),
-            call('Hash Status Line'),
+            call('\nVerified contents of 1 downloaded files using file hashes.'),
+            call('Wrote file hashes to /tmp/outdir/.ddsclient-download-verification.md5.'),
             call('All downloaded files have been verified successfully.')
         ])
+        mock_download_verification_results.assert_called_with(self.dest_directory, DOWNLOAD_VERIFICATION_FILENAME)
+        verification_results.add.assert_called_with(download_result.status)
+        verification_results.close.assert_called_with()
+        mock_download_manifest.assert_called_with(self.dest_directory, DOWNLOAD_MANIFEST_FILENAME)
+        mock_download_manifest.return_value.load.assert_called_with()
+        mock_download_manifest.return_value.add.assert_called_with(download_result)
+        mock_download_manifest.return_value.save.assert_called_with()
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.DirectoryCache')
+    @patch('ddsc.core.download.FileDownloadState')
+    @patch('ddsc.core.download.FileHashStatus')
+    @patch('ddsc.core.download.DownloadManifest')
+    def test_download_file_unchanged_in_manifest(self, mock_download_manifest, mock_file_hash_status,
+                                                 mock_file_download_state, mock_directory_cache,
+                                                 mock_download_verification_results):
+        mock_download_manifest.return_value.find_matching_entry.return_value = {
+            'hash': {'algorithm': 'md5', 'value': 'abc'}
+        }
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.show_progress_bar = Mock()
+        downloader._download_file(Mock(), {})
+        self.assertEqual(downloader.download_scheduler.has_pending(), False)
+        file_download_state = mock_file_download_state.return_value
+        mock_file_hash_status.determine_for_hashes.assert_called_with(
+            file_download_state.hashes, file_download_state.output_path, computed_hash_values={'md5': 'abc'})
+        file_download_state.mark_already_complete.assert_called_with(
+            mock_file_hash_status.determine_for_hashes.return_value)
+        mock_download_verification_results.return_value.add.assert_called_with(file_download_state.status)
+        mock_download_manifest.return_value.add.assert_not_called()
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.time')
+    def test_show_progress_bar_if_due(self, mock_time, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.show_progress_bar = Mock()
+        downloader.last_progress_time = 100
+        mock_time.time.return_value = 100 + PROGRESS_REDRAW_SECONDS / 2
+        downloader._show_progress_bar_if_due()
+        downloader.show_progress_bar.assert_not_called()
+        mock_time.time.return_value = 100 + PROGRESS_REDRAW_SECONDS
+        downloader._show_progress_bar_if_due()
+        downloader.show_progress_bar.assert_called_with()
+
+    @patch('ddsc.core.download.DirectoryCache')
+    @patch('ddsc.core.download.FileDownloadState')
+    @patch('ddsc.core.download.DownloadManifest')
+    def test_download_file_verify_ignores_manifest(self, mock_download_manifest, mock_file_download_state,
+                                                   mock_directory_cache):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None,
+                                           verify=True)
+        mock_file_download_state.return_value.size = 10
+        downloader._download_file(Mock(), {})
+        mock_download_manifest.return_value.find_matching_entry.assert_not_called()
+        self.assertEqual(downloader.download_scheduler.pop_batch(), [mock_file_download_state.return_value])
 
     @patch('ddsc.core.download.multiprocessing')
     def test_download_files(self, mock_multiprocessing):
@@ -234,11 +387,12 @@ class TestProjectFileDownloader(TestCase):
         project_file_downloader.show_progress_bar = Mock()
         project_file_downloader._get_project_files = Mock()
         project_file_downloader._get_project_files.return_value = [
-            'project_file1_obj', 'project_file2_obj'
+            ('project_file1_obj', 'headers1'), ('project_file2_obj', 'headers2')
         ]
         project_file_downloader._download_file = Mock()
-        project_file_downloader._work_queue_is_full = Mock()
-        project_file_downloader._work_queue_is_full.side_effect = [
+        project_file_downloader._dispatch_scheduled_downloads = Mock()
+        project_file_downloader.download_scheduler = Mock()
+        project_file_downloader.download_scheduler.is_full.side_effect = [
             True,
             False,
             False
@@ -252,25 +406,67 @@ class TestProjectFileDownloader(TestCase):
 
         manager = Mock()
         manager.attach_mock(project_file_downloader._download_file, 'download_file')
-        manager.attach_mock(project_file_downloader._work_queue_is_full, 'work_queue_is_full')
+        manager.attach_mock(project_file_downloader._dispatch_scheduled_downloads, 'dispatch_scheduled_downloads')
+        manager.attach_mock(project_file_downloader.download_scheduler.is_full, 'scheduler_is_full')
         manager.attach_mock(project_file_downloader._wait_for_and_retry_failed_downloads,
                             'wait_for_and_retry_failed_downloads')
         manager.attach_mock(project_file_downloader._work_queue_is_not_empty, 'work_queue_is_not_empty')
 
         project_file_downloader._download_files()
 
-        # Expected behavior is to download file 1, wait for that to finish, download file 2, then wait for one more time
+        # Schedule file 1 then wait while the scheduler is full, schedule file 2,
+        # then wait for the remaining downloads once the listing is complete
         manager.assert_has_calls([
-            call.download_file(ANY, 'project_file1_obj'),
-            call.work_queue_is_full(),
+            call.download_file('project_file1_obj', 'headers1'),
+            call.dispatch_scheduled_downloads(ANY),
+            call.scheduler_is_full(),
             call.wait_for_and_retry_failed_downloads(ANY),
-            call.work_queue_is_full(),
-            call.download_file(ANY, 'project_file2_obj'),
-            call.work_queue_is_full(),
+            call.dispatch_scheduled_downloads(ANY),
+            call.scheduler_is_full(),
+            call.download_file('project_file2_obj', 'headers2'),
+            call.dispatch_scheduled_downloads(ANY),
+            call.scheduler_is_full(),
+            call.dispatch_scheduled_downloads(ANY),
             call.work_queue_is_not_empty(),
             call.wait_for_and_retry_failed_downloads(ANY),
+            call.dispatch_scheduled_downloads(ANY),
             call.work_queue_is_not_empty()
         ])
+        self.assertEqual(project_file_downloader.listing_complete, True)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_dispatch_scheduled_downloads(self, mock_multiprocessing):
+        pool = Mock()
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader._refresh_url_if_expiring = Mock()
+        large_files = [Mock(size=1000 + i) for i in range(3)]
+        small_files = [Mock(size=10) for i in range(6)]
+        for file_download_state in small_files + large_files:
+            downloader._schedule_download(file_download_state)
+        self.assertEqual(downloader.bytes_to_download, 3003 + 60)
+
+        downloader._dispatch_scheduled_downloads(pool)
+
+        # largest files start first and the remaining small files are split between the free workers
+        self.assertEqual(pool.apply_async.call_args_list, [
+            call(download_file, (large_files[2],), callback=downloader.completed_downloads.put,
+                 error_callback=downloader.completed_downloads.put),
+            call(download_file, (large_files[1],), callback=ANY, error_callback=ANY),
+            call(download_file, (large_files[0],), callback=ANY, error_callback=ANY),
+            call(download_files, (small_files[:2],), callback=ANY, error_callback=ANY),
+        ])
+        self.assertEqual(downloader.pending_downloads, 4)
+        self.assertEqual(downloader._refresh_url_if_expiring.call_count, 5)
+        self.assertEqual(downloader.download_scheduler.has_pending(), True)
+
+    @staticmethod
+    def make_verification_results(statuses):
+        verification_results = DownloadVerificationResults('/data')
+        verification_results._format_line = Mock(return_value='')
+        verification_results.outfile = Mock()
+        for status in statuses:
+            verification_results.add(status)
+        return verification_results
 
     @patch('ddsc.core.download.multiprocessing')
     @patch('ddsc.core.download.print')
@@ -278,16 +474,61 @@ class TestProjectFileDownloader(TestCase):
         project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
                                                         path_filter=None)
         file_hash1 = Mock(file_path='/data/file1.txt', expected_hash_value='abcd', algorithm='md5')
-        project_file_downloader.download_status_list = [
+        project_file_downloader.verification_results = self.make_verification_results([
             FileHashStatus(file_hash1, FileHashStatus.STATUS_OK)
-        ]
+        ])
         project_file_downloader._show_downloaded_files_status()
 
         mock_print.assert_has_calls([
-            call('\nVerifying contents of None downloaded files using file hashes.'),
-            call('/data/file1.txt abcd md5 OK'),
+            call('\nVerified contents of 1 downloaded files using file hashes.'),
+            call('Wrote file hashes to /data/.ddsclient-download-verification.md5.'),
             call('All downloaded files have been verified successfully.')
         ])
+        self.assertEqual(mock_print.call_count, 3)
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.print')
+    def test_write_shard_download_summary(self, mock_print, mock_multiprocessing):
+        shard = Mock()
+        shard.__str__ = Mock(return_value='1/2')
+        shard.write_download_summary.return_value = '/tmp/outdir/summary.json'
+        project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
+                                                        path_filter=None, shard=shard)
+        file_hash1 = Mock(file_path='/data/file1.txt', expected_hash_value='abcd', algorithm='md5')
+        file_hash2 = Mock(file_path='/data/file2.txt', expected_hash_value='efgh', algorithm='md5')
+        project_file_downloader.verification_results = self.make_verification_results([
+            FileHashStatus(file_hash1, FileHashStatus.STATUS_OK),
+            FileHashStatus(file_hash2, FileHashStatus.STATUS_FAILED),
+        ])
+        project_file_downloader._write_shard_download_summary()
+        shard.write_download_summary.assert_called_with(self.dest_directory, {
+            'project_id': self.project.id,
+            'files': 2,
+            'files_with_mismatched_hashes': 0,
+            'failed_files': ['/data/file2.txt efgh md5 FAILED'],
+            'all_good': False,
+        })
+        mock_print.assert_any_call('Wrote verification summary for shard 1/2 to /tmp/outdir/summary.json.')
+
+    @patch('ddsc.core.download.DownloadManifest')
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.print')
+    def test_run_writes_shard_summary_when_download_fails(self, mock_print, mock_multiprocessing,
+                                                          mock_download_manifest):
+        shard = Mock()
+        project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
+                                                        path_filter=None, shard=shard)
+
+        def fail_download():
+            project_file_downloader.verification_results.add_failed('Error downloading /data/file1.txt')
+            raise ValueError('Error downloading /data/file1.txt')
+
+        project_file_downloader._download_files = fail_download
+        with self.assertRaises(ValueError):
+            project_file_downloader.run()
+        summary = shard.write_download_summary.call_args[0][1]
+        self.assertEqual(summary['failed_files'], ['Error downloading /data/file1.txt'])
+        self.assertEqual(summary['all_good'], False)
 
     @patch('ddsc.core.download.multiprocessing')
     @patch('ddsc.core.download.print')
@@ -295,14 +536,14 @@ class TestProjectFileDownloader(TestCase):
         project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
                                                         path_filter=None)
         file_hash1 = Mock(file_path='/data/file1.txt', expected_hash_value='abcd', algorithm='md5')
-        project_file_downloader.download_status_list = [
+        project_file_downloader.verification_results = self.make_verification_results([
             FileHashStatus(file_hash1, FileHashStatus.STATUS_WARNING)
-        ]
+        ])
         project_file_downloader._show_downloaded_files_status()
 
         mock_print.assert_has_calls([
-            call('\nVerifying contents of None downloaded files using file hashes.'),
-            call('/data/file1.txt abcd md5 WARNING'),
+            call('\nVerified contents of 1 downloaded files using file hashes.'),
+            call('Wrote file hashes to /data/.ddsclient-download-verification.md5.'),
             call('All downloaded files have been verified successfully.'),
             call(MISMATCHED_FILE_HASH_WARNING.format(1)),
         ])
@@ -313,15 +554,19 @@ class TestProjectFileDownloader(TestCase):
         project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
                                                         path_filter=None)
         file_hash1 = Mock(file_path='/data/file1.txt', expected_hash_value='abcd', algorithm='md5')
-        project_file_downloader.download_status_list = [
-            FileHashStatus(file_hash1, FileHashStatus.STATUS_FAILED)
-        ]
+        file_hash2 = Mock(file_path='/data/file2.txt', expected_hash_value='efgh', algorithm='md5')
+        project_file_downloader.verification_results = self.make_verification_results([
+            FileHashStatus(file_hash1, FileHashStatus.STATUS_FAILED),
+            FileHashStatus(file_hash2, FileHashStatus.STATUS_OK),
+        ])
         with self.assertRaises(ValueError) as raised_exception:
             project_file_downloader._show_downloaded_files_status()
         self.assertEqual(str(raised_exception.exception), 'ERROR: Downloaded file(s) do not match the expected hashes.')
 
-        mock_print.assert_has_calls([
-            call('\nVerifying contents of None downloaded files using file hashes.'),
+        # only failed files are printed
+        self.assertEqual(mock_print.call_args_list, [
+            call('\nVerified contents of 2 downloaded files using file hashes.'),
+            call('Wrote file hashes to /data/.ddsclient-download-verification.md5.'),
             call('/data/file1.txt abcd md5 FAILED'),
         ])
 
@@ -338,9 +583,11 @@ class TestProjectFileDownloader(TestCase):
 
         self.assertEqual(project_file_downloader.files_to_download, None)
         result = list(project_file_downloader._get_project_files())
-        self.assertEqual(result, ['file1', 'file2'])
+        self.assertEqual(result, [('file1', {DDS_TOTAL_HEADER: 2}), ('file2', {DDS_TOTAL_HEADER: 2})])
         self.assertEqual(project_file_downloader.files_to_download, 2)
         project_file_downloader.show_progress_bar.assert_called_with()
+        self.project.get_project_files_generator.assert_called_with(self.config.page_size,
+                                                                    ExcludeResponseFields.DOWNLOAD)
 
     @patch('ddsc.core.download.multiprocessing')
     @patch('ddsc.core.download.print')
@@ -358,11 +605,53 @@ class TestProjectFileDownloader(TestCase):
         ]
         self.assertEqual(project_file_downloader.files_to_download, None)
         result = list(project_file_downloader._get_project_files())
-        self.assertEqual(result, [mock_file2])
+        self.assertEqual(result, [(mock_file2, {DDS_TOTAL_HEADER: 2})])
         self.assertEqual(project_file_downloader.files_to_download, 1)
+        self.assertEqual(project_file_downloader.files_to_download_is_estimate, False)
         project_file_downloader.show_progress_bar.assert_called_with()
         mock_print.assert_not_called()
 
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.print')
+    def test_get_project_files_with_filter_streams_estimate(self, mock_print, mock_multiprocessing):
+        project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
+                                                        path_filter=PathFilter(include_paths=['/data'],
+                                                                               exclude_paths=None))
+        project_file_downloader.show_progress_bar = Mock()
+        self.project.get_project_files_generator = Mock()
+        project_files = [Mock(path='/data/file1'), Mock(path='/other/file2'), Mock(path='/other/file3'),
+                         Mock(path='/data/file4')]
+        self.project.get_project_files_generator.return_value = [
+            (project_file, {DDS_TOTAL_HEADER: 4}) for project_file in project_files
+        ]
+        project_files_iter = project_file_downloader._get_project_files()
+        # the first matching file is returned before the rest of the listing is read
+        self.assertEqual(next(project_files_iter), (project_files[0], {DDS_TOTAL_HEADER: 4}))
+        self.assertEqual(project_file_downloader.files_to_download, 4)
+        self.assertEqual(project_file_downloader.get_files_to_download_str(), '~4')
+        self.assertEqual(next(project_files_iter), (project_files[3], {DDS_TOTAL_HEADER: 4}))
+        self.assertEqual(project_file_downloader.files_to_download, 2)
+        self.assertEqual(list(project_files_iter), [])
+        self.assertEqual(project_file_downloader.get_files_to_download_str(), '2')
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.print')
+    def test_get_project_files_with_shard(self, mock_print, mock_multiprocessing):
+        shard = Shard(2, 2)
+        project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
+                                                        path_filter=None, shard=shard)
+        project_file_downloader.show_progress_bar = Mock()
+        self.project.get_project_files_generator = Mock()
+        project_files = [Mock(id='file-{}'.format(i), path='/data/file{}'.format(i)) for i in range(10)]
+        self.project.get_project_files_generator.return_value = [
+            (project_file, {DDS_TOTAL_HEADER: 10}) for project_file in project_files
+        ]
+        result = [project_file for project_file, headers in project_file_downloader._get_project_files()]
+        expected = [project_file for project_file in project_files if shard.includes(project_file.id)]
+        self.assertEqual(result, expected)
+        self.assertEqual(project_file_downloader.files_to_download, len(expected))
+        mock_print.assert_not_called()
+
     @patch('ddsc.core.download.multiprocessing')
     @patch('ddsc.core.download.print')
     def test_get_project_files_with_filter_warnings(self, mock_print, mock_multiprocessing):
@@ -379,89 +668,87 @@ class TestProjectFileDownloader(TestCase):
         ]
         self.assertEqual(project_file_downloader.files_to_download, None)
         result = list(project_file_downloader._get_project_files())
-        self.assertEqual(result, [mock_file1, mock_file2])
+        self.assertEqual(result, [(mock_file1, {DDS_TOTAL_HEADER: 2}), (mock_file2, {DDS_TOTAL_HEADER: 2})])
         self.assertEqual(project_file_downloader.files_to_download, 2)
         project_file_downloader.show_progress_bar.assert_called_with()
-        mock_print.assert_called_with('WARNING: Path(s) not found: /data/fileX.')
+        mock_print.assert_called_with('\nWARNING: Path(s) not found: /data/fileX.')
 
     @patch('ddsc.core.download.multiprocessing')
-    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.DirectoryCache')
     @patch('ddsc.core.download.FileDownloadState')
-    def test_download_file(self, mock_file_download_state, mock_os, mock_multiprocessing):
-        mock_os.path.exists.return_value = False
-        mock_pool = Mock()
+    @patch('ddsc.core.download.time')
+    def test_download_file(self, mock_time, mock_file_download_state, mock_directory_cache, mock_multiprocessing):
+        mock_time.time.return_value = 5000
+        mock_file_download_state.return_value.size = 1000
         mock_project_file = Mock(file_url={'host': 'somehost', 'url': 'someurl'})
         mock_project_file.get_local_path.return_value = '/tmp/data.out'
         project_file_downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project,
                                                         path_filter=None)
-        project_file_downloader._download_file(mock_pool, mock_project_file)
-        mock_os.path.dirname.assert_called_with("/tmp/data.out")
-        mock_os.path.exists.assert_called_with(mock_os.path.dirname.return_value)
-        mock_os.makedirs.assert_called_with(mock_os.path.dirname.return_value)
-        mock_file_download_state.assert_called_with(mock_project_file, '/tmp/data.out', self.config)
-        mock_pool.apply_async.assert_called_with(download_file, (mock_file_download_state.return_value,
-                                                                 project_file_downloader.message_queue))
+        project_file_downloader._download_file(mock_project_file, {'x-page': '7'})
+        mock_directory_cache.return_value.make_parent_directory.assert_called_with('/tmp/data.out')
+        mock_file_download_state.assert_called_with(mock_project_file, '/tmp/data.out', self.config,
+                                                    url_issued_at=5000, listing_page_num=7)
+        self.assertEqual(project_file_downloader.download_scheduler.pop_batch(),
+                         [mock_file_download_state.return_value])
+        self.assertEqual(project_file_downloader.bytes_to_download, 1000)
 
     @patch('ddsc.core.download.multiprocessing')
     def test_work_queue_is_full(self, mock_multiprocessing):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
         downloader.num_workers = 3
         self.assertEqual(False, downloader._work_queue_is_full())
-        downloader.async_download_results = [1, 2]
+        downloader.pending_downloads = 2
         self.assertEqual(False, downloader._work_queue_is_full())
-        downloader.async_download_results = [1, 2, 3]
+        downloader.pending_downloads = 3
         self.assertEqual(True, downloader._work_queue_is_full())
-        downloader.async_download_results = [1, 2, 3, 4]
+        downloader.pending_downloads = 4
         self.assertEqual(True, downloader._work_queue_is_full())
 
     @patch('ddsc.core.download.multiprocessing')
     def test_work_queue_is_not_empty(self, mock_multiprocessing):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
         self.assertEqual(False, downloader._work_queue_is_not_empty())
-        downloader.async_download_results = [1, 2, 3]
+        downloader.pending_downloads = 3
+        self.assertEqual(True, downloader._work_queue_is_not_empty())
+        downloader.pending_downloads = 0
+        downloader.delayed_retries = [(1000, 0, Mock())]
         self.assertEqual(True, downloader._work_queue_is_not_empty())
 
     @patch('ddsc.core.download.multiprocessing')
-    @patch('ddsc.core.download.time')
-    def test_wait_for_and_retry_failed_downloads_no_results_ready(self, mock_time, mock_multiprocessing):
+    def test_wait_for_and_retry_failed_downloads_no_results_ready(self, mock_multiprocessing):
         mock_pool = Mock()
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
-        downloader._pop_ready_download_results = Mock()
-        downloader._pop_ready_download_results.return_value = []
-        downloader._try_process_message_queue = Mock()
+        downloader._get_seconds_until_progress_due = Mock(return_value=0.25)
+        downloader._pop_completed_download_results = Mock()
+        downloader._pop_completed_download_results.return_value = []
+        downloader._process_download_results = Mock()
+        downloader.show_progress_bar = Mock()
         downloader._wait_for_and_retry_failed_downloads(mock_pool)
-        mock_time.sleep.assert_called_with(0)
+        downloader._pop_completed_download_results.assert_called_with(timeout=0.25)
+        downloader._process_download_results.assert_not_called()
+        downloader.show_progress_bar.assert_called_with()
 
     @patch('ddsc.core.download.multiprocessing')
-    @patch('ddsc.core.download.time')
-    def test_wait_for_and_retry_failed_downloads_results_ready(self, mock_time, mock_multiprocessing):
+    def test_wait_for_and_retry_failed_downloads_results_ready(self, mock_multiprocessing):
         mock_pool = Mock()
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
-        downloader._pop_ready_download_results = Mock()
-        downloader._pop_ready_download_results.return_value = ['item1']
+        downloader._pop_completed_download_results = Mock()
+        downloader._pop_completed_download_results.return_value = ['item1']
         downloader._process_download_results = Mock()
-        downloader._try_process_message_queue = Mock()
+        downloader.show_progress_bar = Mock()
         downloader._wait_for_and_retry_failed_downloads(mock_pool)
         downloader._process_download_results.assert_called_with(mock_pool, ['item1'])
-        downloader._try_process_message_queue.assert_not_called()
-        mock_time.sleep.assert_not_called()
-
-    @patch('ddsc.core.download.multiprocessing')
-    def test_try_process_message_queue_empty(self, mock_multiprocessing):
-        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
-        downloader.message_queue.get_nowait.side_effect = queue.Empty()
-        downloader.show_progress_bar = Mock()
-        downloader._try_process_message_queue()
         downloader.show_progress_bar.assert_not_called()
 
     @patch('ddsc.core.download.multiprocessing')
-    def test_try_process_message_queue_has_data(self, mock_multiprocessing):
+    @patch('ddsc.core.download.time')
+    def test_get_seconds_until_progress_due(self, mock_time, mock_multiprocessing):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
-        downloader.message_queue.get_nowait.return_value = ('123', 100, 200, FileDownloadState.DOWNLOADING)
-        downloader.show_progress_bar = Mock()
-        downloader._try_process_message_queue()
-        self.assertEqual(downloader.file_download_statuses, {'123': (100, 200, FileDownloadState.DOWNLOADING)})
-        downloader.show_progress_bar.assert_called_with()
+        downloader.last_progress_time = 100
+        mock_time.time.return_value = 100
+        self.assertEqual(downloader._get_seconds_until_progress_due(), PROGRESS_REDRAW_SECONDS)
+        mock_time.time.return_value = 100 + PROGRESS_REDRAW_SECONDS + 1
+        self.assertEqual(downloader._get_seconds_until_progress_due(), 0)
 
     @patch('ddsc.core.download.multiprocessing')
     @patch('ddsc.core.download.sys')
@@ -476,6 +763,19 @@ class TestProjectFileDownloader(TestCase):
         downloader.show_progress_bar()
         mock_sys.stdout.write.assert_called_with('\r| downloaded 1 KB @ 10 B/s          (10 of 20 files complete)')
         mock_sys.stdout.flush.assert_called_with()
+        self.assertEqual(downloader.last_progress_time, 100)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_make_remaining_time(self, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.start_time = 0
+        downloader.bytes_to_download = 4000
+        # the total size isn't known until the listing is complete
+        self.assertEqual(downloader.make_remaining_time(current_time=100, total_bytes_downloaded=1000), '')
+        downloader.listing_complete = True
+        self.assertEqual(downloader.make_remaining_time(current_time=100, total_bytes_downloaded=1000),
+                         ' ~5m00s left')
+        self.assertEqual(downloader.make_remaining_time(current_time=100, total_bytes_downloaded=0), '')
 
     @patch('ddsc.core.download.multiprocessing')
     def test_make_spinner_char(self, mock_multiprocessing):
@@ -505,40 +805,48 @@ class TestProjectFileDownloader(TestCase):
             result = downloader.make_download_speed(current_time, total_bytes_downloaded)
             self.assertEqual(result, expected)
 
-    @patch('ddsc.core.download.multiprocessing')
-    def test_get_download_progress(self, mock_multiprocessing):
+    def test_get_download_progress(self):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
         downloader.files_to_download = 10
-        downloader.file_download_statuses = {
-            '123': (10, 100, FileDownloadState.DOWNLOADING),
-            '124': (200, 200, FileDownloadState.ALREADY_COMPLETE),
-            '125': (200, 200, FileDownloadState.GOOD),
-            '126': (200, 200, FileDownloadState.GOOD),
-        }
+        downloader.files_downloaded = 3
+        downloader.progress_counters.bytes_downloaded[0] = 10
+        downloader.progress_counters.bytes_downloaded[3] = 400
         files_downloaded, total_bytes_downloaded = downloader.get_download_progress()
         self.assertEqual(files_downloaded, 3)
         self.assertEqual(total_bytes_downloaded, 410)
 
     @patch('ddsc.core.download.multiprocessing')
-    def test_pop_ready_download_results(self, mock_multiprocessing):
+    def test_pop_completed_download_results(self, mock_multiprocessing):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
-        result1 = Mock()
-        result1.ready.return_value = True
-        result1.get.return_value = "123"
-        result2 = Mock()
-        result2.ready.return_value = False
-        result2.get.return_value = "456"
-        result3 = Mock()
-        result3.ready.return_value = True
-        result3.get.return_value = "789"
-        downloader.async_download_results = [result1, result2, result3]
-
-        items = downloader._pop_ready_download_results()
-        self.assertEqual(items, ['123', '789'])
-        self.assertEqual(downloader.async_download_results, [result2])
-
-    @patch('ddsc.core.download.multiprocessing')
-    def test_process_download_results_ok_state(self, mock_multiprocessing):
+        downloader.pending_downloads = 3
+        self.assertEqual(downloader._pop_completed_download_results(timeout=0), [])
+        downloader.completed_downloads.put('123')
+        downloader.completed_downloads.put('789')
+        self.assertEqual(downloader._pop_completed_download_results(timeout=0), ['123', '789'])
+        self.assertEqual(downloader.pending_downloads, 1)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_pop_completed_download_results_batch(self, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.pending_downloads = 2
+        downloader.completed_downloads.put(['123', '456'])
+        downloader.completed_downloads.put('789')
+        self.assertEqual(downloader._pop_completed_download_results(timeout=0), ['123', '456', '789'])
+        self.assertEqual(downloader.pending_downloads, 0)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_pop_completed_download_results_worker_exception(self, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.pending_downloads = 1
+        downloader.completed_downloads.put(MemoryError('out of memory'))
+        with self.assertRaises(MemoryError):
+            downloader._pop_completed_download_results(timeout=0)
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.DownloadManifest')
+    @patch('ddsc.core.download.multiprocessing')
+    def test_process_download_results_ok_state(self, mock_multiprocessing, mock_download_manifest,
+                                               mock_download_verification_results):
         pool = Mock()
         result1 = Mock(output_path='/tmp/data.txt', msg='Download failed')
         result1.is_ok_state.return_value = True
@@ -552,14 +860,195 @@ class TestProjectFileDownloader(TestCase):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
         downloader.show_progress_bar = Mock()
         downloader._process_download_results(pool, download_results)
-        self.assertEqual(downloader.file_download_statuses, {'123': (4000, 4000, 'good')})
-        self.assertEqual(downloader.download_status_list, ['mystatus'])
+        self.assertEqual(downloader.files_downloaded, 1)
+        mock_download_verification_results.return_value.add.assert_called_with('mystatus')
         downloader.show_progress_bar.assert_called_with()
+        mock_download_manifest.return_value.add.assert_called_with(result1)
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.FileSyncBatch')
+    @patch('ddsc.core.download.DownloadManifest')
+    @patch('ddsc.core.download.multiprocessing')
+    def test_process_download_results_ok_state_with_fsync(self, mock_multiprocessing, mock_download_manifest,
+                                                          mock_file_sync_batch, mock_download_verification_results):
+        self.config.download_fsync_batch_size = 2
+        result1 = Mock()
+        result1.is_ok_state.return_value = True
+        mock_file_sync_batch.return_value.add.return_value = []
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.show_progress_bar = Mock()
+        downloader._process_download_results(Mock(), [result1])
+        mock_file_sync_batch.assert_called_with(2)
+        mock_file_sync_batch.return_value.add.assert_called_with(result1)
+        mock_download_manifest.return_value.add.assert_not_called()
+
+        # downloads are recorded in the manifest once they have been flushed to disk
+        mock_file_sync_batch.return_value.flush.return_value = [result1]
+        downloader._flush_file_sync_batch()
+        mock_download_manifest.return_value.add.assert_called_with(result1)
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.time')
+    def test_refresh_url_if_expiring_not_expiring(self, mock_time, mock_multiprocessing):
+        mock_time.time.return_value = 1000
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        file_download_state = Mock()
+        file_download_state.url_expires_before.return_value = False
+        downloader._refresh_url_if_expiring(file_download_state)
+        file_download_state.url_expires_before.assert_called_with(1300)
+        file_download_state.set_url.assert_not_called()
+        self.project.get_project_files_page.assert_not_called()
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.time')
+    def test_refresh_url_if_expiring_reads_listing_page_once(self, mock_time, mock_multiprocessing):
+        mock_time.time.return_value = 1000
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        project_file1 = Mock(id='1', file_url={'host': 'somehost', 'url': '/file1'})
+        project_file2 = Mock(id='2', file_url={'host': 'somehost', 'url': '/file2'})
+        self.project.get_project_files_page.return_value = [project_file1, project_file2]
+        file_download_state1 = Mock(file_id='1', listing_page_num=2)
+        file_download_state2 = Mock(file_id='2', listing_page_num=2)
+
+        downloader._refresh_url_if_expiring(file_download_state1)
+        downloader._refresh_url_if_expiring(file_download_state2)
+
+        self.project.get_project_files_page.assert_called_once_with(100, 2, ExcludeResponseFields.DOWNLOAD)
+        file_download_state1.set_url.assert_called_with('somehost/file1', 1000)
+        file_download_state2.set_url.assert_called_with('somehost/file2', 1000)
+        downloader.dds_connection.get_file_download.assert_not_called()
+
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.time')
+    def test_refresh_url_if_expiring_file_not_in_listing(self, mock_time, mock_multiprocessing):
+        mock_time.time.return_value = 1000
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        self.project.get_project_files_page.return_value = []
+        downloader.dds_connection.get_file_download.return_value = Mock(host='somehost', url='/file1')
+        file_download_state = Mock(file_id='1', listing_page_num=2)
+
+        downloader._refresh_url_if_expiring(file_download_state)
+
+        downloader.dds_connection.get_file_download.assert_called_with('1')
+        file_download_state.set_url.assert_called_with('somehost/file1', 1000)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_download_or_copy_file(self, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None,
+                                           dedupe=True)
+        downloader._schedule_download = Mock()
+        downloader._copy_downloaded_contents = Mock()
+        file1 = Mock()
+        file1.get_content_key.return_value = (10, 'abc')
+        file2 = Mock()
+        file2.get_content_key.return_value = (10, 'abc')
+        file3 = Mock()
+        file3.get_content_key.return_value = None
+
+        downloader._download_or_copy_file(file1)
+        downloader._download_or_copy_file(file2)
+        downloader._download_or_copy_file(file3)
+        self.assertEqual(downloader._schedule_download.call_args_list, [call(file1), call(file3)])
+        self.assertEqual(downloader.pending_duplicates, {(10, 'abc'): [file2]})
+
+        # once file1 is downloaded the waiting duplicate is returned and later duplicates are copied immediately
+        self.assertEqual(downloader._add_downloaded_contents(file1), [file2])
+        file4 = Mock()
+        file4.get_content_key.return_value = (10, 'abc')
+        downloader._download_or_copy_file(file4)
+        downloader._copy_downloaded_contents.assert_called_with(file1, file4)
+        self.assertEqual(downloader._schedule_download.call_count, 2)
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.DownloadManifest')
+    def test_copy_downloaded_contents(self, mock_download_manifest, mock_multiprocessing,
+                                      mock_download_verification_results):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None,
+                                           dedupe=True)
+        downloader.show_progress_bar = Mock()
+        source = Mock(output_path='/tmp/data1.txt')
+        source.status.file_hash = Mock(algorithm='md5', expected_hash_value='abc')
+        duplicate = Mock(output_path='/tmp/data2.txt')
+        duplicate.get_content_key.return_value = (10, 'abc')
+        downloader._copy_downloaded_contents(source, duplicate)
+        self.assertEqual(duplicate.copy_source, ('/tmp/data1.txt', {'md5': 'abc'}))
+
+        # the copy is made by a download worker
+        mock_pool = Mock()
+        downloader._dispatch_scheduled_downloads(mock_pool)
+        mock_pool.apply_async.assert_called_with(copy_file, (duplicate,),
+                                                 callback=downloader.completed_downloads.put,
+                                                 error_callback=downloader.completed_downloads.put)
+        self.assertEqual(downloader.pending_downloads, 1)
+
+        duplicate.is_ok_state.return_value = True
+        downloader._process_download_results(mock_pool, [duplicate])
+        self.assertEqual(downloader.files_copied, 1)
+        self.assertEqual(downloader.files_downloaded, 1)
+        mock_download_manifest.return_value.add.assert_called_with(duplicate)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_copy_downloaded_contents_failed(self, mock_multiprocessing):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None,
+                                           dedupe=True)
+        downloader.show_progress_bar = Mock()
+        downloader._schedule_download = Mock()
+        duplicate = Mock(copy_source=('/tmp/data1.txt', {'md5': 'abc'}), retries=2)
+        duplicate.is_ok_state.return_value = False
+        downloader._process_download_results(Mock(), [duplicate])
+        # the file is downloaded instead without using up a retry
+        downloader._schedule_download.assert_called_with(duplicate)
+        self.assertEqual(duplicate.copy_source, None)
+        self.assertEqual(duplicate.retries, 2)
+        self.assertEqual(downloader.files_copied, 0)
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.FileHashStatus')
+    def test_unchanged_file_copies_waiting_duplicates(self, mock_file_hash_status, mock_multiprocessing,
+                                                      mock_download_verification_results):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None,
+                                           dedupe=True)
+        downloader._schedule_download = Mock()
+        downloader._copy_downloaded_contents = Mock()
+        downloader.show_progress_bar = Mock()
+        in_flight_file = Mock()
+        in_flight_file.get_content_key.return_value = (10, 'abc')
+        waiting_file = Mock()
+        waiting_file.get_content_key.return_value = (10, 'abc')
+        unchanged_file = Mock()
+        unchanged_file.get_content_key.return_value = (10, 'abc')
+
+        downloader._download_or_copy_file(in_flight_file)
+        downloader._download_or_copy_file(waiting_file)
+        downloader._record_unchanged_file(unchanged_file, {'hash': {'algorithm': 'md5', 'value': 'abc'}})
+
+        # the file waiting on the in flight download is copied from the unchanged file instead of being dropped
+        downloader._copy_downloaded_contents.assert_called_with(unchanged_file, waiting_file)
+        self.assertEqual(downloader.pending_duplicates, {})
+        self.assertEqual(downloader._add_downloaded_contents(in_flight_file), [])
+
+    @patch('ddsc.core.download.DownloadVerificationResults')
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.DownloadManifest')
+    def test_process_download_results_already_complete(self, mock_download_manifest, mock_multiprocessing,
+                                                       mock_download_verification_results):
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.show_progress_bar = Mock()
+        downloader.bytes_to_download = 1000
+        result1 = Mock(state=FileDownloadState.ALREADY_COMPLETE, size=300)
+        result1.is_ok_state.return_value = True
+        downloader._process_download_results(Mock(), [result1])
+        # bytes of files a worker found already downloaded are not counted towards the remaining time
+        self.assertEqual(downloader.bytes_to_download, 700)
+        self.assertEqual(downloader.files_downloaded, 1)
 
     @patch('ddsc.core.download.multiprocessing')
     def test_process_download_results_has_retry(self, mock_multiprocessing):
         pool = Mock()
-        result1 = Mock(output_path='/tmp/data.txt', msg='Download failed')
+        result1 = Mock(output_path='/tmp/data.txt', msg='Download failed', state=FileDownloadState.ERROR,
+                       retry_after=None, copy_source=None)
         result1.is_ok_state.return_value = False
         result1.retries = 1
         download_results = [
@@ -568,15 +1057,66 @@ class TestProjectFileDownloader(TestCase):
         downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
         downloader.show_progress_bar = Mock()
         downloader.dds_connection.get_file_download.return_value = Mock(host='somehost', url='/api/v1/datafile.txt')
+        before_time = time.time()
         downloader._process_download_results(pool, download_results)
-        self.assertEqual(result1.url, 'somehost/api/v1/datafile.txt')
-        pool.apply_async.assert_called_with(download_file, (result1, downloader.message_queue))
+        result1.set_url.assert_called_with('somehost/api/v1/datafile.txt', ANY)
+        # the retry waits in the coordinator instead of holding a download worker
+        pool.apply_async.assert_not_called()
+        self.assertEqual(downloader.pending_downloads, 0)
+        self.assertEqual(len(downloader.delayed_retries), 1)
+        not_before, _, retry_file_download_state = downloader.delayed_retries[0]
+        self.assertEqual(retry_file_download_state, result1)
+        self.assertTrue(before_time <= not_before <= time.time() + RetrySettings.FETCH_EXTERNAL_RETRY_SECONDS * 2)
+        self.assertTrue(downloader._work_queue_is_not_empty())
         downloader.show_progress_bar.assert_called_with()
 
+    @patch('ddsc.core.download.multiprocessing')
+    @patch('ddsc.core.download.time')
+    def test_dispatch_scheduled_downloads_starts_due_retries(self, mock_time, mock_multiprocessing):
+        pool = Mock()
+        mock_time.time.return_value = 1000
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader._refresh_url_if_expiring = Mock()
+        due_file = Mock()
+        later_file = Mock()
+        downloader.delayed_retries = [(990, 0, due_file), (1030, 1, later_file)]
+        self.assertEqual(downloader._get_seconds_until_retry_due(), 0)
+
+        downloader._dispatch_scheduled_downloads(pool)
+        pool.apply_async.assert_called_once_with(download_file, (due_file,),
+                                                 callback=downloader.completed_downloads.put,
+                                                 error_callback=downloader.completed_downloads.put)
+        downloader._refresh_url_if_expiring.assert_called_with(due_file)
+        self.assertEqual(downloader.delayed_retries, [(1030, 1, later_file)])
+        self.assertEqual(downloader._get_seconds_until_retry_due(), 30)
+
+    @patch('ddsc.core.download.multiprocessing')
+    def test_process_download_results_retry_expired_url_without_waiting(self, mock_multiprocessing):
+        pool = Mock()
+        result1 = Mock(output_path='/tmp/data.txt', msg='Expired', state=FileDownloadState.EXPIRED_URL,
+                       copy_source=None)
+        result1.is_ok_state.return_value = False
+        result1.retries = 1
+        downloader = ProjectFileDownloader(self.config, self.dest_directory, self.project, path_filter=None)
+        downloader.show_progress_bar = Mock()
+        downloader.dds_connection.get_file_download.return_value = Mock(host='somehost', url='/api/v1/datafile.txt')
+        downloader._refresh_url_if_expiring = Mock()
+        downloader._process_download_results(pool, [result1])
+        # expired urls are retried through dispatch so they respect the number of download workers
+        pool.apply_async.assert_not_called()
+        self.assertEqual(downloader._get_seconds_until_retry_due(), 0)
+        downloader.pending_downloads = downloader.num_workers
+        downloader._dispatch_scheduled_downloads(pool)
+        pool.apply_async.assert_not_called()
+        downloader.pending_downloads = 0
+        downloader._dispatch_scheduled_downloads(pool)
+        pool.apply_async.assert_called_with(download_file, (result1,), callback=downloader.completed_downloads.put,
+                                            error_callback=downloader.completed_downloads.put)
+
     @patch('ddsc.core.download.multiprocessing')
     def test_process_download_results_out_of_retries(self, mock_multiprocessing):
         pool = Mock()
-        result1 = Mock(output_path='/tmp/data.txt', msg='Download failed')
+        result1 = Mock(output_path='/tmp/data.txt', msg='Download failed', copy_source=None)
         result1.is_ok_state.return_value = False
         result1.retries = 0
         download_results = [
@@ -588,9 +1128,17 @@ class TestProjectFileDownloader(TestCase):
             downloader._process_download_results(pool, download_results)
         self.assertEqual(str(raised_exception.exception), 'Error downloading /tmp/data.txt\nDownload failed')
         downloader.show_progress_bar.assert_not_called()
+        # the failure is recorded so a shard summary written as the download stops includes it
+        self.assertEqual(downloader.verification_results.failed_status_lines,
+                         ['Error downloading /tmp/data.txt\nDownload failed'])
 
 
 class TestDownloadFunctions(TestCase):
+    @patch('ddsc.core.download.download_file')
+    def test_download_files(self, mock_download_file):
+        mock_download_file.side_effect = lambda file_download_state: file_download_state + '-result'
+        self.assertEqual(download_files(['file1', 'file2']), ['file1-result', 'file2-result'])
+
     @patch('ddsc.core.download.os')
     def test_download_file_already_good(self, mock_os):
         mock_os.path.exists.return_value = True
@@ -602,74 +1150,204 @@ class TestDownloadFunctions(TestCase):
             file_download_state.calculate_file_hash_status.return_value
         )
 
+    @patch('ddsc.core.download.copy_downloaded_file')
+    @patch('ddsc.core.download.FileHashStatus')
+    def test_copy_file_linked(self, mock_file_hash_status, mock_copy_downloaded_file):
+        mock_copy_downloaded_file.return_value = 'hardlink'
+        mock_file_hash_status.determine_for_hashes.return_value.has_a_valid_hash.return_value = True
+        duplicate = Mock(output_path='/tmp/data2.txt', copy_source=('/tmp/data1.txt', {'md5': 'abc'}))
+        result = copy_file(duplicate)
+        self.assertEqual(result, duplicate.mark_good.return_value)
+        mock_copy_downloaded_file.assert_called_with('/tmp/data1.txt', '/tmp/data2.txt')
+        # linked files share the verified contents so they aren't rehashed
+        mock_file_hash_status.determine_for_hashes.assert_called_with(duplicate.hashes, '/tmp/data2.txt',
+                                                                      computed_hash_values={'md5': 'abc'})
+        duplicate.mark_good.assert_called_with(mock_file_hash_status.determine_for_hashes.return_value)
+
+    @patch('ddsc.core.download.copy_downloaded_file')
+    @patch('ddsc.core.download.FileHashStatus')
+    def test_copy_file_copy_fails_verification(self, mock_file_hash_status, mock_copy_downloaded_file):
+        mock_copy_downloaded_file.return_value = 'copy'
+        file_hash_status = mock_file_hash_status.determine_for_hashes.return_value
+        file_hash_status.has_a_valid_hash.return_value = False
+        duplicate = Mock(output_path='/tmp/data2.txt', copy_source=('/tmp/data1.txt', {'md5': 'abc'}))
+        result = copy_file(duplicate)
+        self.assertEqual(result, duplicate.mark_error.return_value)
+        # copies are rehashed
+        mock_file_hash_status.determine_for_hashes.assert_called_with(duplicate.hashes, '/tmp/data2.txt',
+                                                                      computed_hash_values=None)
+        duplicate.mark_error.assert_called_with(msg=file_hash_status.get_status_line.return_value)
+
+    @patch('ddsc.core.download.copy_downloaded_file')
+    def test_copy_file_error(self, mock_copy_downloaded_file):
+        mock_copy_downloaded_file.side_effect = OSError('disk full')
+        duplicate = Mock(output_path='/tmp/data2.txt', copy_source=('/tmp/data1.txt', {'md5': 'abc'}))
+        self.assertEqual(copy_file(duplicate), duplicate.mark_error.return_value)
+        duplicate.mark_error.assert_called_with(msg='disk full')
+
     @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
     @patch('ddsc.core.download.download_url_to_path')
     @patch('ddsc.core.download.compute_download_result')
-    def test_download_file_saves_file(self, mock_compute_download_result, mock_download_url_to_path, mock_os):
+    def test_download_file_saves_file(self, mock_compute_download_result, mock_download_url_to_path,
+                                      mock_partial_download, mock_os):
         mock_os.path.exists.return_value = False
         file_download_state = Mock()
+        file_download_state.use_segmented_download.return_value = False
         result = download_file(file_download_state)
         self.assertEqual(result, mock_compute_download_result.return_value)
-        mock_compute_download_result.assert_called_with(file_download_state, mock_download_url_to_path.return_value)
-        mock_download_url_to_path.assert_called_with(file_download_state, None)
+        partial_download = mock_partial_download.load.return_value
+        mock_partial_download.load.assert_called_with(file_download_state)
+        mock_compute_download_result.assert_called_with(file_download_state, partial_download,
+                                                        mock_download_url_to_path.return_value)
+        mock_download_url_to_path.assert_called_with(file_download_state, partial_download)
 
     @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
     @patch('ddsc.core.download.download_url_to_path')
     @patch('ddsc.core.download.compute_download_result')
-    def test_download_file_expired(self, mock_compute_download_result, mock_download_url_to_path, mock_os):
+    def test_download_file_expired(self, mock_compute_download_result, mock_download_url_to_path,
+                                   mock_partial_download, mock_os):
         mock_os.path.exists.return_value = False
         file_download_state = Mock(url="somehost/api/v1/data1.txt")
+        file_download_state.use_segmented_download.return_value = False
         mock_download_url_to_path.side_effect = URLExpiredException()
         result = download_file(file_download_state)
         self.assertEqual(result, file_download_state.mark_expired_url.return_value)
         file_download_state.mark_expired_url.assert_called_with("Expired URL: somehost/api/v1/data1.txt")
 
     @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
     @patch('ddsc.core.download.download_url_to_path')
     @patch('ddsc.core.download.compute_download_result')
-    def test_download_file_error(self, mock_compute_download_result, mock_download_url_to_path, mock_os):
+    def test_download_file_error(self, mock_compute_download_result, mock_download_url_to_path,
+                                 mock_partial_download, mock_os):
         mock_os.path.exists.return_value = False
         file_download_state = Mock(url="somehost/api/v1/data1.txt")
+        file_download_state.use_segmented_download.return_value = False
         mock_download_url_to_path.side_effect = ValueError("SomeError")
         result = download_file(file_download_state)
         self.assertEqual(result, file_download_state.mark_error.return_value)
         file_download_state.mark_error.assert_called_with(msg='SomeError')
 
-    @patch('ddsc.core.download.requests')
-    def test_download_url_to_path_works(self, mock_requests):
+    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
+    @patch('ddsc.core.download.download_url_to_path')
+    def test_download_file_http_error_records_retry_after(self, mock_download_url_to_path, mock_partial_download,
+                                                          mock_os):
+        mock_os.path.exists.return_value = False
+        file_download_state = Mock(url="somehost/api/v1/data1.txt")
+        file_download_state.use_segmented_download.return_value = False
+        mock_download_url_to_path.side_effect = HTTPError('503 Server Error',
+                                                          response=Mock(headers={'Retry-After': '30'}))
+        result = download_file(file_download_state)
+        self.assertEqual(result, file_download_state.mark_error.return_value)
+        file_download_state.mark_error.assert_called_with(msg='503 Server Error', retry_after=30.0)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_works(self, mock_get_download_session, mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
         file_download_state = Mock(
             url='someurl',
             output_path='/tmp/outfile.dat',
             download_bytes_per_chunk=10,
             file_id='123abc',
             size=100,
-            state=FileDownloadState.DOWNLOADING
+            preallocate=True,
+            state=FileDownloadState.DOWNLOADING,
+            hashes=[{'algorithm': 'md5', 'value': 'abc'}, {'algorithm': 'sha1', 'value': 'def'}]
         )
-        message_queue = Mock()
-        fake_open = mock_open()
-        mock_response = mock_requests.get.return_value
-        mock_response.iter_content.return_value = ['1234567890'] * 10  # 100 bytes of data
-        with patch('ddsc.core.download.open', fake_open, create=True):
-            written_size = download_url_to_path(file_download_state, message_queue)
-        fake_open.assert_called_with('/tmp/outfile.dat', 'wb')
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_response = mock_get_download_session.return_value.get.return_value
+        mock_response.iter_content.return_value = [b'1234567890'] * 10  # 100 bytes of data
+        written_size = download_url_to_path(file_download_state, partial_download)
+        self.assertEqual(file_download_state.computed_hash_values, {
+            'md5': hashlib.md5(b'1234567890' * 10).hexdigest()
+        })
+        partial_download.start.assert_called_with(PartialDownload.SEQUENTIAL)
+        with open(partial_download.part_path, 'rb') as infile:
+            self.assertEqual(infile.read(), b'1234567890' * 10)
+        partial_download.set_sequential_written_size.assert_called_with(100)
         mock_response.iter_content.assert_called_with(chunk_size=10)
-        mock_requests.get.assert_called_with('someurl', stream=True)
-        message_queue.put.assert_has_calls([
-            call(('123abc', 10, 100, 'downloading')),
-            call(('123abc', 20, 100, 'downloading')),
-            call(('123abc', 30, 100, 'downloading')),
-            call(('123abc', 40, 100, 'downloading')),
-            call(('123abc', 50, 100, 'downloading')),
-            call(('123abc', 60, 100, 'downloading')),
-            call(('123abc', 70, 100, 'downloading')),
-            call(('123abc', 80, 100, 'downloading')),
-            call(('123abc', 90, 100, 'downloading')),
-            call(('123abc', 100, 100, 'downloading'))
-        ])
+        mock_get_download_session.return_value.get.assert_called_with('someurl', headers={}, stream=True)
+        mock_add_bytes_downloaded.assert_has_calls([call(10)] * 10)
         self.assertEqual(written_size, 100)
 
-    @patch('ddsc.core.download.requests')
-    def test_download_url_to_path_expired(self, mock_requests):
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_file_mode(self, mock_get_download_session, mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=10, preallocate=False,
+                                   hashes=[{'algorithm': 'md5', 'value': 'abc'}])
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_get_download_session.return_value.get.return_value.iter_content.return_value = [b'1234567890']
+        umask = os.umask(0o022)
+        try:
+            download_url_to_path(file_download_state, partial_download)
+        finally:
+            os.umask(umask)
+        # the downloaded file gets the same permissions open(path, 'wb') would give it
+        self.assertEqual(os.stat(partial_download.part_path).st_mode & 0o777, 0o644)
+
+    @patch('ddsc.core.download.PART_CHECKPOINT_BYTES', 30)
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_saves_checkpoints(self, mock_get_download_session, mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=100, preallocate=True,
+                                   hashes=[{'algorithm': 'md5', 'value': 'abc'}])
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_get_download_session.return_value.get.return_value.iter_content.return_value = [b'1234567890'] * 10
+        download_url_to_path(file_download_state, partial_download)
+        self.assertEqual(partial_download.set_sequential_written_size.call_args_list,
+                         [call(30), call(60), call(90), call(100)])
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_interrupted(self, mock_get_download_session, mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=100, preallocate=True,
+                                   hashes=[{'algorithm': 'md5', 'value': 'abc'}])
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.get_sequential_written_size.return_value = 0
+
+        def interrupted_content(chunk_size):
+            yield b'1234567890'
+            raise requests.exceptions.ConnectionError()
+
+        mock_get_download_session.return_value.get.return_value.iter_content.side_effect = interrupted_content
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            download_url_to_path(file_download_state, partial_download)
+        # the .part file is preallocated so the written size is recorded for resuming
+        self.assertEqual(os.path.getsize(partial_download.part_path), 100)
+        partial_download.set_sequential_written_size.assert_called_with(10)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.preallocate_file')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_without_preallocate(self, mock_get_download_session, mock_preallocate_file,
+                                                      mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=100, preallocate=False,
+                                   hashes=[{'algorithm': 'md5', 'value': 'abc'}])
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_get_download_session.return_value.get.return_value.iter_content.return_value = [b'1234567890'] * 3
+        self.assertEqual(download_url_to_path(file_download_state, partial_download), 30)
+        self.assertEqual(os.path.getsize(partial_download.part_path), 30)
+        mock_preallocate_file.assert_not_called()
+
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_expired(self, mock_get_download_session):
         file_download_state = Mock(
             url='someurl',
             output_path='/tmp/outfile.dat',
@@ -677,14 +1355,16 @@ class TestDownloadFunctions(TestCase):
             file_id='123abc',
             size=100
         )
-        message_queue = Mock()
-        mock_requests.get.return_value = Mock(status_code=S3_EXPIRED_STATUS_CODE)
-        mock_requests.get.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError()
+        partial_download = Mock()
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_response = Mock(status_code=S3_EXPIRED_STATUS_CODE)
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError()
+        mock_get_download_session.return_value.get.return_value = mock_response
         with self.assertRaises(URLExpiredException):
-            download_url_to_path(file_download_state, message_queue)
+            download_url_to_path(file_download_state, partial_download)
 
-    @patch('ddsc.core.download.requests')
-    def test_download_url_to_path_other_error(self, mock_requests):
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_other_error(self, mock_get_download_session):
         file_download_state = Mock(
             url='someurl',
             output_path='/tmp/outfile.dat',
@@ -692,31 +1372,442 @@ class TestDownloadFunctions(TestCase):
             file_id='123abc',
             size=100
         )
-        message_queue = Mock()
-        mock_requests.get.return_value.raise_for_status.side_effect = ValueError()
+        partial_download = Mock()
+        partial_download.get_sequential_written_size.return_value = 0
+        mock_get_download_session.return_value.get.return_value.raise_for_status.side_effect = ValueError()
         with self.assertRaises(ValueError):
-            download_url_to_path(file_download_state, message_queue)
+            download_url_to_path(file_download_state, partial_download)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.IncrementalFileHashes')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_resumes(self, mock_get_download_session, mock_incremental_file_hashes,
+                                          mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, file_id='123abc', size=100,
+                                   preallocate=True, state=FileDownloadState.DOWNLOADING)
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        with open(partial_download.part_path, 'wb') as outfile:
+            outfile.write(b'a' * 70 + b'\0' * 30)
+        partial_download.get_sequential_written_size.return_value = 70
+        mock_response = mock_get_download_session.return_value.get.return_value
+        mock_response.status_code = 206
+        mock_response.iter_content.return_value = [b'1234567890'] * 3
+        written_size = download_url_to_path(file_download_state, partial_download)
+        self.assertEqual(written_size, 100)
+        mock_get_download_session.return_value.get.assert_called_with('someurl', headers={'Range': 'bytes=70-'},
+                                                                      stream=True)
+        with open(partial_download.part_path, 'rb') as infile:
+            self.assertEqual(infile.read(), b'a' * 70 + b'1234567890' * 3)
+        file_hashes = mock_incremental_file_hashes.return_value
+        file_hashes.add_file_prefix.assert_called_with(partial_download.part_path, 70, 10)
+        self.assertEqual(file_hashes.add_chunk.call_count, 3)
+        self.assertEqual(file_download_state.computed_hash_values, file_hashes.get_hash_values.return_value)
+        self.assertEqual(mock_add_bytes_downloaded.call_args_list, [call(10)] * 3)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.IncrementalFileHashes')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_resume_ignored_by_host(self, mock_get_download_session, mock_incremental_file_hashes,
+                                                         mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, file_id='123abc', size=20,
+                                   preallocate=True, state=FileDownloadState.DOWNLOADING)
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        with open(partial_download.part_path, 'wb') as outfile:
+            outfile.write(b'a' * 10)
+        partial_download.get_sequential_written_size.return_value = 10
+        mock_response = mock_get_download_session.return_value.get.return_value
+        mock_response.status_code = 200
+        mock_response.iter_content.return_value = [b'1234567890'] * 2
+        written_size = download_url_to_path(file_download_state, partial_download)
+        self.assertEqual(written_size, 20)
+        with open(partial_download.part_path, 'rb') as infile:
+            self.assertEqual(infile.read(), b'1234567890' * 2)
+        mock_incremental_file_hashes.return_value.add_file_prefix.assert_not_called()
+
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_to_path_already_fully_written(self, mock_get_download_session):
+        file_download_state = Mock(size=100)
+        with tempfile.NamedTemporaryFile() as part_file:
+            partial_download = Mock(part_path=part_file.name)
+            partial_download.get_sequential_written_size.return_value = 100
+            self.assertEqual(download_url_to_path(file_download_state, partial_download), 100)
+        mock_get_download_session.return_value.get.assert_not_called()
+
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_file_empty(self, mock_get_download_session):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        output_path = os.path.join(temp_dir, 'empty.txt')
+        project_file = Mock(id='123', file_version_id='456', size=0,
+                            hashes=[{'algorithm': 'md5', 'value': hashlib.md5(b'').hexdigest()}],
+                            file_url={'host': 'https://storage.com', 'url': '/empty.txt'})
+        config = Mock(download_url_ttl=3600, file_download_retries=2, download_bytes_per_chunk=10,
+                      download_split_threshold=100, segment_size=10, download_segment_workers=2,
+                      download_preallocate=True)
+        file_download_state = download_file(FileDownloadState(project_file, output_path, config))
+        self.assertEqual(file_download_state.state, FileDownloadState.GOOD, file_download_state.msg)
+        self.assertEqual(os.listdir(temp_dir), ['empty.txt'])
+        self.assertEqual(os.path.getsize(output_path), 0)
+        mock_get_download_session.return_value.get.assert_not_called()
+
+    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
+    @patch('ddsc.core.download.download_url_to_path')
+    @patch('ddsc.core.download.download_url_segments_to_path')
+    @patch('ddsc.core.download.compute_download_result')
+    def test_download_file_segmented(self, mock_compute_download_result, mock_download_url_segments_to_path,
+                                     mock_download_url_to_path, mock_partial_download, mock_os):
+        mock_os.path.exists.return_value = False
+        file_download_state = Mock()
+        file_download_state.use_segmented_download.return_value = True
+        result = download_file(file_download_state)
+        self.assertEqual(result, mock_compute_download_result.return_value)
+        mock_compute_download_result.assert_called_with(file_download_state, mock_partial_download.load.return_value,
+                                                        mock_download_url_segments_to_path.return_value)
+        mock_download_url_to_path.assert_not_called()
+
+    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.PartialDownload')
+    @patch('ddsc.core.download.download_url_to_path')
+    @patch('ddsc.core.download.download_url_segments_to_path')
+    @patch('ddsc.core.download.compute_download_result')
+    def test_download_file_segmented_range_not_supported(self, mock_compute_download_result,
+                                                         mock_download_url_segments_to_path,
+                                                         mock_download_url_to_path, mock_partial_download, mock_os):
+        mock_os.path.exists.return_value = False
+        file_download_state = Mock()
+        file_download_state.use_segmented_download.return_value = True
+        mock_download_url_segments_to_path.side_effect = RangeNotSupportedException()
+        download_file(file_download_state)
+        mock_compute_download_result.assert_called_with(file_download_state, mock_partial_download.load.return_value,
+                                                        mock_download_url_to_path.return_value)
+
+    def test_make_download_segments(self):
+        self.assertEqual(make_download_segments(10, 4), [(0, 3), (4, 7), (8, 9)])
+        self.assertEqual(make_download_segments(8, 4), [(0, 3), (4, 7)])
+        self.assertEqual(make_download_segments(0, 4), [])
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segments_to_path(self, mock_get_download_session, mock_add_bytes_downloaded):
+        def fake_get(url, headers, stream):
+            start, end = [int(part) for part in headers['Range'].replace('bytes=', '').split('-')]
+            response = Mock(status_code=206)
+            response.iter_content.return_value = [b'x' * (end + 1 - start)]
+            return response
+        mock_get_download_session.return_value.get.side_effect = fake_get
+        with tempfile.NamedTemporaryFile() as outfile:
+            file_download_state = Mock(url='someurl', download_bytes_per_chunk=10,
+                                       file_id='123abc', size=25, segment_size=10, segment_workers=2,
+                                       state=FileDownloadState.DOWNLOADING)
+            partial_download = Mock(part_path=outfile.name)
+            partial_download.is_segment_complete.side_effect = lambda start, end: start == 10
+            written_size = download_url_segments_to_path(file_download_state, partial_download)
+            self.assertEqual(written_size, 25)
+            with open(outfile.name, 'rb') as infile:
+                self.assertEqual(infile.read(), b'x' * 10 + b'\x00' * 10 + b'x' * 5)
+        partial_download.start.assert_called_with(PartialDownload.SEGMENTED)
+        self.assertEqual(mock_get_download_session.return_value.get.call_count, 2)
+        mock_get_download_session.return_value.get.assert_has_calls([
+            call('someurl', headers={'Range': 'bytes=0-9'}, stream=True),
+            call('someurl', headers={'Range': 'bytes=20-24'}, stream=True),
+        ], any_order=True)
+        partial_download.add_completed_segment.assert_has_calls([call(0, 9), call(20, 24)], any_order=True)
+        mock_add_bytes_downloaded.assert_has_calls([call(10), call(5)], any_order=True)
+        self.assertEqual(mock_add_bytes_downloaded.call_count, 2)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segments_to_path_range_not_supported(self, mock_get_download_session,
+                                                               mock_add_bytes_downloaded):
+        first_segment_response = Mock(status_code=206)
+        first_segment_response.iter_content.return_value = [b'x' * 10]
+        whole_file_response = Mock(status_code=200)
+        mock_get_download_session.return_value.get.side_effect = [first_segment_response, whole_file_response]
+        with tempfile.NamedTemporaryFile() as outfile:
+            file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=20, segment_size=10,
+                                       segment_workers=1, preallocate=False)
+            partial_download = Mock(part_path=outfile.name)
+            partial_download.is_segment_complete.return_value = False
+            with self.assertRaises(RangeNotSupportedException):
+                download_url_segments_to_path(file_download_state, partial_download)
+        # the bytes of the abandoned attempt are removed from progress before downloading the whole file
+        mock_add_bytes_downloaded.assert_has_calls([call(10), call(-10)])
+        whole_file_response.close.assert_called_with()
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segments_to_path_segment_fails(self, mock_get_download_session, mock_add_bytes_downloaded):
+        first_segment_response = Mock(status_code=206)
+        first_segment_response.iter_content.return_value = [b'x' * 10]
+
+        def interrupted_content(chunk_size):
+            yield b'x' * 5
+            raise requests.exceptions.ConnectionError()
+
+        second_segment_response = Mock(status_code=206)
+        second_segment_response.iter_content.side_effect = interrupted_content
+        mock_get_download_session.return_value.get.side_effect = [first_segment_response, second_segment_response]
+        with tempfile.NamedTemporaryFile() as outfile:
+            file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=20, segment_size=10,
+                                       segment_workers=1, preallocate=False)
+            partial_download = Mock(part_path=outfile.name)
+            partial_download.is_segment_complete.return_value = False
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                download_url_segments_to_path(file_download_state, partial_download)
+        # only the unfinished segment is downloaded again so only its bytes are removed from progress
+        self.assertEqual(mock_add_bytes_downloaded.call_args_list, [call(10), call(5), call(-5)])
+        partial_download.add_completed_segment.assert_called_once_with(0, 9)
+
+    @patch('ddsc.core.download.add_bytes_downloaded')
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segments_to_path_file_mode(self, mock_get_download_session, mock_add_bytes_downloaded):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        mock_get_download_session.return_value.get.return_value = Mock(status_code=206)
+        mock_get_download_session.return_value.get.return_value.iter_content.return_value = [b'x' * 10]
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10, size=10, segment_size=10,
+                                   segment_workers=1, preallocate=False)
+        partial_download = Mock(part_path=os.path.join(temp_dir, 'outfile.dat.part'))
+        partial_download.is_segment_complete.return_value = False
+        umask = os.umask(0o022)
+        try:
+            download_url_segments_to_path(file_download_state, partial_download)
+        finally:
+            os.umask(umask)
+        self.assertEqual(os.stat(partial_download.part_path).st_mode & 0o777, 0o644)
+
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segment_range_not_supported(self, mock_get_download_session):
+        mock_response = Mock(status_code=200)
+        mock_get_download_session.return_value.get.return_value = mock_response
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10)
+        with self.assertRaises(RangeNotSupportedException):
+            download_url_segment(file_download_state, Mock(), 3, 0, 9, Mock())
+        mock_response.close.assert_called_with()
+
+    @patch('ddsc.core.download.get_download_session')
+    def test_download_url_segment_expired(self, mock_get_download_session):
+        mock_response = Mock(status_code=S3_EXPIRED_STATUS_CODE)
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError()
+        mock_get_download_session.return_value.get.return_value = mock_response
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10)
+        with self.assertRaises(URLExpiredException):
+            download_url_segment(file_download_state, Mock(), 3, 0, 9, Mock())
+
+    @patch('ddsc.core.download.get_download_session')
+    @patch('ddsc.core.download.os')
+    def test_download_url_segment_wrong_size(self, mock_os, mock_get_download_session):
+        mock_get_download_session.return_value.get.return_value = Mock(status_code=206)
+        mock_get_download_session.return_value.get.return_value.iter_content.return_value = [b'12345']
+        file_download_state = Mock(url='someurl', download_bytes_per_chunk=10)
+        progress = Mock()
+        progress.is_stopped.return_value = False
+        partial_download = Mock()
+        with self.assertRaises(ValueError) as raised_exception:
+            download_url_segment(file_download_state, partial_download, 3, 0, 9, progress)
+        self.assertEqual(str(raised_exception.exception),
+                         'Downloaded segment was wrong size. Expected: 10 Actual: 5')
+        mock_os.pwrite.assert_called_with(3, b'12345', 0)
+        partial_download.add_completed_segment.assert_not_called()
 
     @patch('ddsc.core.download.requests')
     def test_compute_download_result_good(self, mock_requests):
-        file_download_state = Mock(size=100)
-        file_download_state.calculate_file_hash_status.return_value.has_a_valid_hash.return_value = True
-        result = compute_download_result(file_download_state, written_size=100)
+        file_download_state = Mock(size=100, output_path='/tmp/data.txt')
+        file_hash_status = file_download_state.calculate_file_hash_status.return_value
+        file_hash_status.has_a_valid_hash.return_value = True
+        partial_download = Mock(part_path='/tmp/data.txt.part')
+        result = compute_download_result(file_download_state, partial_download, written_size=100)
         self.assertEqual(result, file_download_state.mark_good.return_value)
+        file_download_state.calculate_file_hash_status.assert_called_with('/tmp/data.txt.part')
+        partial_download.finalize.assert_called_with()
+        self.assertEqual(file_hash_status.file_hash.file_path, '/tmp/data.txt')
 
     @patch('ddsc.core.download.requests')
     def test_compute_download_result_bad_hash_error(self, mock_requests):
         file_download_state = Mock(size=100)
         file_hash = file_download_state.calculate_file_hash_status.return_value
         file_hash.has_a_valid_hash.return_value = False
-        result = compute_download_result(file_download_state, written_size=100)
+        partial_download = Mock()
+        result = compute_download_result(file_download_state, partial_download, written_size=100)
         self.assertEqual(result, file_download_state.mark_error.return_value)
+        partial_download.discard.assert_called_with()
+        partial_download.finalize.assert_not_called()
         file_download_state.mark_error.assert_called_with(msg=file_hash.get_status_line.return_value)
 
     @patch('ddsc.core.download.requests')
     def test_compute_download_result_wrong_size_error(self, mock_requests):
         file_download_state = Mock(size=100)
-        result = compute_download_result(file_download_state, written_size=80)
+        partial_download = Mock()
+        result = compute_download_result(file_download_state, partial_download, written_size=80)
+        partial_download.discard.assert_not_called()
         self.assertEqual(result, file_download_state.mark_error.return_value)
         file_download_state.mark_error.assert_called_with(
             msg="Downloaded file was wrong size. Expected: 100 Actual: 80")
+
+
+class TestDownloadURLExpiration(TestCase):
+    def test_get_url_expiration_default_ttl(self):
+        self.assertEqual(get_url_expiration('https://host/file1?sig=abc', issued_at=1000, default_ttl=60), 1060)
+
+    def test_get_url_expiration_swift(self):
+        url = 'https://host/file1?temp_url_sig=abc&temp_url_expires=1500'
+        self.assertEqual(get_url_expiration(url, issued_at=1000, default_ttl=60), 1500)
+
+    def test_get_url_expiration_s3(self):
+        url = 'https://host/file1?X-Amz-Date=19700101T000100Z&X-Amz-Expires=300&X-Amz-Signature=abc'
+        self.assertEqual(get_url_expiration(url, issued_at=1000, default_ttl=60), 360)
+        url = 'https://host/file1?Expires=1500&Signature=abc'
+        self.assertEqual(get_url_expiration(url, issued_at=1000, default_ttl=60), 1500)
+
+    def test_get_url_expiration_azure(self):
+        url = 'https://host/file1?se=1970-01-01T00:10:00Z&sig=abc'
+        self.assertEqual(get_url_expiration(url, issued_at=1000, default_ttl=60), 600)
+
+    def test_get_url_expiration_invalid_value(self):
+        url = 'https://host/file1?temp_url_expires=soon'
+        self.assertEqual(get_url_expiration(url, issued_at=1000, default_ttl=60), 1060)
+
+    @patch('ddsc.core.download.time')
+    def test_get_listing_issued_time(self, mock_time):
+        mock_time.time.return_value = 1000
+        self.assertEqual(get_listing_issued_time({}), 1000)
+        self.assertEqual(get_listing_issued_time({'Date': 'Thu, 01 Jan 1970 00:01:00 GMT'}), 60)
+        self.assertEqual(get_listing_issued_time({'Date': 'Thu, 01 Jan 1970 01:00:00 GMT'}), 1000)
+        self.assertEqual(get_listing_issued_time({'Date': 'bad'}), 1000)
+
+    def test_get_listing_page_num(self):
+        self.assertEqual(get_listing_page_num({}), None)
+        self.assertEqual(get_listing_page_num({'x-page': '3'}), 3)
+
+
+class TestDownloadProgressCounters(TestCase):
+    def test_worker_counters(self):
+        progress_counters = DownloadProgressCounters(num_workers=2)
+        worker1 = WorkerProgressCounter(progress_counters)
+        worker2 = WorkerProgressCounter(progress_counters)
+        self.assertEqual((worker1.slot, worker2.slot), (0, 1))
+        worker1.add_bytes_downloaded(100)
+        worker2.add_bytes_downloaded(50)
+        worker1.add_bytes_downloaded(25)
+        self.assertEqual(list(progress_counters.bytes_downloaded), [125, 50])
+        self.assertEqual(progress_counters.get_total_bytes_downloaded(), 175)
+
+    @patch('ddsc.core.download._worker_progress_counter', None)
+    def test_add_bytes_downloaded(self):
+        progress_counters = DownloadProgressCounters(num_workers=1)
+        # outside of a download worker progress is ignored
+        add_bytes_downloaded(10)
+        self.assertEqual(progress_counters.get_total_bytes_downloaded(), 0)
+        init_download_worker(progress_counters)
+        add_bytes_downloaded(10)
+        self.assertEqual(progress_counters.get_total_bytes_downloaded(), 10)
+
+
+class TestGetDownloadSession(TestCase):
+    @patch('ddsc.core.download._download_sessions', {})
+    @patch('ddsc.core.download.os')
+    @patch('ddsc.core.download.RequestsHttpTransport')
+    def test_get_download_session(self, mock_transport, mock_os):
+        mock_os.getpid.return_value = 100
+        mock_transport.return_value.create_session.side_effect = [Mock(), Mock(), Mock()]
+        settings = HttpTransportSettings(read_timeout=60)
+        s3_file = Mock(url='https://s3.example.com/bucket/file1.txt?sig=abc', segment_workers=4,
+                       http_transport_settings=settings)
+        s3_file2 = Mock(url='https://s3.example.com/bucket/file2.txt?sig=def', segment_workers=4,
+                        http_transport_settings=settings)
+        swift_file = Mock(url='https://swift.example.com/v1/file3.txt', segment_workers=4,
+                          http_transport_settings=settings)
+
+        session = get_download_session(s3_file)
+        self.assertEqual(get_download_session(s3_file2), session)
+        self.assertNotEqual(get_download_session(swift_file), session)
+        mock_transport.assert_called_with(settings)
+        mock_transport.return_value.create_session.assert_called_with(pool_maxsize=4)
+
+        # a new process does not reuse the parent's session
+        mock_os.getpid.return_value = 101
+        self.assertNotEqual(get_download_session(s3_file), session)
+
+
+class TestPartialDownload(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.temp_dir, 'data.txt')
+        self.file_download_state = Mock(file_id='123', size=10, hashes=[{'algorithm': 'md5', 'value': 'abc'}],
+                                        output_path=self.output_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_part_file(self, contents):
+        with open(self.output_path + '.part', 'wb') as outfile:
+            outfile.write(contents)
+
+    def test_load_without_previous_download(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        self.assertEqual(partial_download.part_path, self.output_path + '.part')
+        self.assertEqual(partial_download.state_path, self.output_path + '.part.json')
+        self.assertEqual(partial_download.mode, None)
+        self.assertEqual(partial_download.completed_segments, [])
+
+    def test_load_previous_download(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        partial_download.start(PartialDownload.SEGMENTED)
+        self.write_part_file(b'1234567890')
+        partial_download.add_completed_segment(0, 4)
+
+        partial_download = PartialDownload.load(self.file_download_state)
+        self.assertEqual(partial_download.mode, PartialDownload.SEGMENTED)
+        self.assertEqual(partial_download.is_segment_complete(0, 4), True)
+        self.assertEqual(partial_download.is_segment_complete(5, 9), False)
+
+    def test_load_discards_download_of_different_contents(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        partial_download.start(PartialDownload.SEQUENTIAL)
+        self.write_part_file(b'12345')
+
+        self.file_download_state.hashes = [{'algorithm': 'md5', 'value': 'def'}]
+        partial_download = PartialDownload.load(self.file_download_state)
+        self.assertEqual(partial_download.mode, None)
+        self.assertFalse(os.path.exists(self.output_path + '.part'))
+        self.assertFalse(os.path.exists(self.output_path + '.part.json'))
+
+    def test_start_discards_progress_from_other_mode(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        partial_download.start(PartialDownload.SEGMENTED)
+        self.write_part_file(b'1234567890')
+        partial_download.add_completed_segment(0, 4)
+
+        partial_download.start(PartialDownload.SEQUENTIAL)
+        self.assertEqual(partial_download.completed_segments, [])
+        self.assertEqual(partial_download.get_sequential_written_size(), 0)
+
+    def test_get_sequential_written_size(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        partial_download.start(PartialDownload.SEQUENTIAL)
+        self.assertEqual(partial_download.get_sequential_written_size(), 0)
+        self.write_part_file(b'1234567890')  # preallocated .part file
+        self.assertEqual(partial_download.get_sequential_written_size(), 0)
+        partial_download.set_sequential_written_size(5)
+        partial_download = PartialDownload.load(self.file_download_state)
+        self.assertEqual(partial_download.get_sequential_written_size(), 5)
+        self.write_part_file(b'123')  # .part file shorter than the recorded size
+        self.assertEqual(partial_download.get_sequential_written_size(), 3)
+        self.write_part_file(b'123456789012')
+        self.assertEqual(partial_download.get_sequential_written_size(), 0)
+        self.assertFalse(os.path.exists(self.output_path + '.part'))
+
+    def test_finalize(self):
+        partial_download = PartialDownload.load(self.file_download_state)
+        partial_download.start(PartialDownload.SEQUENTIAL)
+        self.write_part_file(b'1234567890')
+        partial_download.finalize()
+        with open(self.output_path, 'rb') as infile:
+            self.assertEqual(infile.read(), b'1234567890')
+        self.assertFalse(os.path.exists(self.output_path + '.part'))
+        self.assertFalse(os.path.exists(self.output_path + '.part.json'))
@@ -0,0 +1,94 @@
+from unittest import TestCase
+from ddsc.core.downloadmanifest import DownloadManifest, DOWNLOAD_MANIFEST_FILENAME, get_download_manifest_filename
+from ddsc.core.shard import Shard
+from mock import Mock
+import tempfile
+import shutil
+import os
+
+
+class TestDownloadManifest(TestCase):
+    def setUp(self):
+        self.dest_directory = tempfile.mkdtemp()
+        self.output_path = os.path.join(self.dest_directory, 'data', 'file1.txt')
+        os.makedirs(os.path.dirname(self.output_path))
+        with open(self.output_path, 'w') as outfile:
+            outfile.write('12345')
+        self.project_file = Mock(id='123', file_version_id='456', size=5,
+                                 hashes=[{'algorithm': 'md5', 'value': 'abc'}])
+        self.file_download_state = Mock(output_path=self.output_path, file_id='123', file_version_id='456')
+        self.file_download_state.status.file_hash.algorithm = 'md5'
+        self.file_download_state.status.file_hash.expected_hash_value = 'abc'
+
+    def tearDown(self):
+        shutil.rmtree(self.dest_directory)
+
+    def test_add_and_load(self):
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.add(self.file_download_state)
+        manifest.save()
+
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.load()
+        entry = manifest.entries['data/file1.txt']
+        self.assertEqual(entry['file_id'], '123')
+        self.assertEqual(entry['file_version_id'], '456')
+        self.assertEqual(entry['size'], 5)
+        self.assertEqual(entry['hash'], {'algorithm': 'md5', 'value': 'abc'})
+
+    def test_load_ignores_bad_lines(self):
+        with open(os.path.join(self.dest_directory, DOWNLOAD_MANIFEST_FILENAME), 'w') as outfile:
+            outfile.write('{"path": "data/file1.txt", "file_id": "123"}\n')
+            outfile.write('{"path": "data/fi\n')
+            outfile.write('{"nopath": true}\n')
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.load()
+        self.assertEqual(list(manifest.entries.keys()), ['data/file1.txt'])
+
+    def test_save_compacts_entries(self):
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.add(self.file_download_state)
+        outfile = manifest.outfile
+        manifest.add(self.file_download_state)
+        # entries are appended through a single handle that is closed when saving
+        self.assertIs(manifest.outfile, outfile)
+        manifest.save()
+        self.assertTrue(outfile.closed)
+        self.assertIsNone(manifest.outfile)
+        with open(manifest.path) as infile:
+            self.assertEqual(len(infile.readlines()), 1)
+
+    def test_find_matching_entry(self):
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.add(self.file_download_state)
+        entry = manifest.find_matching_entry(self.project_file, self.output_path)
+        self.assertEqual(entry['file_id'], '123')
+
+    def test_find_matching_entry_remote_file_changed(self):
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.add(self.file_download_state)
+        self.project_file.file_version_id = '789'
+        self.assertEqual(manifest.find_matching_entry(self.project_file, self.output_path), None)
+        self.project_file.file_version_id = '456'
+        self.project_file.hashes = [{'algorithm': 'md5', 'value': 'def'}]
+        self.assertEqual(manifest.find_matching_entry(self.project_file, self.output_path), None)
+
+    def test_find_matching_entry_local_file_changed(self):
+        manifest = DownloadManifest(self.dest_directory)
+        manifest.add(self.file_download_state)
+        stat_result = os.stat(self.output_path)
+        os.utime(self.output_path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1000))
+        self.assertEqual(manifest.find_matching_entry(self.project_file, self.output_path), None)
+        os.remove(self.output_path)
+        self.assertEqual(manifest.find_matching_entry(self.project_file, self.output_path), None)
+
+    def test_find_matching_entry_not_in_manifest(self):
+        manifest = DownloadManifest(self.dest_directory)
+        self.assertEqual(manifest.find_matching_entry(self.project_file, self.output_path), None)
+
+
+class TestGetDownloadManifestFilename(TestCase):
+    def test_get_download_manifest_filename(self):
+        self.assertEqual(get_download_manifest_filename(), DOWNLOAD_MANIFEST_FILENAME)
+        self.assertEqual(get_download_manifest_filename(Shard(2, 4)),
+                         '.ddsclient-download-manifest-shard-2-of-4.jsonl')
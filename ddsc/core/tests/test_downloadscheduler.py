@@ -0,0 +1,38 @@
+from unittest import TestCase
+from ddsc.core.downloadscheduler import DownloadScheduler
+from mock import Mock
+
+
+class TestDownloadScheduler(TestCase):
+    def test_pop_batch_largest_first(self):
+        scheduler = DownloadScheduler(window_size=10, batch_size=1, batch_file_size=0, num_workers=2)
+        files = [Mock(size=size) for size in [5, 500, 50, 500]]
+        for item in files:
+            scheduler.add(item)
+        # files of equal size keep the order they were added in
+        self.assertEqual([scheduler.pop_batch() for _ in range(4)], [[files[1]], [files[3]], [files[2]], [files[0]]])
+        self.assertEqual(scheduler.has_pending(), False)
+
+    def test_pop_batch_groups_small_files(self):
+        scheduler = DownloadScheduler(window_size=20, batch_size=4, batch_file_size=100, num_workers=2)
+        large_file = Mock(size=1000)
+        small_files = [Mock(size=10) for _ in range(9)]
+        for item in small_files + [large_file]:
+            scheduler.add(item)
+        self.assertEqual(scheduler.pop_batch(), [large_file])
+        # batches are limited to batch_size
+        self.assertEqual(scheduler.pop_batch(), small_files[:4])
+        # the last files are split between the workers instead of all going to one of them
+        self.assertEqual(scheduler.pop_batch(), small_files[4:7])
+        self.assertEqual(scheduler.pop_batch(), small_files[7:8])
+        self.assertEqual(scheduler.pop_batch(), small_files[8:])
+
+    def test_is_full(self):
+        scheduler = DownloadScheduler(window_size=2, batch_size=1, batch_file_size=0, num_workers=2)
+        self.assertEqual(scheduler.is_full(), False)
+        scheduler.add(Mock(size=1))
+        self.assertEqual(scheduler.is_full(), False)
+        scheduler.add(Mock(size=1))
+        self.assertEqual(scheduler.is_full(), True)
+        scheduler.pop_batch()
+        self.assertEqual(scheduler.is_full(), False)
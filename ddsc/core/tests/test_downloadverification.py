@@ -0,0 +1,65 @@
+from unittest import TestCase
+from ddsc.core.downloadverification import DownloadVerificationResults, get_download_verification_filename, \
+    DOWNLOAD_VERIFICATION_FILENAME
+from ddsc.core.download import FileHashStatus
+from mock import Mock
+import os
+import shutil
+import tempfile
+
+
+class TestDownloadVerificationResults(TestCase):
+    def setUp(self):
+        self.dest_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dest_directory)
+
+    def make_status(self, relative_path, hash_value, status):
+        file_hash = Mock(file_path=os.path.join(self.dest_directory, relative_path), expected_hash_value=hash_value,
+                         algorithm='md5')
+        return FileHashStatus(file_hash, status)
+
+    def test_get_download_verification_filename(self):
+        self.assertEqual(get_download_verification_filename(), DOWNLOAD_VERIFICATION_FILENAME)
+        shard = Mock()
+        shard.get_suffix.return_value = 'shard-1-of-2'
+        self.assertEqual(get_download_verification_filename(shard),
+                         '.ddsclient-download-verification-shard-1-of-2.md5')
+
+    def test_add(self):
+        results = DownloadVerificationResults(self.dest_directory)
+        results.add(self.make_status('data/file1.txt', 'abcd', FileHashStatus.STATUS_OK))
+        results.add(self.make_status('file2.txt', 'efgh', FileHashStatus.STATUS_WARNING))
+        results.add(self.make_status('file3.txt', 'ijkl', FileHashStatus.STATUS_FAILED))
+        results.close()
+
+        self.assertEqual(results.files, 3)
+        self.assertEqual(results.files_with_mismatched_hashes, 1)
+        self.assertEqual(results.failed_status_lines,
+                         ['{} ijkl md5 FAILED'.format(os.path.join(self.dest_directory, 'file3.txt'))])
+        self.assertEqual(results.all_good(), False)
+        with open(results.path) as infile:
+            self.assertEqual(infile.read(), 'MD5 (data/file1.txt) = abcd\n'
+                                            'MD5 (file2.txt) = efgh\n'
+                                            'MD5 (file3.txt) = ijkl\n')
+
+    def test_add_failed(self):
+        results = DownloadVerificationResults(self.dest_directory)
+        results.add_failed('Error downloading file1.txt')
+        results.close()
+        self.assertEqual(results.files, 0)
+        self.assertEqual(results.failed_status_lines, ['Error downloading file1.txt'])
+        self.assertEqual(results.all_good(), False)
+        self.assertEqual(os.listdir(self.dest_directory), [])
+
+    def test_add_escapes_paths(self):
+        results = DownloadVerificationResults(self.dest_directory)
+        results.add(self.make_status('odd\\name\nfile.txt', 'abcd', FileHashStatus.STATUS_OK))
+        results.close()
+        with open(results.path) as infile:
+            self.assertEqual(infile.read(), '\\MD5 (odd\\\\name\\nfile.txt) = abcd\n')
+
+    def test_close_without_results(self):
+        results = DownloadVerificationResults(self.dest_directory)
+        results.close()
+        self.assertEqual(results.all_good(), True)
+        self.assertEqual(os.listdir(self.dest_directory), [])
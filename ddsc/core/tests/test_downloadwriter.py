@@ -0,0 +1,155 @@
+from unittest import TestCase
+from ddsc.core.downloadwriter import DirectoryCache, preallocate_file, FileSyncBatch, copy_downloaded_file, \
+    COPY_METHOD_HARDLINK, COPY_METHOD_REFLINK, COPY_METHOD_COPY, reflink_file
+import errno
+import os
+import shutil
+import tempfile
+from mock import patch, Mock, call
+
+
+class TestDirectoryCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_make_parent_directory(self):
+        directory_cache = DirectoryCache()
+        output_path = os.path.join(self.temp_dir, 'data', 'file1.txt')
+        directory_cache.make_parent_directory(output_path)
+        self.assertTrue(os.path.isdir(os.path.join(self.temp_dir, 'data')))
+        self.assertEqual(directory_cache.existing_directories, {os.path.join(self.temp_dir, 'data')})
+
+    @patch('ddsc.core.downloadwriter.os.makedirs')
+    def test_make_parent_directory_cached(self, mock_makedirs):
+        directory_cache = DirectoryCache()
+        directory_cache.make_parent_directory('/tmp/data/file1.txt')
+        directory_cache.make_parent_directory('/tmp/data/file2.txt')
+        directory_cache.make_parent_directory('/tmp/other/file3.txt')
+        mock_makedirs.assert_has_calls([
+            call('/tmp/data', exist_ok=True),
+            call('/tmp/other', exist_ok=True),
+        ])
+        self.assertEqual(mock_makedirs.call_count, 2)
+
+
+class TestPreallocateFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'data.part')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def preallocate(self, size):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT)
+        try:
+            preallocate_file(fd, size)
+        finally:
+            os.close(fd)
+
+    def test_preallocate_file(self):
+        self.preallocate(1000)
+        self.assertEqual(os.path.getsize(self.path), 1000)
+
+    def test_preallocate_file_shrinks_larger_file(self):
+        with open(self.path, 'wb') as outfile:
+            outfile.write(b'1234567890')
+        self.preallocate(4)
+        self.assertEqual(os.path.getsize(self.path), 4)
+
+    @patch('ddsc.core.downloadwriter.os')
+    def test_preallocate_file_not_supported(self, mock_os):
+        mock_os.posix_fallocate.side_effect = OSError(errno.EOPNOTSUPP, 'Operation not supported')
+        preallocate_file(5, 1000)
+        mock_os.ftruncate.assert_called_with(5, 1000)
+
+    @patch('ddsc.core.downloadwriter.os')
+    def test_preallocate_file_out_of_space(self, mock_os):
+        mock_os.posix_fallocate.side_effect = OSError(errno.ENOSPC, 'No space left on device')
+        with self.assertRaises(OSError):
+            preallocate_file(5, 1000)
+
+
+class TestFileSyncBatch(TestCase):
+    @patch('ddsc.core.downloadwriter.fsync_path')
+    def test_add_flushes_full_batch(self, mock_fsync_path):
+        file_sync_batch = FileSyncBatch(batch_size=2)
+        file_download_state1 = Mock(output_path='/tmp/data/file1.txt')
+        file_download_state2 = Mock(output_path='/tmp/data/file2.txt')
+        self.assertEqual(file_sync_batch.add(file_download_state1), [])
+        mock_fsync_path.assert_not_called()
+        self.assertEqual(file_sync_batch.add(file_download_state2), [file_download_state1, file_download_state2])
+        expected_calls = [call('/tmp/data/file1.txt'), call('/tmp/data/file2.txt')]
+        if os.name == 'posix':
+            expected_calls.append(call('/tmp/data'))
+        self.assertEqual(mock_fsync_path.call_args_list, expected_calls)
+        self.assertEqual(file_sync_batch.flush(), [])
+
+    def test_flush(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        output_path = os.path.join(temp_dir, 'file1.txt')
+        with open(output_path, 'w') as outfile:
+            outfile.write('data')
+        file_sync_batch = FileSyncBatch(batch_size=10)
+        file_download_state = Mock(output_path=output_path)
+        file_sync_batch.add(file_download_state)
+        self.assertEqual(file_sync_batch.flush(), [file_download_state])
+
+
+class TestCopyDownloadedFile(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source_path = os.path.join(self.temp_dir, 'source.txt')
+        self.dest_path = os.path.join(self.temp_dir, 'dest.txt')
+        with open(self.source_path, 'w') as outfile:
+            outfile.write('data')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def read_dest(self):
+        with open(self.dest_path) as infile:
+            return infile.read()
+
+    def test_copy_downloaded_file_hardlink(self):
+        with open(self.dest_path, 'w') as outfile:
+            outfile.write('old')
+        self.assertEqual(copy_downloaded_file(self.source_path, self.dest_path), COPY_METHOD_HARDLINK)
+        self.assertEqual(self.read_dest(), 'data')
+        self.assertTrue(os.path.samefile(self.source_path, self.dest_path))
+        # already linked
+        self.assertEqual(copy_downloaded_file(self.source_path, self.dest_path), COPY_METHOD_HARDLINK)
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), ['dest.txt', 'source.txt'])
+
+    @patch('ddsc.core.downloadwriter.reflink_file')
+    @patch('ddsc.core.downloadwriter.os.link')
+    def test_copy_downloaded_file_reflink(self, mock_link, mock_reflink_file):
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+
+        def fake_reflink(source_path, dest_path):
+            shutil.copyfile(source_path, dest_path)
+            return True
+
+        mock_reflink_file.side_effect = fake_reflink
+        self.assertEqual(copy_downloaded_file(self.source_path, self.dest_path), COPY_METHOD_REFLINK)
+        self.assertEqual(self.read_dest(), 'data')
+
+    @patch('ddsc.core.downloadwriter.reflink_file')
+    @patch('ddsc.core.downloadwriter.os.link')
+    def test_copy_downloaded_file_copy(self, mock_link, mock_reflink_file):
+        mock_link.side_effect = OSError(errno.EXDEV, 'Invalid cross-device link')
+        mock_reflink_file.return_value = False
+        self.assertEqual(copy_downloaded_file(self.source_path, self.dest_path), COPY_METHOD_COPY)
+        self.assertEqual(self.read_dest(), 'data')
+        self.assertFalse(os.path.samefile(self.source_path, self.dest_path))
+
+    def test_reflink_file(self):
+        if reflink_file(self.source_path, self.dest_path):
+            self.assertEqual(self.read_dest(), 'data')
+        else:
+            # filesystem doesn't support reflinks
+            self.assertFalse(os.path.exists(self.dest_path))
@@ -152,6 +152,57 @@ class TestFileUploadOperations(TestCase):
         self.assertEqual(3, data_service.send_external.call_count)
         self.assertEqual(2, data_service.recreate_requests_session.call_count)
 
+    @patch('ddsc.core.fileuploader.time.sleep')
+    def test_send_file_external_retry_put_after_read_timeout(self, mock_sleep):
+        data_service = MagicMock()
+        data_service.send_external.side_effect = [requests.exceptions.ReadTimeout(), Mock(status_code=201)]
+        fop = FileUploadOperations(data_service, MagicMock())
+        fop._show_retry_warning = Mock()
+        url_json = {
+            'http_verb': 'PUT',
+            'host': 'https://stalled.com',
+            'url': '/putdata',
+            'http_headers': [],
+        }
+        fop.send_file_external(url_json, chunk='DATADATADATA')
+        self.assertEqual(2, data_service.send_external.call_count)
+        data_service.recreate_requests_session.assert_called_with()
+
+    @patch('ddsc.core.fileuploader.time.sleep')
+    def test_send_file_external_retry_put_after_503(self, mock_sleep):
+        data_service = MagicMock()
+        data_service.send_external.side_effect = [Mock(status_code=503, headers={'Retry-After': '15'}),
+                                                  Mock(status_code=201)]
+        fop = FileUploadOperations(data_service, MagicMock())
+        fop._show_retry_warning = Mock()
+        url_json = {
+            'http_verb': 'PUT',
+            'host': 'https://busy.com',
+            'url': '/putdata',
+            'http_headers': [],
+        }
+        fop.send_file_external(url_json, chunk='DATADATADATA')
+        self.assertEqual(2, data_service.send_external.call_count)
+        sleep_seconds = mock_sleep.call_args[0][0]
+        self.assertTrue(15 <= sleep_seconds <= 15 + RetrySettings.SEND_EXTERNAL_RETRY_SECONDS)
+        data_service.recreate_requests_session.assert_not_called()
+
+    @patch('ddsc.core.fileuploader.time.sleep')
+    def test_send_file_external_put_503_after_retries(self, mock_sleep):
+        data_service = MagicMock()
+        data_service.send_external.return_value = Mock(status_code=503, headers={})
+        fop = FileUploadOperations(data_service, MagicMock())
+        fop._show_retry_warning = Mock()
+        url_json = {
+            'http_verb': 'PUT',
+            'host': 'https://down.com',
+            'url': '/putdata',
+            'http_headers': [],
+        }
+        with self.assertRaises(ValueError):
+            fop.send_file_external(url_json, chunk='DATADATADATA')
+        self.assertEqual(RetrySettings.SEND_EXTERNAL_PUT_RETRY_TIMES, data_service.send_external.call_count)
+
     @patch('ddsc.core.fileuploader.time.sleep')
     def test_send_file_external_no_retry_post(self, mock_sleep):
         data_service = MagicMock()
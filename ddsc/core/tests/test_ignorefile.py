@@ -17,6 +17,9 @@ class TestFileFilter(TestCase):
         ]
         bad_files = [
             '.ddsclient',
+            '.ddsclient-download-manifest.jsonl',
+            '.ddsclient-download-verification.md5',
+            '.ddsclient-download-verification-shard-1-of-2.md5',
             '.DS_Store',
             '._anything',
             '._abc'
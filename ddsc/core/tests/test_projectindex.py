@@ -0,0 +1,84 @@
+from unittest import TestCase
+from ddsc.core.projectindex import ProjectIndex
+from mock import Mock
+import tempfile
+import shutil
+import stat
+import os
+
+
+class TestProjectIndex(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'index.json')
+        self.current_time = 1000
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def create_index(self, owner='owner1'):
+        return ProjectIndex(self.filename, owner, ttl=60, get_time=lambda: self.current_time)
+
+    def test_lookup_project_ids_without_file(self):
+        self.assertIsNone(self.create_index().lookup_project_ids('mouse'))
+
+    def test_replace_and_lookup(self):
+        project_index = self.create_index()
+        project_index.replace([('mouse', '123'), ('rat', '456'), ('mouse', '789')])
+        self.assertEqual(project_index.lookup_project_ids('mouse'), ['123', '789'])
+        self.assertEqual(project_index.lookup_project_ids('rat'), ['456'])
+        self.assertEqual(project_index.lookup_project_ids('cat'), [])
+
+        # a later command reads the saved index
+        self.assertEqual(self.create_index().lookup_project_ids('rat'), ['456'])
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.temp_dir), ['index.json'])
+
+    def test_lookup_expired(self):
+        self.create_index().replace([('mouse', '123')])
+        self.current_time = 1059
+        self.assertEqual(self.create_index().lookup_project_ids('mouse'), ['123'])
+        self.current_time = 1060
+        self.assertIsNone(self.create_index().lookup_project_ids('mouse'))
+
+    def test_lookup_ignores_index_for_other_owner(self):
+        self.create_index(owner='owner1').replace([('mouse', '123')])
+        self.assertIsNone(self.create_index(owner='owner2').lookup_project_ids('mouse'))
+
+    def test_lookup_ignores_invalid_file(self):
+        with open(self.filename, 'w') as outfile:
+            outfile.write('{"version"')
+        self.assertIsNone(self.create_index().lookup_project_ids('mouse'))
+
+    def test_add_project(self):
+        project_index = self.create_index()
+        project_index.add_project('mouse', '123')
+        self.assertFalse(os.path.exists(self.filename))
+
+        project_index.replace([('rat', '456')])
+        project_index.add_project('mouse', '123')
+        project_index.add_project('mouse', '123')
+        self.assertEqual(self.create_index().lookup_project_ids('mouse'), ['123'])
+
+    def test_remove_project(self):
+        project_index = self.create_index()
+        project_index.replace([('mouse', '123'), ('mouse', '789'), ('rat', '456')])
+        project_index.remove_project('123')
+        project_index.remove_project('456')
+        project_index = self.create_index()
+        self.assertEqual(project_index.lookup_project_ids('mouse'), ['789'])
+        self.assertEqual(project_index.name_to_ids, {'mouse': ['789']})
+
+    def test_write_failure_is_ignored(self):
+        project_index = ProjectIndex(os.path.join(self.temp_dir, 'missing', 'index.json'), 'owner1', ttl=60)
+        project_index.replace([('mouse', '123')])
+        self.assertEqual(project_index.lookup_project_ids('mouse'), ['123'])
+
+    def test_create_for_config(self):
+        self.assertIsNone(ProjectIndex.create_for_config(Mock(project_index_ttl=0)))
+        config = Mock(project_index_ttl=300, url='someurl', agent_key='agent', user_key='user')
+        project_index = ProjectIndex.create_for_config(config)
+        self.assertEqual(project_index.ttl, 300)
+        self.assertEqual(project_index.owner, ProjectIndex.make_owner(config))
+        other_user_config = Mock(project_index_ttl=300, url='someurl', agent_key='agent', user_key='user2')
+        self.assertNotEqual(project_index.owner, ProjectIndex.make_owner(other_user_config))
@@ -220,6 +220,22 @@ class TestCreateSmallFile(TestCase):
 
 
 class TestProjectUploader(TestCase):
+    @patch('ddsc.core.projectuploader.TaskRunner')
+    @patch('ddsc.core.projectuploader.SmallItemUploadTaskBuilder')
+    def test_create_project_and_folders(self, mock_small_task_builder, mock_task_runner):
+        settings = Mock()
+        uploader = ProjectUploader(settings)
+        local_file = Mock(kind=KindType.file_str)
+        local_folder = Mock(kind=KindType.folder_str, children=[local_file])
+        local_project = Mock(kind=KindType.project_str, children=[local_folder, local_file])
+
+        uploader.create_project_and_folders(local_project)
+
+        mock_small_task_builder.return_value.visit_project.assert_called_with(local_project)
+        mock_small_task_builder.return_value.visit_folder.assert_called_with(local_folder, local_project)
+        mock_small_task_builder.return_value.visit_file.assert_not_called()
+        mock_task_runner.return_value.run.assert_called_with()
+
     @patch('ddsc.core.projectuploader.ProjectWalker')
     @patch('ddsc.core.projectuploader.TaskRunner')
     @patch('ddsc.core.projectuploader.SmallItemUploadTaskBuilder')
@@ -1,6 +1,6 @@
 import json
 from unittest import TestCase
-from ddsc.core.util import KindType
+from ddsc.core.util import KindType, REMOTE_PATH_SEP
 from mock import MagicMock, Mock
 from mock.mock import patch
 from ddsc.core.remotestore import RemoteProject, RemoteFolder, RemoteFile, RemoteUser
@@ -10,6 +10,7 @@ from ddsc.core.remotestore import RemoteProjectChildren
 from ddsc.core.remotestore import RemoteAuthProvider
 from ddsc.core.remotestore import ProjectNameOrId
 from ddsc.core.remotestore import ProjectFile, RemoteFileUrl
+from ddsc.core.ddsapi import DataServiceError
 from ddsc.exceptions import DDSUserException
 
 
@@ -390,6 +391,17 @@ class TestRemoteStore(TestCase):
         self.assertEqual(1, len(auth_roles))
         self.assertEqual(expected_str, str(auth_roles[0]))
 
+    def test_get_active_auth_roles(self):
+        data_service = Mock()
+        data_service.get_auth_roles_generator.return_value = iter([
+            {'id': 'project_admin', 'name': 'Project Admin', 'description': '', 'is_deprecated': False},
+            {'id': 'old_role', 'name': 'Old Role', 'description': '', 'is_deprecated': True},
+        ])
+        remote_store = RemoteStore(config=MagicMock(), data_service=data_service)
+        auth_roles = remote_store.get_active_auth_roles(RemoteAuthRole.PROJECT_CONTEXT)
+        data_service.get_auth_roles_generator.assert_called_with(RemoteAuthRole.PROJECT_CONTEXT)
+        self.assertEqual(['project_admin'], [auth_role.id for auth_role in auth_roles])
+
     def test_auth_roles_project(self):
         JSON_DATA = {
             "results": [
@@ -452,18 +464,14 @@ class TestRemoteStore(TestCase):
 
     @patch("ddsc.core.remotestore.DataServiceApi")
     def test_get_projects_with_auth_role(self, mock_data_service_api):
-        projects_resp = Mock()
-        projects_resp.json.return_value = {
-            'results': [
-                {
-                    'id': '123'
-                },
-                {
-                    'id': '456'
-                }
-            ]
-        }
-        mock_data_service_api.return_value.get_projects.return_value = projects_resp
+        mock_data_service_api.return_value.get_projects_generator.return_value = [
+            {
+                'id': '123'
+            },
+            {
+                'id': '456'
+            }
+        ]
         permission_resp = Mock()
         permission_resp.json.side_effect = [
             {
@@ -476,33 +484,38 @@ class TestRemoteStore(TestCase):
                 }
             }
         ]
-        mock_data_service_api.return_value.get_user_project_permission.return_value = permission_resp
+        mock_data_service_api.return_value.get_user_project_permissions_generator.return_value = [
+            permission_resp, permission_resp
+        ]
+        mock_data_service_api.return_value.get_current_user.return_value.json.return_value = {
+            'id': 'user1', 'username': 'joe', 'full_name': 'Joe', 'email': '', 'first_name': '', 'last_name': ''
+        }
         remote_store = RemoteStore(config=MagicMock())
-        result = remote_store.get_projects_with_auth_role(auth_role='project_admin')
-        mock_data_service_api.return_value.get_projects.assert_called()
+        result = list(remote_store.get_projects_with_auth_role(auth_role='project_admin'))
+        mock_data_service_api.return_value.get_projects_generator.assert_called()
+        mock_data_service_api.return_value.get_user_project_permissions_generator.assert_called_with(
+            ['123', '456'], 'user1')
         self.assertEqual(1, len(result))
         self.assertEqual('123', result[0]['id'])
 
     @patch("ddsc.core.remotestore.DataServiceApi")
     def test_fetch_remote_project_exclude_response_fields(self, mock_data_service_api):
         exclude_response_fields = ['audit', 'ancestors', 'project']
-        projects_resp = Mock()
-        projects_resp.json.return_value = {
-            'results': [
-                {
-                    'id': '123',
-                    'kind': 'dds-project',
-                    'name': 'Project1',
-                    'description': '',
-                    'is_deleted': False,
-                },
-            ]
-        }
-        mock_data_service_api.return_value.get_projects.return_value = projects_resp
+        mock_data_service_api.return_value.get_projects_generator.return_value = [
+            {
+                'id': '123',
+                'kind': 'dds-project',
+                'name': 'Project1',
+                'description': '',
+                'is_deleted': False,
+            },
+        ]
+        mock_data_service_api.return_value.get_project_children_generator.return_value = []
         remote_store = RemoteStore(config=MagicMock())
         project_name_or_id = ProjectNameOrId.create_from_project_id('123')
         remote_store.fetch_remote_project(project_name_or_id, must_exist=True, include_children=True)
-        mock_data_service_api.return_value.get_project_children.assert_called_with('123', '', exclude_response_fields)
+        mock_data_service_api.return_value.get_project_children_generator.assert_called_with(
+            '123', '', exclude_response_fields)
 
     @patch("ddsc.core.remotestore.DataServiceApi")
     def test_get_project_files(self, mock_data_service_api):
@@ -530,6 +543,78 @@ class TestRemoteStore(TestCase):
         self.assertEqual(project_files[0].name, 'somefile')
         self.assertEqual(project_files[0].size, 100)
 
+    def test_get_my_project_using_index(self):
+        data_service = Mock()
+        data_service.get_project_by_id.return_value.json.return_value = {
+            'id': '123', 'kind': 'dds-project', 'name': 'mouse', 'description': '', 'is_deleted': False
+        }
+        project_index = Mock()
+        project_index.lookup_project_ids.return_value = ['123']
+        remote_store = RemoteStore(config=MagicMock(), data_service=data_service, project_index=project_index)
+
+        project = remote_store._get_my_project(ProjectNameOrId.create_from_name('mouse'))
+
+        self.assertEqual(project.id, '123')
+        project_index.lookup_project_ids.assert_called_with('mouse')
+        data_service.get_project_by_id.assert_called_with('123')
+        data_service.get_projects_generator.assert_not_called()
+
+    def test_get_my_project_refreshes_index(self):
+        project_dicts = [
+            {'id': '456', 'kind': 'dds-project', 'name': 'rat', 'description': '', 'is_deleted': False},
+            {'id': '789', 'kind': 'dds-project', 'name': 'mouse', 'description': '', 'is_deleted': False},
+        ]
+        data_service = Mock()
+        data_service.get_projects_generator.return_value = project_dicts
+        # the indexed project was renamed
+        data_service.get_project_by_id.return_value.json.return_value = {
+            'id': '123', 'kind': 'dds-project', 'name': 'cat', 'description': '', 'is_deleted': False
+        }
+        project_index = Mock()
+        remote_store = RemoteStore(config=MagicMock(), data_service=data_service, project_index=project_index)
+
+        for project_ids in [None, [], ['123'], ['123', '456']]:
+            project_index.lookup_project_ids.return_value = project_ids
+            project_index.replace.reset_mock()
+            project = remote_store._get_my_project(ProjectNameOrId.create_from_name('mouse'))
+            self.assertEqual(project.id, '789')
+            project_index.replace.assert_called_with([('rat', '456'), ('mouse', '789')])
+
+        # indexed project no longer exists
+        project_index.lookup_project_ids.return_value = ['123']
+        data_service.get_project_by_id.side_effect = DataServiceError(Mock(status_code=404), Mock(), Mock())
+        project = remote_store._get_my_project(ProjectNameOrId.create_from_name('elephant'))
+        self.assertIsNone(project)
+
+    def test_get_my_project_by_id_skips_index(self):
+        data_service = Mock()
+        data_service.get_projects_generator.return_value = [
+            {'id': '123', 'kind': 'dds-project', 'name': 'mouse', 'description': '', 'is_deleted': False},
+        ]
+        project_index = Mock()
+        remote_store = RemoteStore(config=MagicMock(), data_service=data_service, project_index=project_index)
+        project = remote_store._get_my_project(ProjectNameOrId.create_from_project_id('123'))
+        self.assertEqual(project.name, 'mouse')
+        project_index.lookup_project_ids.assert_not_called()
+
+    def test_delete_project_updates_index(self):
+        data_service = Mock()
+        data_service.get_projects_generator.return_value = [
+            {'id': '123', 'kind': 'dds-project', 'name': 'mouse', 'description': '', 'is_deleted': False},
+        ]
+        project_index = Mock()
+        remote_store = RemoteStore(config=MagicMock(), data_service=data_service, project_index=project_index)
+        remote_store.delete_project(ProjectNameOrId.create_from_project_id('123'))
+        data_service.delete_project.assert_called_with('123')
+        project_index.remove_project.assert_called_with('123')
+
+    def test_add_project_to_index(self):
+        project_index = Mock()
+        remote_store = RemoteStore(config=MagicMock(), data_service=Mock(), project_index=project_index)
+        remote_store.add_project_to_index('mouse', '123')
+        project_index.add_project.assert_called_with('mouse', '123')
+        RemoteStore(config=MagicMock(), data_service=Mock()).add_project_to_index('mouse', '123')
+
     @patch("ddsc.core.remotestore.DataServiceApi")
     def test_constructor(self, mock_data_service_api):
         mock_data_serivce = Mock()
@@ -548,18 +633,14 @@ class TestRemoteStore(TestCase):
         user_dict = {
             'id': '123',
         }
-        users_resp = Mock()
-        users_resp.json.return_value = {
-            'results': [
-                user_dict,
-            ]
-        }
-        mock_data_service_api.return_value.get_users.return_value = users_resp
+        mock_data_service_api.return_value.get_users_generator.return_value = [
+            user_dict,
+        ]
 
         remote_store = RemoteStore(config=MagicMock())
         users = remote_store.fetch_users()
 
-        mock_data_service_api.return_value.get_users.assert_called_with(email=None, username=None)
+        mock_data_service_api.return_value.get_users_generator.assert_called_with(email=None, username=None)
         self.assertEqual(len(users), 1)
         self.assertEqual(users[0], mock_remote_user.return_value)
         mock_remote_user.assert_called_with(user_dict)
@@ -570,18 +651,14 @@ class TestRemoteStore(TestCase):
         user_dict = {
             'id': '123',
         }
-        users_resp = Mock()
-        users_resp.json.return_value = {
-            'results': [
-                user_dict,
-            ]
-        }
-        mock_data_service_api.return_value.get_users.return_value = users_resp
+        mock_data_service_api.return_value.get_users_generator.return_value = [
+            user_dict,
+        ]
 
         remote_store = RemoteStore(config=MagicMock())
         users = remote_store.fetch_users(email='joe@joe.com', username='joe')
 
-        mock_data_service_api.return_value.get_users.assert_called_with(email='joe@joe.com', username='joe')
+        mock_data_service_api.return_value.get_users_generator.assert_called_with(email='joe@joe.com', username='joe')
         self.assertEqual(len(users), 1)
         self.assertEqual(users[0], mock_remote_user.return_value)
         mock_remote_user.assert_called_with(user_dict)
@@ -769,6 +846,26 @@ class TestRemoteProjectChildren(TestCase):
         self.assertEqual(file3_id, tree[2].id)
         self.assertEqual(None, tree[2].file_hash)
 
+    def test_deep_tree(self):
+        project_id = 'project1'
+        depth = 2000  # deeper than the default recursion limit
+        sample_data = []
+        parent_id = project_id
+        for i in range(depth):
+            folder_id = 'folder{}'.format(i)
+            sample_data.append({'kind': 'dds-folder', 'parent': {'kind': 'dds-folder', 'id': parent_id},
+                                'is_deleted': False, 'name': 'f', 'id': folder_id})
+            parent_id = folder_id
+        sample_data.reverse()  # children are listed before their parents
+        tree = RemoteProjectChildren(project_id, sample_data).get_tree()
+        folder = tree[0]
+        for i in range(1, depth):
+            self.assertEqual(1, len(folder.children))
+            folder = folder.children[0]
+            self.assertEqual('folder{}'.format(i), folder.id)
+        self.assertEqual([], folder.children)
+        self.assertEqual(REMOTE_PATH_SEP + '/'.join(['f'] * depth), folder.remote_path)
+
 
 class TestReadRemoteHash(TestCase):
     def test_old_way(self):
@@ -923,6 +1020,16 @@ class TestProjectFile(TestCase):
         project_file = ProjectFile(self.project_file_dict)
         self.assertEqual('/tmp/data/docs/somefile', project_file.get_local_path('/tmp/'))
 
+    def test_file_version_id(self):
+        project_file = ProjectFile(self.project_file_dict)
+        self.assertEqual(project_file.file_version_id, None)
+        self.project_file_dict['current_version'] = None
+        project_file = ProjectFile(self.project_file_dict)
+        self.assertEqual(project_file.file_version_id, None)
+        self.project_file_dict['current_version'] = {'id': '456'}
+        project_file = ProjectFile(self.project_file_dict)
+        self.assertEqual(project_file.file_version_id, '456')
+
     def test_create_for_dds_file_dict(self):
         file_dict = {
             "id": "123",
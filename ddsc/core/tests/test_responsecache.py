@@ -0,0 +1,76 @@
+from unittest import TestCase
+from ddsc.core.responsecache import ResponseCache, get_resource_name
+from mock import Mock
+
+
+class TestResponseCache(TestCase):
+    def setUp(self):
+        self.current_time = 100
+        self.cache = ResponseCache(ttl=10, max_entries=3, get_time=lambda: self.current_time)
+
+    def test_get_resource_name(self):
+        self.assertEqual(get_resource_name('/projects/123/children'), 'projects')
+        self.assertEqual(get_resource_name('/current_user'), 'current_user')
+        self.assertEqual(get_resource_name('/relations/dds-file/123'), 'relations')
+
+    def test_add_and_get(self):
+        response = Mock()
+        self.assertEqual(self.cache.get('/projects', {'page': 1}), None)
+        self.cache.add('/projects', {'page': 1}, response)
+        self.assertEqual(self.cache.get('/projects', {'page': 1}), response)
+        self.assertEqual(self.cache.get('/projects', {'page': 2}), None)
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 2)
+
+    def test_key_ignores_data_order(self):
+        response = Mock()
+        self.cache.add('/users', {'email': 'joe@joe.com', 'page': 1}, response)
+        self.assertEqual(self.cache.get('/users', {'page': 1, 'email': 'joe@joe.com'}), response)
+
+    def test_get_expired(self):
+        self.cache.add('/current_user', {}, Mock())
+        self.current_time = 110
+        self.assertEqual(self.cache.get('/current_user', {}), None)
+        self.assertEqual(len(self.cache.entries), 0)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_add_removes_least_recently_used(self):
+        self.cache.add('/projects/1', {}, Mock())
+        self.cache.add('/projects/2', {}, Mock())
+        self.cache.add('/projects/3', {}, Mock())
+        self.cache.get('/projects/1', {})
+        self.cache.add('/projects/4', {}, Mock())
+        self.assertIsNotNone(self.cache.get('/projects/1', {}))
+        self.assertIsNone(self.cache.get('/projects/2', {}))
+        self.assertIsNotNone(self.cache.get('/projects/3', {}))
+        self.assertIsNotNone(self.cache.get('/projects/4', {}))
+
+    def test_download_urls_are_not_cached(self):
+        self.cache.add('/files/123/url', {}, Mock())
+        self.cache.add('/projects/123/files', {'page': 1}, Mock())
+        self.assertEqual(len(self.cache.entries), 0)
+        self.assertIsNone(self.cache.get('/files/123/url', {}))
+
+    def test_invalidate(self):
+        self.cache = ResponseCache(ttl=10, max_entries=10, get_time=lambda: self.current_time)
+        self.cache.add('/projects', {}, Mock())
+        self.cache.add('/projects/123/children', {}, Mock())
+        self.cache.add('/folders/456/children', {}, Mock())
+        self.cache.add('/current_user', {}, Mock())
+        self.cache.add('/auth_roles', {}, Mock())
+
+        self.cache.invalidate('/folders/789')
+        self.assertIsNone(self.cache.get('/projects', {}))
+        self.assertIsNone(self.cache.get('/projects/123/children', {}))
+        self.assertIsNone(self.cache.get('/folders/456/children', {}))
+        self.assertIsNotNone(self.cache.get('/current_user', {}))
+
+        self.cache.invalidate('/current_user')
+        self.assertIsNone(self.cache.get('/current_user', {}))
+        self.assertIsNotNone(self.cache.get('/auth_roles', {}))
+
+    def test_create_for_config(self):
+        self.assertIsNone(ResponseCache.create_for_config(Mock(get_cache_ttl=0, get_cache_size=10)))
+        cache = ResponseCache.create_for_config(Mock(get_cache_ttl=30, get_cache_size=10))
+        self.assertEqual(cache.ttl, 30)
+        self.assertEqual(cache.max_entries, 10)
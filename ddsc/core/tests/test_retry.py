@@ -0,0 +1,90 @@
+from unittest import TestCase
+from ddsc.core.retry import RetrySettings, ExponentialBackoff, CircuitBreaker, get_retry_after_seconds, \
+    get_circuit_breaker
+from email.utils import formatdate
+from mock import patch, Mock
+import time
+
+
+class TestGetRetryAfterSeconds(TestCase):
+    def test_seconds(self):
+        self.assertEqual(get_retry_after_seconds(Mock(headers={'Retry-After': '30'})), 30.0)
+
+    def test_http_date(self):
+        retry_after = formatdate(time.time() + 100, usegmt=True)
+        seconds = get_retry_after_seconds(Mock(headers={'Retry-After': retry_after}))
+        self.assertTrue(95 < seconds <= 100)
+
+    def test_limits(self):
+        self.assertEqual(get_retry_after_seconds(Mock(headers={'Retry-After': '-5'})), 0)
+        self.assertEqual(get_retry_after_seconds(Mock(headers={'Retry-After': '86400'})),
+                         RetrySettings.RETRY_AFTER_MAX_SECONDS)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(get_retry_after_seconds(None))
+        self.assertIsNone(get_retry_after_seconds(Mock(headers={})))
+        self.assertIsNone(get_retry_after_seconds(Mock(headers={'Retry-After': 'soon'})))
+
+
+class TestExponentialBackoff(TestCase):
+    @patch('ddsc.core.retry.random')
+    def test_get_wait_seconds(self, mock_random):
+        mock_random.uniform.side_effect = lambda low, high: high
+        backoff = ExponentialBackoff(base_seconds=2, max_seconds=10)
+        self.assertEqual([backoff.get_wait_seconds(retry_num) for retry_num in range(1, 6)], [2, 4, 8, 10, 10])
+        self.assertEqual(backoff.get_wait_seconds(1000), 10)
+        mock_random.uniform.assert_called_with(0, 10)
+
+    def test_get_wait_seconds_is_random(self):
+        backoff = ExponentialBackoff(base_seconds=2, max_seconds=10)
+        wait_seconds = [backoff.get_wait_seconds(3) for _ in range(20)]
+        self.assertTrue(all(0 <= seconds <= 8 for seconds in wait_seconds))
+        self.assertGreater(len(set(wait_seconds)), 1)
+
+    def test_get_wait_seconds_retry_after(self):
+        backoff = ExponentialBackoff(base_seconds=2, max_seconds=10)
+        self.assertTrue(30 <= backoff.get_wait_seconds(1, retry_after=30) <= 32)
+
+
+class TestCircuitBreaker(TestCase):
+    def setUp(self):
+        self.current_time = 100
+        self.circuit_breaker = CircuitBreaker(get_time=lambda: self.current_time)
+
+    def test_stays_closed_for_occasional_failures(self):
+        for _ in range(RetrySettings.CIRCUIT_BREAKER_WINDOW):
+            self.circuit_breaker.record_success()
+            self.circuit_breaker.record_success()
+            self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.get_wait_seconds(), 0)
+        self.assertFalse(self.circuit_breaker.recovering)
+
+    def test_opens_when_failure_rate_high(self):
+        for _ in range(RetrySettings.CIRCUIT_BREAKER_MIN_FAILURES - 1):
+            self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.get_wait_seconds(), 0)
+        self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.get_wait_seconds(), RetrySettings.CIRCUIT_BREAKER_OPEN_SECONDS)
+        self.assertTrue(self.circuit_breaker.recovering)
+
+        sleep = Mock()
+        with self.circuit_breaker.sending_request(sleep=sleep):
+            pass
+        sleep.assert_called_with(RetrySettings.CIRCUIT_BREAKER_OPEN_SECONDS)
+
+        self.current_time += RetrySettings.CIRCUIT_BREAKER_OPEN_SECONDS
+        self.assertEqual(self.circuit_breaker.get_wait_seconds(), 0)
+        self.circuit_breaker.record_success()
+        self.assertFalse(self.circuit_breaker.recovering)
+
+    def test_record_response(self):
+        for _ in range(RetrySettings.CIRCUIT_BREAKER_MIN_FAILURES):
+            self.circuit_breaker.record_response(Mock(status_code=503))
+        self.assertTrue(self.circuit_breaker.recovering)
+        self.circuit_breaker.record_response(Mock(status_code=404))
+        self.assertFalse(self.circuit_breaker.recovering)
+
+    def test_get_circuit_breaker_per_host(self):
+        circuit_breaker = get_circuit_breaker('https://storage1.com/bucket/file1')
+        self.assertIs(get_circuit_breaker('https://storage1.com/bucket/file2'), circuit_breaker)
+        self.assertIsNot(get_circuit_breaker('https://storage2.com/bucket/file1'), circuit_breaker)
@@ -0,0 +1,38 @@
+from unittest import TestCase
+from ddsc.core.shard import Shard
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestShard(TestCase):
+    def test_parse(self):
+        shard = Shard.parse('2/8')
+        self.assertEqual(shard.index, 2)
+        self.assertEqual(shard.count, 8)
+        self.assertEqual(str(shard), '2/8')
+        self.assertEqual(shard.get_suffix(), 'shard-2-of-8')
+
+    def test_parse_invalid(self):
+        for value in ['2', '2/', 'a/b', '0/4', '5/4', '1/0', '1/2/3']:
+            with self.assertRaises(ValueError):
+                Shard.parse(value)
+
+    def test_includes_partitions_keys(self):
+        keys = ['file-{}'.format(i) for i in range(100)]
+        shards = [Shard(index, 3) for index in range(1, 4)]
+        for key in keys:
+            self.assertEqual(sum(shard.includes(key) for shard in shards), 1)
+        # the assignment is stable
+        self.assertEqual([Shard(1, 3).includes(key) for key in keys], [shards[0].includes(key) for key in keys])
+        self.assertTrue(all(Shard(1, 1).includes(key) for key in keys))
+
+    def test_write_download_summary(self):
+        dest_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dest_directory)
+        path = Shard(1, 2).write_download_summary(dest_directory, {'files': 3, 'all_good': True})
+        self.assertEqual(path, os.path.join(dest_directory, '.ddsclient-download-summary-shard-1-of-2.json'))
+        with open(path) as infile:
+            self.assertEqual(json.load(infile), {'files': 3, 'all_good': True, 'shard': '1/2'})
+        self.assertEqual(os.listdir(dest_directory), ['.ddsclient-download-summary-shard-1-of-2.json'])
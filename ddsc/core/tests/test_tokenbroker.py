@@ -0,0 +1,58 @@
+from unittest import TestCase
+from ddsc.core.tokenbroker import TokenBroker, BrokeredDataServiceAuth, TokenBrokerProcess, create_worker_auth
+from ddsc.core.ddsapi import DataServiceAuth
+from ddsc.config import Config
+from mock import patch, Mock
+import time
+
+
+class TestTokenBroker(TestCase):
+    @patch('ddsc.core.tokenbroker.DataServiceAuth.claim_new_token', autospec=True)
+    def test_get_auth_data_claims_expiring_token_once(self, mock_claim_new_token):
+        mock_claim_new_token.side_effect = lambda auth: auth.set_token('new', time.time() + 3600)
+        token_broker = TokenBroker(Config(), ('old', time.time() + 1))
+        auth, _ = token_broker.get_auth_data()
+        self.assertEqual(auth, 'new')
+        auth, _ = token_broker.get_auth_data()
+        self.assertEqual(auth, 'new')
+        self.assertEqual(mock_claim_new_token.call_count, 1)
+
+    def test_get_auth_data_saves_new_token(self):
+        token_cache = Mock()
+        token_cache.load.return_value = None
+        with patch('ddsc.core.tokenbroker.DataServiceAuth.claim_new_token', autospec=True) as mock_claim_new_token:
+            mock_claim_new_token.side_effect = lambda auth: auth.set_token('new', 5000.0)
+            token_broker = TokenBroker(Config(), ('old', 1.0), token_cache=token_cache)
+            token_broker.get_auth_data()
+        token_cache.save.assert_called_with('new', 5000.0)
+
+
+class TestBrokeredDataServiceAuth(TestCase):
+    def test_get_auth_uses_broker_for_expired_token(self):
+        token_broker = Mock()
+        token_broker.get_auth_data.return_value = ('new', time.time() + 3600)
+        auth = create_worker_auth(Config(), ('old', time.time() + 1), token_broker)
+        self.assertIsInstance(auth, BrokeredDataServiceAuth)
+        self.assertEqual(auth.get_auth(), 'new')
+        self.assertEqual(auth.get_auth(), 'new')
+        self.assertEqual(token_broker.get_auth_data.call_count, 1)
+
+    def test_create_worker_auth_without_broker(self):
+        auth = create_worker_auth(Config(), ('old', 123.0))
+        self.assertEqual(type(auth), DataServiceAuth)
+        self.assertEqual(auth.get_auth_data(), ('old', 123.0))
+
+
+class TestTokenBrokerProcess(TestCase):
+    def test_legacy_auth_has_no_broker(self):
+        auth = Mock()
+        auth.legacy_auth.return_value = True
+        with TokenBrokerProcess(Config(), auth) as token_broker:
+            self.assertIsNone(token_broker)
+
+    def test_shares_token_from_broker_process(self):
+        expires = time.time() + 3600
+        auth = DataServiceAuth(Config())
+        auth.set_auth_data(('abc', expires))
+        with TokenBrokerProcess(Config(), auth) as token_broker:
+            self.assertEqual(token_broker.get_auth_data(), ('abc', expires))
@@ -0,0 +1,46 @@
+from unittest import TestCase
+from ddsc.core.tokencache import TokenCache
+from mock import Mock
+import tempfile
+import shutil
+import stat
+import os
+
+
+class TestTokenCache(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.temp_dir, 'token.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_without_file(self):
+        self.assertIsNone(TokenCache(self.filename, 'owner1').load())
+
+    def test_save_and_load(self):
+        TokenCache(self.filename, 'owner1').save('abc', 1234.5)
+        self.assertEqual(TokenCache(self.filename, 'owner1').load(), ('abc', 1234.5))
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.temp_dir), ['token.json'])
+
+    def test_load_ignores_token_for_other_owner(self):
+        TokenCache(self.filename, 'owner1').save('abc', 1234.5)
+        self.assertIsNone(TokenCache(self.filename, 'owner2').load())
+
+    def test_load_ignores_invalid_file(self):
+        with open(self.filename, 'w') as outfile:
+            outfile.write('{"version"')
+        self.assertIsNone(TokenCache(self.filename, 'owner1').load())
+
+    def test_save_failure_is_ignored(self):
+        token_cache = TokenCache(os.path.join(self.temp_dir, 'missing', 'token.json'), 'owner1')
+        token_cache.save('abc', 1234.5)
+        self.assertIsNone(token_cache.load())
+
+    def test_create_for_config(self):
+        self.assertIsNone(TokenCache.create_for_config(Mock(auth_token_cache=False)))
+        config = Mock(auth_token_cache=True, url='someurl', agent_key='agent', user_key='user')
+        token_cache = TokenCache.create_for_config(config)
+        other_user_config = Mock(auth_token_cache=True, url='someurl', agent_key='agent', user_key='user2')
+        self.assertNotEqual(token_cache.owner, TokenCache.create_for_config(other_user_config).owner)
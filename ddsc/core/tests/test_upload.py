@@ -1,6 +1,7 @@
 from __future__ import absolute_import
 from unittest import TestCase
 from ddsc.core.upload import ProjectUpload, UploadReport
+from ddsc.core.remotestore import ProjectNameOrId
 from mock import patch, Mock
 
 
@@ -32,6 +33,26 @@ class TestProjectUpload(TestCase):
         )
         mock_local_project.return_value.add_paths.assert_called_with(['/tmp/data'])
 
+    @patch("ddsc.core.upload.RemoteStore")
+    @patch("ddsc.core.upload.ProjectIndex")
+    @patch("ddsc.core.upload.TokenCache")
+    @patch("ddsc.core.upload.ProjectUploader")
+    @patch("ddsc.core.upload.ProgressPrinter")
+    def test_run_adds_project_to_index(self, mock_progress_printer, mock_project_uploader, mock_token_cache,
+                                       mock_project_index, mock_remote_store):
+        config = Mock()
+        project_name_or_id = ProjectNameOrId.create_from_name('mouse')
+        project_upload = ProjectUpload(config=config, project_name_or_id=project_name_or_id,
+                                       local_project=Mock(remote_id='123'), items_to_send_count=Mock())
+        mock_remote_store.assert_called_with(config, project_index=mock_project_index.create_for_config.return_value,
+                                             token_cache=mock_token_cache.create_for_config.return_value)
+        mock_project_index.create_for_config.assert_called_with(config)
+        mock_token_cache.create_for_config.assert_called_with(config)
+
+        project_upload.run()
+
+        mock_remote_store.return_value.add_project_to_index.assert_called_with('mouse', '123')
+
 
 class TestUploadReport(TestCase):
     def setUp(self):
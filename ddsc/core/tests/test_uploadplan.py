@@ -0,0 +1,113 @@
+from unittest import TestCase
+from ddsc.core.uploadplan import UploadPlan, UploadPlanFile
+from ddsc.core.localstore import LocalProject
+from ddsc.core.shard import Shard
+from ddsc.core.util import KindType
+from mock import Mock
+import json
+import os
+import shutil
+import tempfile
+
+
+class TestUploadPlan(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+    def make_file(self, *parts):
+        path = os.path.join(self.temp_dir, *parts)
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as outfile:
+            outfile.write('data')
+        return path
+
+    def test_create(self):
+        top_file = self.make_file('top.txt')
+        inner_file = self.make_file('data', 'inner.txt')
+        local_project = LocalProject(followsymlinks=False, file_exclude_regex='')
+        local_project.add_paths([top_file, os.path.join(self.temp_dir, 'data')])
+        local_project.remote_id = 'project1'
+        local_project.children[1].remote_id = 'folder1'
+
+        plan = UploadPlan.create(local_project)
+
+        self.assertEqual(plan.project_id, 'project1')
+        self.assertEqual([plan_file.to_dict() for plan_file in plan.files], [
+            {'path': top_file, 'parent_id': 'project1'},
+            {'path': inner_file, 'parent_id': 'folder1'},
+        ])
+
+    def test_write_and_read(self):
+        path = os.path.join(self.temp_dir, 'plan.json')
+        UploadPlan('project1', [UploadPlanFile('/data/file1.txt', 'folder1')]).write(path)
+        self.assertEqual(os.listdir(self.temp_dir), ['plan.json'])
+
+        plan = UploadPlan.read(path)
+
+        self.assertEqual(plan.project_id, 'project1')
+        self.assertEqual([plan_file.to_dict() for plan_file in plan.files],
+                         [{'path': '/data/file1.txt', 'parent_id': 'folder1'}])
+
+    def test_read_unsupported_version(self):
+        path = os.path.join(self.temp_dir, 'plan.json')
+        with open(path, 'w') as outfile:
+            json.dump({'version': 99, 'project_id': 'project1', 'files': []}, outfile)
+        with self.assertRaises(ValueError):
+            UploadPlan.read(path)
+
+    def test_create_local_project(self):
+        top_file = self.make_file('top.txt')
+        inner_file1 = self.make_file('data', 'inner1.txt')
+        inner_file2 = self.make_file('data', 'inner2.txt')
+        plan = UploadPlan('project1', [
+            UploadPlanFile(top_file, 'project1'),
+            UploadPlanFile(inner_file1, 'folder1'),
+            UploadPlanFile(inner_file2, 'folder1'),
+        ])
+
+        local_project = plan.create_local_project()
+
+        self.assertEqual(local_project.remote_id, 'project1')
+        top, folder = local_project.children
+        self.assertTrue(KindType.is_file(top))
+        self.assertEqual(top.path, top_file)
+        self.assertEqual(folder.remote_id, 'folder1')
+        self.assertEqual([child.path for child in folder.children], [inner_file1, inner_file2])
+
+    def test_create_local_project_shards_are_disjoint(self):
+        paths = [self.make_file('file{}.txt'.format(i)) for i in range(20)]
+        plan = UploadPlan('project1', [UploadPlanFile(path, 'project1') for path in paths])
+
+        shard_paths = [
+            [child.path for child in plan.create_local_project(shard=Shard(index, 3)).children]
+            for index in range(1, 4)
+        ]
+
+        self.assertEqual(sorted(sum(shard_paths, [])), sorted(paths))
+
+    def test_update_remote_ids(self):
+        top_file = self.make_file('top.txt')
+        inner_file = self.make_file('data', 'inner.txt')
+        plan = UploadPlan('project1', [
+            UploadPlanFile(top_file, 'project1'),
+            UploadPlanFile(inner_file, 'folder2'),
+        ])
+        local_project = plan.create_local_project()
+        remote_top_file = Mock(kind=KindType.file_str, id='file1')
+        remote_top_file.name = 'top.txt'
+        remote_inner_file = Mock(kind=KindType.file_str, id='file2')
+        remote_inner_file.name = 'inner.txt'
+        remote_folder = Mock(kind=KindType.folder_str, id='folder2', children=[remote_inner_file])
+        remote_folder.name = 'data'
+        remote_parent_folder = Mock(kind=KindType.folder_str, id='folder1', children=[remote_folder])
+        remote_parent_folder.name = 'parent'
+        remote_project = Mock(kind=KindType.project_str, id='project1',
+                              children=[remote_top_file, remote_parent_folder])
+
+        local_project.update_remote_ids(remote_project)
+
+        top, folder = local_project.children
+        self.assertEqual(top.remote_id, 'file1')
+        self.assertEqual(folder.children[0].remote_id, 'file2')
@@ -1,7 +1,7 @@
 from unittest import TestCase
 
 from ddsc.core.util import verify_terminal_encoding, ProgressBar, ProgressPrinter, KindType, RemotePath, humanize_bytes,\
-    plural_fmt, join_with_commas_and_and
+    plural_fmt, join_with_commas_and_and, remaining_time_str
 from ddsc.exceptions import DDSUserException
 from mock import patch, Mock
 
@@ -231,6 +231,24 @@ class TestHumanizeBytes(TestCase):
             self.assertEqual(humanize_bytes(input_val), expected_result)
 
 
+class TestRemainingTimeStr(TestCase):
+    def test_remaining_time_str(self):
+        vals = [
+            # current_time, transferred_bytes, total_bytes, expected
+            (0, 100, 200, ''),  # must have elapsed time and bytes transferred to predict
+            (10, 0, 200, ''),
+            (10, 100, 100, '~0s left'),
+            (10, 100, 200, '~10s left'),
+            (10, 100, 1300, '~2m00s left'),
+            (10, 100, 100 * 60 * 6 + 100, '~1h00m left'),
+            (10, 100, 100 * 60 * 15 + 100, '~2h30m left'),
+        ]
+        for current_time, transferred_bytes, total_bytes, expected in vals:
+            result = remaining_time_str(current_time=current_time, start_time=0, transferred_bytes=transferred_bytes,
+                                        total_bytes=total_bytes)
+            self.assertEqual(result, expected)
+
+
 class TestPluralFmt(TestCase):
     def test_plural_fmt(self):
         self.assertEqual(plural_fmt("taco", 1), "1 taco")
@@ -0,0 +1,101 @@
+"""
+Shares a single auth token between the worker processes of an upload.
+Without a broker each worker claims its own new token when the token it was started with nears expiration.
+The broker runs in a process started by the parent and claims at most one new token for all of the workers.
+"""
+
+import threading
+from multiprocessing.managers import BaseManager
+from ddsc.core.ddsapi import DataServiceAuth
+
+
+class TokenBroker(object):
+    """
+    Hands out the current auth token claiming a new one when it is about to expire.
+    Requests from workers are handled one at a time so only the first worker to find an expiring token claims a new one.
+    """
+    def __init__(self, config, auth_data, token_cache=None):
+        """
+        :param config: ddsc.config.Config: settings used to claim new tokens
+        :param auth_data: (str, float): auth token and expiration returned by DataServiceAuth.get_auth_data
+        :param token_cache: TokenCache: optional saved token shared with other commands
+        """
+        self.auth = DataServiceAuth(config, token_cache=token_cache)
+        self.auth.set_auth_data(auth_data)
+        self.lock = threading.Lock()
+
+    def get_auth_data(self):
+        """
+        Return an active auth token claiming a new one if necessary.
+        :return: (str, float): auth token and expiration usable with DataServiceAuth.set_auth_data
+        """
+        with self.lock:
+            self.auth.get_auth()
+            return self.auth.get_auth_data()
+
+
+class TokenBrokerManager(BaseManager):
+    pass
+
+
+TokenBrokerManager.register('TokenBroker', TokenBroker)
+
+
+class BrokeredDataServiceAuth(DataServiceAuth):
+    """
+    DataServiceAuth used in a worker process that receives new tokens from a TokenBroker instead of claiming them.
+    """
+    def __init__(self, config, token_broker, set_status_msg=print):
+        """
+        :param config: ddsc.config.Config settings such as auth, user_key, agent_key
+        :param token_broker: TokenBroker: proxy to the broker started by the parent process
+        :param set_status_msg: func(str): show status message to user
+        """
+        super(BrokeredDataServiceAuth, self).__init__(config, set_status_msg)
+        self.token_broker = token_broker
+
+    def claim_new_token(self):
+        self.set_auth_data(self.token_broker.get_auth_data())
+
+
+def create_worker_auth(config, data_service_auth_data, token_broker=None):
+    """
+    Recreate auth within a worker process from the values returned by DataServiceAuth.get_auth_data.
+    :param config: ddsc.config.Config settings such as auth, user_key, agent_key
+    :param data_service_auth_data: (str, float): auth token and expiration from the parent process
+    :param token_broker: TokenBroker: optional proxy to a broker started with TokenBrokerProcess
+    :return: DataServiceAuth
+    """
+    if token_broker:
+        auth = BrokeredDataServiceAuth(config, token_broker)
+    else:
+        auth = DataServiceAuth(config)
+    auth.set_auth_data(data_service_auth_data)
+    return auth
+
+
+class TokenBrokerProcess(object):
+    """
+    Context manager that starts a TokenBroker process for the auth of the parent process.
+    Returns a proxy to the broker that can be passed to worker processes or None when auth never expires.
+    """
+    def __init__(self, config, auth):
+        """
+        :param config: ddsc.config.Config settings such as auth, user_key, agent_key
+        :param auth: DataServiceAuth: auth of the parent process
+        """
+        self.config = config
+        self.auth = auth
+        self.manager = None
+
+    def __enter__(self):
+        if self.auth.legacy_auth():
+            return None
+        self.manager = TokenBrokerManager()
+        self.manager.start()
+        return self.manager.TokenBroker(self.config, self.auth.get_auth_data(), self.auth.token_cache)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.manager:
+            self.manager.shutdown()
+            self.manager = None
@@ -0,0 +1,73 @@
+"""
+Auth token saved between commands so a command can reuse the token claimed by a previous command
+instead of requesting a new one from DukeDS. Tokens are only used until their expires_on time.
+"""
+
+import os
+import json
+import tempfile
+from ddsc.core.util import get_service_user_hash
+
+TOKEN_CACHE_FILENAME = '~/.ddsclient-token-cache.json'
+TOKEN_CACHE_VERSION = 1
+
+
+class TokenCache(object):
+    """
+    Saves the most recent auth token for a single DukeDS user in a file only that user can read.
+    """
+    def __init__(self, filename, owner):
+        """
+        :param filename: str: path to the token cache file
+        :param owner: str: identifies the DukeDS service and user the token was created for
+        """
+        self.filename = os.path.expanduser(filename)
+        self.owner = owner
+
+    @staticmethod
+    def create_for_config(config):
+        """
+        Create a token cache for the DukeDS service and user in config.
+        :param config: ddsc.config.Config: settings to use
+        :return: TokenCache or None when the cache is disabled
+        """
+        if config.auth_token_cache:
+            return TokenCache(TOKEN_CACHE_FILENAME, get_service_user_hash(config))
+        return None
+
+    def load(self):
+        """
+        Return the saved token ignoring files that are missing, unreadable or for a different owner.
+        The caller must check that the token hasn't expired.
+        :return: (str, float): auth token and the time it expires or None if there is no saved token
+        """
+        try:
+            with open(self.filename) as infile:
+                data = json.load(infile)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get('version') == TOKEN_CACHE_VERSION and data.get('owner') == self.owner:
+            return data['api_token'], data['expires_on']
+        return None
+
+    def save(self, auth, expires):
+        """
+        Save a token replacing the file atomically. The file is only readable by the current user.
+        Failing to save the token doesn't stop the command from running.
+        :param auth: str: auth token
+        :param expires: float: time the token expires
+        """
+        data = {
+            'version': TOKEN_CACHE_VERSION,
+            'owner': self.owner,
+            'api_token': auth,
+            'expires_on': expires,
+        }
+        try:
+            # mkstemp creates the file readable only by the current user
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.filename), suffix='.tmp')
+            with os.fdopen(fd, 'w') as outfile:
+                json.dump(data, outfile)
+            os.replace(temp_path, self.filename)
+        except (IOError, OSError):
+            pass
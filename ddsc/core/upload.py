@@ -1,8 +1,11 @@
 import datetime
 from ddsc.core.remotestore import RemoteStore
+from ddsc.core.projectindex import ProjectIndex
+from ddsc.core.tokencache import TokenCache
 from ddsc.core.util import ProgressPrinter, ProjectWalker, plural_fmt
 from ddsc.core.projectuploader import UploadSettings, ProjectUploader
 from ddsc.core.localstore import LocalProject
+from ddsc.core.uploadplan import UploadPlan
 
 
 class ProjectUpload(object):
@@ -19,7 +22,8 @@ class ProjectUpload(object):
         :param file_upload_post_processor: object: has run(data_service, file_response) method to run after uploading
         """
         self.config = config
-        self.remote_store = RemoteStore(config)
+        self.remote_store = RemoteStore(config, project_index=ProjectIndex.create_for_config(config),
+                                        token_cache=TokenCache.create_for_config(config))
         self.project_name_or_id = project_name_or_id
         self.local_project = local_project
         self.items_to_send_count = items_to_send_count
@@ -46,6 +50,30 @@ class ProjectUpload(object):
         project_uploader = ProjectUploader(upload_settings)
         project_uploader.run(self.local_project)
         progress_printer.finished()
+        self._add_project_to_index()
+
+    def create_plan(self):
+        """
+        Create the project and folders showing a progress bar and return a plan for uploading the files.
+        :return: UploadPlan: files to upload with the remote ids of their parents
+        """
+        items_to_create = self.items_to_send_count.projects + self.items_to_send_count.folders
+        progress_printer = ProgressPrinter(items_to_create, msg_verb='creating')
+        upload_settings = UploadSettings(self.config, self.remote_store.data_service, progress_printer,
+                                         self.project_name_or_id, self.file_upload_post_processor)
+        project_uploader = ProjectUploader(upload_settings)
+        project_uploader.create_project_and_folders(self.local_project)
+        progress_printer.finished()
+        self._add_project_to_index()
+        return UploadPlan.create(self.local_project)
+
+    def _add_project_to_index(self):
+        """
+        Record the project in the project index in case the upload created it.
+        """
+        if self.project_name_or_id.is_name:
+            self.remote_store.add_project_to_index(self.project_name_or_id.get_name_or_raise(),
+                                                   self.local_project.remote_id)
 
     def get_upload_report(self):
         """
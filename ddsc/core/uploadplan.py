@@ -0,0 +1,174 @@
+"""
+Upload plans let multiple hosts upload a project together. A coordinator creates the project and folders
+then writes a plan listing each file and the remote folder it belongs in. Each worker host reads the plan and
+uploads the files for its shard directly into those folders.
+"""
+
+import os
+import json
+from ddsc.core.localstore import LocalProject, LocalFolder, LocalFile, _update_remote_children
+from ddsc.core.util import ProjectWalker, KindType
+
+UPLOAD_PLAN_VERSION = 1
+
+
+class UploadPlanFile(object):
+    """
+    A file in an upload plan along with the remote id of the project or folder it should be uploaded into.
+    """
+    def __init__(self, path, parent_id):
+        """
+        :param path: str: absolute path to the file on storage shared by all hosts
+        :param parent_id: str: uuid of the remote project or folder to upload the file into
+        """
+        self.path = path
+        self.parent_id = parent_id
+
+    def to_dict(self):
+        return {'path': self.path, 'parent_id': self.parent_id}
+
+    @staticmethod
+    def from_dict(data):
+        return UploadPlanFile(data['path'], data['parent_id'])
+
+
+class UploadPlan(object):
+    """
+    List of files to upload into a project whose folders have already been created.
+    """
+    def __init__(self, project_id, files):
+        """
+        :param project_id: str: uuid of the remote project
+        :param files: [UploadPlanFile]: files to upload
+        """
+        self.project_id = project_id
+        self.files = files
+
+    @staticmethod
+    def create(local_project):
+        """
+        Create a plan for the files in local_project. The project and folders must already have remote ids.
+        :param local_project: LocalProject: project that has been created remotely
+        :return: UploadPlan
+        """
+        visitor = UploadPlanFilesVisitor()
+        ProjectWalker.walk_project(local_project, visitor)
+        return UploadPlan(local_project.remote_id, visitor.files)
+
+    @staticmethod
+    def read(path):
+        """
+        Read a plan written by write.
+        :param path: str: path to the plan file
+        :return: UploadPlan
+        """
+        with open(path) as infile:
+            data = json.load(infile)
+        if data.get('version') != UPLOAD_PLAN_VERSION:
+            raise ValueError("Unsupported upload plan version in {}.".format(path))
+        files = [UploadPlanFile.from_dict(file_data) for file_data in data['files']]
+        return UploadPlan(data['project_id'], files)
+
+    def write(self, path):
+        """
+        Write the plan to path replacing it atomically so workers never read a partial plan.
+        :param path: str: path to the plan file
+        """
+        data = {
+            'version': UPLOAD_PLAN_VERSION,
+            'project_id': self.project_id,
+            'files': [plan_file.to_dict() for plan_file in self.files],
+        }
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as outfile:
+            json.dump(data, outfile)
+        os.replace(temp_path, path)
+
+    def create_local_project(self, shard=None):
+        """
+        Create a project containing the files in this plan that belong to shard.
+        Files are grouped under LocalFolders that already have the remote id of their parent folder.
+        :param shard: Shard: only include files for this shard, None includes all files
+        :return: UploadPlanProject
+        """
+        local_project = UploadPlanProject(self.project_id)
+        parent_id_to_folder = {}
+        for plan_file in self.files:
+            if shard and not shard.includes(plan_file.path):
+                continue
+            local_file = LocalFile(plan_file.path)
+            if plan_file.parent_id == self.project_id:
+                local_project.children.append(local_file)
+            else:
+                folder = parent_id_to_folder.get(plan_file.parent_id)
+                if not folder:
+                    folder = LocalFolder(os.path.dirname(plan_file.path))
+                    folder.remote_id = plan_file.parent_id
+                    parent_id_to_folder[plan_file.parent_id] = folder
+                    local_project.children.append(folder)
+                folder.add_child(local_file)
+        return local_project
+
+
+class UploadPlanFilesVisitor(object):
+    """
+    Visitor that builds a list of UploadPlanFile for the files in a LocalProject.
+    """
+    def __init__(self):
+        self.files = []
+
+    def visit_project(self, item):
+        pass
+
+    def visit_folder(self, item, parent):
+        pass
+
+    def visit_file(self, item, parent):
+        self.files.append(UploadPlanFile(item.path, parent.remote_id))
+
+
+class UploadPlanProject(LocalProject):
+    """
+    Files from an upload plan grouped by the remote folder they will be uploaded into.
+    Folders are direct children of the project regardless of their depth in the remote project.
+    """
+    def __init__(self, project_id):
+        """
+        :param project_id: str: uuid of the remote project
+        """
+        super(UploadPlanProject, self).__init__(followsymlinks=False, file_exclude_regex='')
+        self.remote_id = project_id
+
+    def update_remote_ids(self, remote_project):
+        """
+        Save the remote ids of files that already exist in their remote folder so they are only uploaded
+        if they have changed. Folders are matched by id since they don't have their remote parents.
+        :param remote_project: RemoteProject project to compare against
+        """
+        if remote_project:
+            visitor = RemoteParentsVisitor()
+            ProjectWalker.walk_project(remote_project, visitor)
+            project_files = [child for child in self.children if KindType.is_file(child)]
+            _update_remote_children(remote_project, project_files)
+            for child in self.children:
+                if KindType.is_folder(child):
+                    remote_folder = visitor.id_to_folder.get(child.remote_id)
+                    if remote_folder:
+                        _update_remote_children(remote_folder, child.children)
+
+
+class RemoteParentsVisitor(object):
+    """
+    Visitor that builds a lookup of folder id to RemoteFolder.
+    """
+    def __init__(self):
+        self.id_to_folder = {}
+
+    def visit_project(self, item):
+        pass
+
+    def visit_folder(self, item, parent):
+        self.id_to_folder[item.id] = item
+
+    def visit_file(self, item, parent):
+        pass
@@ -3,6 +3,7 @@ import os
 import platform
 import stat
 import time
+import hashlib
 from ddsc.exceptions import DDSUserException
 
 TERMINAL_ENCODING_NOT_UTF_ERROR = """
@@ -401,6 +402,17 @@ def mode_allows_group_or_other(st_mode):
     return (st_mode & stat.S_IRWXO or st_mode & stat.S_IRWXG) != 0
 
 
+def get_service_user_hash(config):
+    """
+    Return a value that identifies the DukeDS service and user in config without storing their keys.
+    Used to ignore files saved for a different service or user.
+    :param config: ddsc.config.Config: settings to use
+    :return: str: hex digest
+    """
+    service_user_str = '{} {} {}'.format(config.url, config.agent_key, config.user_key)
+    return hashlib.sha256(service_user_str.encode('utf-8')).hexdigest()
+
+
 class RemotePath(object):
     @staticmethod
     def add_leading_slash(path):
@@ -478,6 +490,29 @@ def transfer_speed_str(current_time, start_time, transferred_bytes):
     return ''
 
 
+def remaining_time_str(current_time, start_time, transferred_bytes, total_bytes):
+    """
+    Return the predicted time until a transfer completes based on the average transfer speed so far.
+    :param current_time: float: current time
+    :param start_time: float: starting time
+    :param transferred_bytes: int: bytes transferred
+    :param total_bytes: int: bytes that will be transferred in total
+    :return: str: end user str
+    """
+    elapsed_seconds = current_time - start_time
+    if elapsed_seconds > 0 and transferred_bytes > 0:
+        remaining_bytes = max(total_bytes - transferred_bytes, 0)
+        remaining_seconds = int(remaining_bytes * elapsed_seconds / transferred_bytes)
+        hours, seconds = divmod(remaining_seconds, 60 * 60)
+        minutes, seconds = divmod(seconds, 60)
+        if hours:
+            return '~{}h{:02d}m left'.format(hours, minutes)
+        if minutes:
+            return '~{}m{:02d}s left'.format(minutes, seconds)
+        return '~{}s left'.format(seconds)
+    return ''
+
+
 def boolean_input_prompt(message):
     if sys.version_info >= (3, 0, 0):
         result = input(message)
@@ -3,15 +3,20 @@ from __future__ import print_function, unicode_literals
 import sys
 import datetime
 import time
+from functools import partial
 from ddsc.core.d4s2 import D4S2Project, D4S2Error
 from ddsc.core.remotestore import RemoteStore, RemoteAuthRole, ProjectNameOrId
 from ddsc.core.localstore import LocalProject
 from ddsc.core.upload import ProjectUpload
+from ddsc.core.uploadplan import UploadPlan
+from ddsc.core.projectindex import ProjectIndex
+from ddsc.core.tokencache import TokenCache
+from ddsc.core.ddsapi import DataServiceAuth
 from ddsc.core.projectuploader import ProjectUploadDryRun
 from ddsc.core.consistency import ProjectChecker, DSHashMismatchError
 from ddsc.cmdparser import CommandParser, format_destination_path, replace_invalid_path_chars
 from ddsc.core.util import ProjectDetailsList, verify_terminal_encoding, boolean_input_prompt, \
-    read_argument_file_contents
+    read_argument_file_contents, plural_fmt
 from ddsc.core.pathfilter import PathFilter
 from ddsc.versioncheck import check_version, VersionException, get_internal_version_str
 from ddsc.config import create_config
@@ -25,6 +30,10 @@ from ddsc.azure.commands import AzureListCommand, AzureUploadCommand, AzureAddUs
 
 NO_PROJECTS_FOUND_MESSAGE = 'No projects found.'
 INVALID_DELIVERY_RECIPIENT_MSG = 'Delivery recipient cannot be a share user. Remove recipient from --share-users and try again.'
+UPLOAD_PROJECT_REQUIRED_MSG = 'One of the arguments -p/--project-name -i/--id or --plan is required.'
+UPLOAD_FOLDERS_REQUIRED_MSG = 'Specify at least one file or folder to upload or use --plan.'
+UPLOAD_SHARD_WITHOUT_PLAN_MSG = 'The --shard option can only be used with --plan.'
+UPLOAD_PLAN_ARGS_MSG = 'Do not specify a project or files/folders when uploading with --plan.'
 TWO_SECONDS = 2
 AZURE_BACKING_STORAGE = "azure"
 LEGACY_BACKING_STORAGE = "dds"
@@ -180,7 +189,8 @@ class BaseCommand(object):
         Pass in the config containing remote_store/url so we can access the remote data.
         :param config: Config global configuration for use with this command.
         """
-        self.remote_store = RemoteStore(config)
+        self.remote_store = RemoteStore(config, project_index=ProjectIndex.create_for_config(config),
+                                        token_cache=TokenCache.create_for_config(config))
         self.config = config
 
     @staticmethod
@@ -226,7 +236,9 @@ class BaseCommand(object):
 
 class ClientCommand(object):
     def __init__(self, config):
-        self.client = Client(config)
+        create_data_service_auth = partial(DataServiceAuth, token_cache=TokenCache.create_for_config(config))
+        self.client = Client(config, create_data_service_auth=create_data_service_auth,
+                             project_index=ProjectIndex.create_for_config(config))
         self.config = config
 
     def get_project_by_name_or_id(self, args):
@@ -257,6 +269,15 @@ class UploadCommand(BaseCommand):
         If content is already on remote site it will not be sent.
         :param args: Namespace arguments parsed from the command line.
         """
+        if args.plan:
+            self.run_plan(args)
+            return
+        if args.shard:
+            raise DDSUserException(UPLOAD_SHARD_WITHOUT_PLAN_MSG)
+        if not args.project_name and not args.project_id:
+            raise DDSUserException(UPLOAD_PROJECT_REQUIRED_MSG)
+        if not args.folders:
+            raise DDSUserException(UPLOAD_FOLDERS_REQUIRED_MSG)
         project_name_or_id = self.create_project_name_or_id_from_args(args)
         folders = args.folders                  # list of local files/folders to upload into the project
         follow_symlinks = args.follow_symlinks  # should we follow symlinks when traversing folders
@@ -279,25 +300,66 @@ class UploadCommand(BaseCommand):
             # Check hashes to see what needs to be uploaded
             dry_run = ProjectUploadDryRun(local_project)
             print(dry_run.get_report())
-        else:
-            # Upload files and folders
+        elif args.write_plan:
+            # Create project and folders leaving the files for hosts running upload --plan
             project_upload = ProjectUpload(self.config, project_name_or_id, local_project, items_to_send_count)
-            project_upload.run()
-
-            # Show user results of upload
-            upload_report = project_upload.get_upload_report()
-            print(upload_report.summary())
-            print()
-            if upload_report.sent_data:
-                print('\n')
-                print(upload_report.get_content())
-                print('\n')
-            print(project_upload.get_url_msg())
-            project_upload.cleanup()
-
-            # check for consistency unless user passes --no-check flag
-            if check_file_consistency:
-                self.wait_for_consistency(local_project.remote_id)
+            upload_plan = project_upload.create_plan()
+            upload_plan.write(args.write_plan)
+            print("Wrote upload plan for {} to {}.".format(plural_fmt('file', len(upload_plan.files)),
+                                                           args.write_plan))
+        else:
+            self.upload_and_report(project_name_or_id, local_project, items_to_send_count, check_file_consistency)
+
+    def run_plan(self, args):
+        """
+        Upload the files for this host's shard of a plan file into the folders created by upload --write-plan.
+        :param args: Namespace arguments parsed from the command line.
+        """
+        if args.project_name or args.project_id or args.folders:
+            raise DDSUserException(UPLOAD_PLAN_ARGS_MSG)
+        upload_plan = UploadPlan.read(args.plan)
+        local_project = upload_plan.create_local_project(shard=args.shard)
+        local_items_count = local_project.count_local_items()
+        print(local_items_count.to_str(prefix="Checking"))
+
+        project_name_or_id = ProjectNameOrId.create_from_project_id(upload_plan.project_id)
+        remote_project = self.remote_store.fetch_remote_project(project_name_or_id, must_exist=True)
+        local_project.update_remote_ids(remote_project)
+        items_to_send_count = local_project.count_items_to_send(self.config.upload_bytes_per_chunk)
+        print(items_to_send_count.to_str(local_items_count=local_items_count, prefix="Synchronizing"))
+
+        if args.dry_run:
+            dry_run = ProjectUploadDryRun(local_project)
+            print(dry_run.get_report())
+        else:
+            self.upload_and_report(project_name_or_id, local_project, items_to_send_count, args.check)
+
+    def upload_and_report(self, project_name_or_id, local_project, items_to_send_count, check_file_consistency):
+        """
+        Upload files and folders then print a report of what was sent.
+        :param project_name_or_id: ProjectNameOrId: name or id of the project we will upload files to
+        :param local_project: LocalProject: contains files and folders to upload
+        :param items_to_send_count: ItemsToSendCounter
+        :param check_file_consistency: bool: should we wait for uploaded files to be valid
+        """
+        # Upload files and folders
+        project_upload = ProjectUpload(self.config, project_name_or_id, local_project, items_to_send_count)
+        project_upload.run()
+
+        # Show user results of upload
+        upload_report = project_upload.get_upload_report()
+        print(upload_report.summary())
+        print()
+        if upload_report.sent_data:
+            print('\n')
+            print(upload_report.get_content())
+            print('\n')
+        print(project_upload.get_url_msg())
+        project_upload.cleanup()
+
+        # check for consistency unless user passes --no-check flag
+        if check_file_consistency:
+            self.wait_for_consistency(local_project.remote_id)
 
     def wait_for_consistency(self, project_id):
         client = Client(self.config)
@@ -338,7 +400,9 @@ class DownloadCommand(ClientCommand):
         if args.include_paths or args.exclude_paths:
             path_filter = PathFilter(args.include_paths, args.exclude_paths)
         destination_path = format_destination_path(folder)
-        downloader = ProjectFileDownloader(self.config, destination_path, project, path_filter=path_filter)
+        downloader = ProjectFileDownloader(self.config, destination_path, project, path_filter=path_filter,
+                                           verify=args.verify, dedupe=args.dedupe,
+                                           shard=args.shard)
         downloader.run()
 
 
@@ -518,17 +582,19 @@ class ListCommand(BaseCommand):
 
     def print_project_list_details(self, filter_auth_role, long_format):
         """
-        Prints project names to stdout for all projects or just those with the specified auth_role
+        Prints project names to stdout for all projects or just those with the specified auth_role.
+        Projects filtered by auth_role are printed as they are found.
         :param filter_auth_role: str: optional auth_role to filter project list
         """
         if filter_auth_role:
             projects_details = self.remote_store.get_projects_with_auth_role(auth_role=filter_auth_role)
         else:
             projects_details = self.remote_store.get_projects_details()
-        if projects_details:
-            for projects_detail in projects_details:
-                print(self.get_project_info_line(projects_detail, long_format))
-        else:
+        found_projects = False
+        for projects_detail in projects_details:
+            print(self.get_project_info_line(projects_detail, long_format))
+            found_projects = True
+        if not found_projects:
             print(NO_PROJECTS_FOUND_MESSAGE)
 
     @staticmethod
@@ -1,6 +1,6 @@
 import os
 from collections import OrderedDict
-from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi
+from ddsc.core.ddsapi import DataServiceAuth, DataServiceApi, DataServiceError, RequestsHttpTransport
 from ddsc.config import create_config
 from ddsc.core.remotestore import DOWNLOAD_FILE_CHUNK_SIZE, RemoteFile, ProjectFile, RemotePath
 from ddsc.core.fileuploader import FileUploadOperations, ParallelChunkProcessor, ParentData
@@ -18,14 +18,15 @@ class Client(object):
     Client that connects to the DDSConnection base on ~/.ddsclient configuration.
     This configuration can be customized by passing in a ddsc.config.Config object
     """
-    def __init__(self, config=None, create_data_service_auth=DataServiceAuth):
+    def __init__(self, config=None, create_data_service_auth=DataServiceAuth, project_index=None):
         """
         :param config: ddsc.config.Config: settings used to connect to DDSConnection
         :param create_data_service_auth: func(config): function used to create a DataServiceAuth object
+        :param project_index: ProjectIndex: optional saved index used to find projects by name
         """
         if not config:
             config = create_config()
-        self.dds_connection = DDSConnection(config, create_data_service_auth)
+        self.dds_connection = DDSConnection(config, create_data_service_auth, project_index)
 
     def get_projects(self):
         """
@@ -48,13 +49,41 @@ class Client(object):
         :param project_name: name of the project to get.
         :return: Project
         """
-        projects = [project for project in self.get_projects() if project.name == project_name]
+        project_index = self.dds_connection.project_index
+        if project_index:
+            project = self._try_get_project_using_index(project_index, project_name)
+            if project:
+                return project
+        all_projects = self.get_projects()
+        if project_index:
+            project_index.replace([(project.name, project.id) for project in all_projects])
+        projects = [project for project in all_projects if project.name == project_name]
         if not projects:
             raise ItemNotFound("No project named {} found.".format(project_name))
         if len(projects) != 1:
             raise DDSUserException("Multiple projects found with name {}.".format(project_name))
         return projects[0]
 
+    def _try_get_project_using_index(self, project_index, project_name):
+        """
+        Return the single project the index has for project_name after fetching it by id to make sure
+        it still has this name.
+        :param project_index: ProjectIndex: saved index of project names
+        :param project_name: name of the project to get.
+        :return: Project or None when the index can't be used for project_name
+        """
+        project_ids = project_index.lookup_project_ids(project_name)
+        if project_ids and len(project_ids) == 1:
+            try:
+                project = self.get_project_by_id(project_ids[0])
+            except DataServiceError as e:
+                if e.status_code in (403, 404):
+                    return None
+                raise
+            if project.name == project_name and not project.is_deleted:
+                return project
+        return None
+
     def create_project(self, name, description):
         """
         Create a new project with the specified name and description
@@ -88,32 +117,39 @@ class DDSConnection(object):
     """
     Contains methods for accessing various DDSConnection API functionality
     """
-    def __init__(self, config, create_data_service_auth=DataServiceAuth):
+    def __init__(self, config, create_data_service_auth=DataServiceAuth, project_index=None):
         """
         :param config: ddsc.config.Config: settings used to connect to DDSConnection
         :param create_data_service_auth: func(config): function used to create a DataServiceAuth object
+        :param project_index: ProjectIndex: optional saved index used to find projects by name
         """
         self.config = config
-        self.data_service = DataServiceApi(create_data_service_auth(config), config.url)
+        self.data_service = DataServiceApi(create_data_service_auth(config), config.url,
+                                           transport=RequestsHttpTransport.create_for_config(config))
+        self.project_index = project_index
 
     def close(self):
         self.data_service.close()
 
     def _create_array_response(self, resp, array_item_constructor):
         items = resp.json()['results']
+        return self._create_array_from_items(items, array_item_constructor)
+
+    def _create_array_from_items(self, items, array_item_constructor):
         return [array_item_constructor(self, data_dict) for data_dict in items]
 
     def _create_item_response(self, resp, item_constructor):
         data_dict = resp.json()
         return item_constructor(self, data_dict)
 
-    def get_projects(self):
+    def get_projects(self, exclude_response_fields=None):
         """
         Get details for all projects you have access to in DDSConnection
+        :param exclude_response_fields: str|[str]: optional ExcludeResponseFields preset or list of fields to exclude
         :return: [Project]: list of projects
         """
-        return self._create_array_response(
-            self.data_service.get_projects(),
+        return self._create_array_from_items(
+            self.data_service.get_projects_generator(exclude_response_fields=exclude_response_fields),
             Project)
 
     def get_project_by_id(self, project_id):
@@ -133,9 +169,12 @@ class DDSConnection(object):
         :param description: str: description of the project to create
         :return: Project
         """
-        return self._create_item_response(
+        project = self._create_item_response(
             self.data_service.create_project(name, description),
             Project)
+        if self.project_index:
+            self.project_index.add_project(project.name, project.id)
+        return project
 
     def delete_project(self, project_id):
         """
@@ -143,6 +182,8 @@ class DDSConnection(object):
         :param project_id: str: uuid of the project to delete
         """
         self.data_service.delete_project(project_id)
+        if self.project_index:
+            self.project_index.remove_project(project_id)
 
     def create_folder(self, folder_name, parent_kind_str, parent_uuid):
         """
@@ -164,30 +205,32 @@ class DDSConnection(object):
         """
         self.data_service.delete_folder(folder_id)
 
-    def get_project_children(self, project_id, name_contains=None):
+    def get_project_children(self, project_id, name_contains=None, exclude_response_fields=None):
         """
         Get direct files and folders of a project.
         :param project_id: str: uuid of the project to list contents
         :param name_contains: str: filter children based on a pattern
+        :param exclude_response_fields: str|[str]: optional ExcludeResponseFields preset or list of fields to exclude
         :return: [File|Folder]: list of Files/Folders contained by the project
         """
-        return self._create_array_response(
-            self.data_service.get_project_children(
-                project_id, name_contains
+        return self._create_array_from_items(
+            self.data_service.get_project_children_generator(
+                project_id, name_contains, exclude_response_fields=exclude_response_fields
             ),
             DDSConnection._folder_or_file_constructor
         )
 
-    def get_folder_children(self, folder_id, name_contains=None):
+    def get_folder_children(self, folder_id, name_contains=None, exclude_response_fields=None):
         """
         Get direct files and folders of a folder.
         :param folder_id: str: uuid of the folder
         :param name_contains: str: filter children based on a pattern
+        :param exclude_response_fields: str|[str]: optional ExcludeResponseFields preset or list of fields to exclude
         :return: File|Folder
         """
         return self._create_array_response(
             self.data_service.get_folder_children(
-                folder_id, name_contains
+                folder_id, name_contains, exclude_response_fields=exclude_response_fields
             ),
             DDSConnection._folder_or_file_constructor
         )
@@ -287,10 +330,25 @@ class DDSConnection(object):
             File
         )
 
-    def get_project_files_generator(self, project_id, page_size):
-        for project_file_dict, header_metadata in self.data_service.get_project_files_generator(project_id, page_size):
+    def get_project_files_generator(self, project_id, page_size, exclude_response_fields=None):
+        project_files = self.data_service.get_project_files_generator(
+            project_id, page_size, exclude_response_fields=exclude_response_fields)
+        for project_file_dict, header_metadata in project_files:
             yield ProjectFile(project_file_dict), header_metadata
 
+    def get_project_files_page(self, project_id, page_size, page_num, exclude_response_fields=None):
+        """
+        Fetch a single page of project files including their download urls.
+        :param project_id: str: uuid of the project
+        :param page_size: int: page size used when listing the project files
+        :param page_num: int: page number to fetch
+        :param exclude_response_fields: str|[str]: optional ExcludeResponseFields preset or list of fields to exclude
+        :return: [ProjectFile]: files on the page
+        """
+        response = self.data_service.get_project_files_page(project_id, page_size, page_num,
+                                                            exclude_response_fields=exclude_response_fields)
+        return [ProjectFile(project_file_dict) for project_file_dict in response.json()['results']]
+
     def get_file_url_dict(self, file_id):
         return self.data_service.get_file_url(file_id).json()
 
@@ -403,8 +461,11 @@ class Project(BaseResponseItem):
     def portal_url(self):
         return self.dds_connection.data_service.portal_url(self.id)
 
-    def get_project_files_generator(self, page_size):
-        return self.dds_connection.get_project_files_generator(self.id, page_size)
+    def get_project_files_generator(self, page_size, exclude_response_fields=None):
+        return self.dds_connection.get_project_files_generator(self.id, page_size, exclude_response_fields)
+
+    def get_project_files_page(self, page_size, page_num, exclude_response_fields=None):
+        return self.dds_connection.get_project_files_page(self.id, page_size, page_num, exclude_response_fields)
 
     def get_path_to_files(self):
         path_to_nodes = PathToFiles()
@@ -790,6 +851,7 @@ class UploadContext(object):
         self.upload_id = upload_id
         self.watcher = self
         self.local_file = UploadFileInfo(path_data)
+        self.token_broker = None  # each chunk upload process claims its own tokens
 
     def transferring_item(self, item, increment_amt, transferred_bytes=0):
         pass
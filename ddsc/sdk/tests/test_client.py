@@ -3,7 +3,7 @@ from ddsc.sdk.client import Client, DDSConnection, BaseResponseItem, Project, Fo
     ChildFinder, PathToFiles, ItemNotFound, ProjectSummary, REMOTE_PATH_SEP, UploadContext, UploadStatus, Upload
 from ddsc.core.util import KindType, wait_for_processes, ProgressQueue
 from ddsc.exceptions import DDSUserException
-from mock import patch, Mock, call
+from mock import patch, Mock, call, ANY
 
 
 class TestClient(TestCase):
@@ -90,6 +90,41 @@ class TestClient(TestCase):
             client.get_project_by_name('myproject')
         self.assertEqual(str(raised_exception.exception), 'Multiple projects found with name myproject.')
 
+    @patch('ddsc.sdk.client.create_config')
+    @patch('ddsc.sdk.client.DDSConnection')
+    def test_get_project_by_name__using_index(self, mock_dss_connection, mock_create_config):
+        mock_project = Mock(is_deleted=False)
+        mock_project.name = 'myproject'
+        mock_dss_connection.return_value.get_project_by_id.return_value = mock_project
+        project_index = mock_dss_connection.return_value.project_index
+        project_index.lookup_project_ids.return_value = ['123']
+
+        client = Client(project_index=project_index)
+        project = client.get_project_by_name('myproject')
+
+        self.assertEqual(project, mock_project)
+        mock_dss_connection.assert_called_with(mock_create_config.return_value, ANY, project_index)
+        mock_dss_connection.return_value.get_project_by_id.assert_called_with('123')
+        mock_dss_connection.return_value.get_projects.assert_not_called()
+
+    @patch('ddsc.sdk.client.create_config')
+    @patch('ddsc.sdk.client.DDSConnection')
+    def test_get_project_by_name__refreshes_index(self, mock_dss_connection, mock_create_config):
+        renamed_project = Mock(is_deleted=False)
+        renamed_project.name = 'otherproject'
+        mock_dss_connection.return_value.get_project_by_id.return_value = renamed_project
+        mock_project = Mock(id='456')
+        mock_project.name = 'myproject'
+        mock_dss_connection.return_value.get_projects.return_value = [mock_project]
+        project_index = mock_dss_connection.return_value.project_index
+        project_index.lookup_project_ids.return_value = ['123']
+
+        client = Client(project_index=project_index)
+        project = client.get_project_by_name('myproject')
+
+        self.assertEqual(project, mock_project)
+        project_index.replace.assert_called_with([('myproject', '456')])
+
     @patch('ddsc.sdk.client.create_config')
     @patch('ddsc.sdk.client.DDSConnection')
     def test_create_project(self, mock_dss_connection, mock_create_config):
@@ -138,16 +173,12 @@ class TestDDSConnection(TestCase):
     @patch('ddsc.sdk.client.DataServiceApi')
     @patch('ddsc.sdk.client.DataServiceAuth')
     def test_get_projects(self, mock_data_service_auth, mock_data_service_api):
-        response = Mock()
-        response.json.return_value = {
-            "results": [
-                {
-                    'id': '345',
-                    'name': 'my project'
-                }
-            ]
-        }
-        mock_data_service_api.return_value.get_projects.return_value = response
+        mock_data_service_api.return_value.get_projects_generator.return_value = [
+            {
+                'id': '345',
+                'name': 'my project'
+            }
+        ]
 
         dds_connection = DDSConnection(Mock())
         projects = dds_connection.get_projects()
@@ -198,6 +229,22 @@ class TestDDSConnection(TestCase):
 
         mock_data_service_api.return_value.delete_project.assert_called_with('678')
 
+    @patch('ddsc.sdk.client.DataServiceApi')
+    @patch('ddsc.sdk.client.DataServiceAuth')
+    def test_create_and_delete_project_update_index(self, mock_data_service_auth, mock_data_service_api):
+        mock_data_service_api.return_value.create_project.return_value.json.return_value = {
+            'id': '456',
+            'name': 'mouse'
+        }
+        project_index = Mock()
+        dds_connection = DDSConnection(Mock(), project_index=project_index)
+
+        dds_connection.create_project('mouse', 'mouse project')
+        project_index.add_project.assert_called_with('mouse', '456')
+
+        dds_connection.delete_project('456')
+        project_index.remove_project.assert_called_with('456')
+
     @patch('ddsc.sdk.client.DataServiceApi')
     @patch('ddsc.sdk.client.DataServiceAuth')
     def test_create_folder(self, mock_data_service_auth, mock_data_service_api):
@@ -230,25 +277,22 @@ class TestDDSConnection(TestCase):
     @patch('ddsc.sdk.client.DataServiceApi')
     @patch('ddsc.sdk.client.DataServiceAuth')
     def test_get_project_children(self, mock_data_service_auth, mock_data_service_api):
-        response = Mock()
-        response.json.return_value = {
-            'results': [
-                {
-                    'id': '456',
-                    'name': 'mouse',
-                    'kind': KindType.folder_str,
-                    'project': {
-                        'id': '123'
-                    }
+        mock_data_service_api.return_value.get_project_children_generator.return_value = [
+            {
+                'id': '456',
+                'name': 'mouse',
+                'kind': KindType.folder_str,
+                'project': {
+                    'id': '123'
                 }
-            ]
-        }
-        mock_data_service_api.return_value.get_project_children.return_value = response
+            }
+        ]
 
         dds_connection = DDSConnection(Mock())
         children = dds_connection.get_project_children('123')
 
-        mock_data_service_api.return_value.get_project_children.assert_called_with('123', None)
+        mock_data_service_api.return_value.get_project_children_generator.assert_called_with(
+            '123', None, exclude_response_fields=None)
         self.assertEqual(len(children), 1)
         self.assertEqual(children[0].id, '456')
         self.assertEqual(children[0].name, 'mouse')
@@ -275,7 +319,7 @@ class TestDDSConnection(TestCase):
         dds_connection = DDSConnection(Mock())
         children = dds_connection.get_folder_children('123')
 
-        mock_data_service_api.return_value.get_folder_children.assert_called_with('123', None)
+        mock_data_service_api.return_value.get_folder_children.assert_called_with('123', None, exclude_response_fields=None)
         self.assertEqual(len(children), 1)
         self.assertEqual(children[0].id, '456')
         self.assertEqual(children[0].name, 'mouse')
@@ -446,7 +490,20 @@ class TestDDSConnection(TestCase):
             call({'id': '123'}),
             call({'id': '456'}),
         ])
-        mock_data_service_api.return_value.get_project_files_generator.assert_called_with('123', 10)
+        mock_data_service_api.return_value.get_project_files_generator.assert_called_with('123', 10, exclude_response_fields=None)
+
+    @patch('ddsc.sdk.client.DataServiceApi')
+    @patch('ddsc.sdk.client.DataServiceAuth')
+    @patch('ddsc.sdk.client.ProjectFile')
+    def test_get_project_files_page(self, mock_project_file, mock_data_service_auth, mock_data_service_api):
+        mock_data_service_api.return_value.get_project_files_page.return_value.json.return_value = {
+            'results': [{'id': '123'}]
+        }
+        dds_connection = DDSConnection(Mock())
+        project_files = dds_connection.get_project_files_page(project_id='456', page_size=10, page_num=2)
+        self.assertEqual(project_files, [mock_project_file.return_value])
+        mock_project_file.assert_called_with({'id': '123'})
+        mock_data_service_api.return_value.get_project_files_page.assert_called_with('456', 10, 2, exclude_response_fields=None)
 
 
 class TestBaseResponseItem(TestCase):
@@ -186,6 +186,15 @@ class TestCommandParser(TestCase):
         self.assertEqual(['download'], list(command_parser.subparsers.choices.keys()))
         command_parser.run_command(['download', '-p', 'mouse'])
         self.assertEqual('mouse', self.parsed_args.project_name)
+        self.assertEqual(False, self.parsed_args.verify)
+        command_parser.run_command(['download', '-p', 'mouse', '--verify'])
+        self.assertEqual(True, self.parsed_args.verify)
+        self.assertEqual(False, self.parsed_args.dedupe)
+        command_parser.run_command(['download', '-p', 'mouse', '--dedupe'])
+        self.assertEqual(True, self.parsed_args.dedupe)
+        self.assertEqual(None, self.parsed_args.shard)
+        command_parser.run_command(['download', '-p', 'mouse', '--shard', '2/4'])
+        self.assertEqual('2/4', str(self.parsed_args.shard))
 
     def test_register_move_command(self):
         command_parser = CommandParser(version_str='1.0')
@@ -247,3 +256,16 @@ class TestCommandParser(TestCase):
         self.assertEqual(None, self.parsed_args.project_id)
         self.assertEqual(['/tmp'], self.parsed_args.folders)
         self.assertEqual(False, self.parsed_args.check)
+
+    def test_register_upload_command_plan(self):
+        command_parser = CommandParser(version_str='1.0')
+        command_parser.register_upload_command(self.set_parsed_args)
+        command_parser.run_command(['upload', '-p', 'myproj', '/tmp', '--write-plan', '/tmp/plan.json'])
+        self.assertEqual('/tmp/plan.json', self.parsed_args.write_plan)
+        self.assertEqual(None, self.parsed_args.plan)
+        self.assertEqual(None, self.parsed_args.shard)
+        command_parser.run_command(['upload', '--plan', '/tmp', '--shard', '1/3'])
+        self.assertEqual('/tmp', self.parsed_args.plan)
+        self.assertEqual('1/3', str(self.parsed_args.shard))
+        self.assertEqual(None, self.parsed_args.project_name)
+        self.assertEqual([], self.parsed_args.folders)
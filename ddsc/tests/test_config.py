@@ -71,6 +71,108 @@ class TestConfig(TestCase):
         config.update_properties(some_config)
         self.assertEqual(config.upload_bytes_per_chunk, 20971520)
 
+    def test_page_lookahead(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.page_lookahead, ddsc.config.GET_PAGE_LOOKAHEAD_DEFAULT)
+        config.update_properties({'get_page_lookahead': 8})
+        self.assertEqual(config.page_lookahead, 8)
+
+    def test_get_cache_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.get_cache_ttl, ddsc.config.GET_CACHE_TTL_DEFAULT)
+        self.assertEqual(config.get_cache_size, ddsc.config.GET_CACHE_SIZE_DEFAULT)
+        config.update_properties({'get_cache_ttl': 60, 'get_cache_size': 50})
+        self.assertEqual(config.get_cache_ttl, 60)
+        self.assertEqual(config.get_cache_size, 50)
+
+    def test_project_index_ttl(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.project_index_ttl, ddsc.config.PROJECT_INDEX_TTL_DEFAULT)
+        config.update_properties({'project_index_ttl': 0})
+        self.assertEqual(config.project_index_ttl, 0)
+
+    def test_auth_token_cache(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.auth_token_cache, True)
+        config.update_properties({'auth_token_cache': False})
+        self.assertEqual(config.auth_token_cache, False)
+
+    def test_http_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.http_pool_maxsize, ddsc.config.HTTP_POOL_MAXSIZE_DEFAULT)
+        self.assertEqual(config.http_connect_timeout, ddsc.config.HTTP_CONNECT_TIMEOUT_DEFAULT)
+        self.assertEqual(config.http_read_timeout, ddsc.config.HTTP_READ_TIMEOUT_DEFAULT)
+        self.assertEqual(config.http_keep_alive, True)
+        self.assertEqual(config.http_tcp_nodelay, True)
+        self.assertEqual(config.http_socket_send_buffer_size, 0)
+        self.assertEqual(config.http_socket_receive_buffer_size, 0)
+        config.update_properties({
+            'http_pool_maxsize': 32,
+            'http_connect_timeout': 5,
+            'http_read_timeout': None,
+            'http_keep_alive': False,
+            'http_tcp_nodelay': False,
+            'http_socket_send_buffer_size': '4MB',
+            'http_socket_receive_buffer_size': '8MB',
+        })
+        self.assertEqual(config.http_pool_maxsize, 32)
+        self.assertEqual(config.http_connect_timeout, 5)
+        self.assertEqual(config.http_read_timeout, None)
+        self.assertEqual(config.http_keep_alive, False)
+        self.assertEqual(config.http_tcp_nodelay, False)
+        self.assertEqual(config.http_socket_send_buffer_size, 4 * 1024 * 1024)
+        self.assertEqual(config.http_socket_receive_buffer_size, 8 * 1024 * 1024)
+
+    def test_download_segment_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.download_split_threshold, ddsc.config.DDS_DEFAULT_DOWNLOAD_SPLIT_THRESHOLD)
+        self.assertEqual(config.download_segment_size, ddsc.config.DDS_DEFAULT_DOWNLOAD_SEGMENT_SIZE)
+        self.assertEqual(config.download_segment_workers, ddsc.config.DEFAULT_DOWNLOAD_SEGMENT_WORKERS)
+        config.update_properties({
+            'download_split_threshold': '100MB',
+            'download_segment_size': '10MB',
+            'download_segment_workers': 6,
+        })
+        self.assertEqual(config.download_split_threshold, 100 * 1024 * 1024)
+        self.assertEqual(config.download_segment_size, 10 * 1024 * 1024)
+        self.assertEqual(config.download_segment_workers, 6)
+
+    def test_download_writer_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.download_preallocate, True)
+        self.assertEqual(config.download_fsync_batch_size, ddsc.config.DEFAULT_DOWNLOAD_FSYNC_BATCH_SIZE)
+        config.update_properties({
+            'download_preallocate': False,
+            'download_fsync_batch_size': 50,
+        })
+        self.assertEqual(config.download_preallocate, False)
+        self.assertEqual(config.download_fsync_batch_size, 50)
+
+    def test_download_schedule_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.download_schedule_window, ddsc.config.DEFAULT_DOWNLOAD_SCHEDULE_WINDOW)
+        self.assertEqual(config.download_batch_size, ddsc.config.DEFAULT_DOWNLOAD_BATCH_SIZE)
+        self.assertEqual(config.download_batch_file_size, ddsc.config.DDS_DEFAULT_DOWNLOAD_BATCH_FILE_SIZE)
+        config.update_properties({
+            'download_schedule_window': 50,
+            'download_batch_size': 4,
+            'download_batch_file_size': '2MB',
+        })
+        self.assertEqual(config.download_schedule_window, 50)
+        self.assertEqual(config.download_batch_size, 4)
+        self.assertEqual(config.download_batch_file_size, 2 * 1024 * 1024)
+
+    def test_download_url_refresh_settings(self):
+        config = ddsc.config.Config()
+        self.assertEqual(config.download_url_ttl, ddsc.config.DEFAULT_DOWNLOAD_URL_TTL)
+        self.assertEqual(config.download_url_refresh_margin, ddsc.config.DEFAULT_DOWNLOAD_URL_REFRESH_MARGIN)
+        config.update_properties({
+            'download_url_ttl': 600,
+            'download_url_refresh_margin': 30,
+        })
+        self.assertEqual(config.download_url_ttl, 600)
+        self.assertEqual(config.download_url_refresh_margin, 30)
+
     def test_get_portal_url_base(self):
         config = ddsc.config.Config()
         config1 = {
@@ -3,7 +3,7 @@ from unittest import TestCase
 from ddsc.ddsclient import BaseCommand, UploadCommand, ListCommand, DownloadCommand, ClientCommand, MoveCommand
 from ddsc.ddsclient import ShareCommand, DeliverCommand, InfoCommand, read_argument_file_contents, \
     INVALID_DELIVERY_RECIPIENT_MSG, DDSClient, DeleteCommand, CheckCommand, DSHashMismatchError, \
-    AZURE_BACKING_STORAGE
+    AZURE_BACKING_STORAGE, UPLOAD_PLAN_ARGS_MSG, UPLOAD_PROJECT_REQUIRED_MSG, UPLOAD_SHARD_WITHOUT_PLAN_MSG
 from ddsc.exceptions import DDSUserException
 from mock import patch, MagicMock, Mock, call, ANY
 
@@ -100,6 +100,9 @@ class TestUploadCommand(TestCase):
         args.follow_symlinks = False
         args.dry_run = False
         args.check = True
+        args.write_plan = None
+        args.plan = None
+        args.shard = None
         cmd.run(args)
 
         mock_project_name_or_id.create_from_name.assert_called_with("test")
@@ -149,6 +152,9 @@ class TestUploadCommand(TestCase):
         args.follow_symlinks = False
         args.dry_run = False
         args.check = False
+        args.write_plan = None
+        args.plan = None
+        args.shard = None
         cmd.run(args)
         mock_client.return_value.get_project_by_id.assert_not_called()
         mock_project_checker.return_value.wait_for_consistency.assert_not_called()
@@ -171,6 +177,9 @@ class TestUploadCommand(TestCase):
         args.follow_symlinks = False
         args.dry_run = False
         args.check = True
+        args.write_plan = None
+        args.plan = None
+        args.shard = None
         cmd.run(args)
 
         mock_project_name_or_id.create_from_project_id.assert_called_with("123")
@@ -201,12 +210,108 @@ class TestUploadCommand(TestCase):
         args.follow_symlinks = False
         args.dry_run = True
         args.check = True
+        args.write_plan = None
+        args.plan = None
+        args.shard = None
         cmd.run(args)
 
         mock_local_project.assert_called_with(followsymlinks=False, file_exclude_regex=mock_config.file_exclude_regex)
         mock_project_upload_dry_run.assert_called_with(mock_local_project.return_value)
         mock_print.assert_called_with(mock_project_upload_dry_run.return_value.get_report.return_value)
 
+    @patch("ddsc.ddsclient.ProjectUpload")
+    @patch("ddsc.ddsclient.LocalProject")
+    @patch('ddsc.ddsclient.RemoteStore')
+    @patch('ddsc.ddsclient.print')
+    def test_write_plan(self, mock_print, mock_remote_store, mock_local_project, mock_project_upload):
+        mock_config = MagicMock()
+        cmd = UploadCommand(mock_config)
+        args = Mock()
+        args.project_name = "test"
+        args.project_id = None
+        args.folders = ["data"]
+        args.follow_symlinks = False
+        args.dry_run = False
+        args.check = True
+        args.write_plan = '/shared/plan.json'
+        args.plan = None
+        args.shard = None
+        mock_upload_plan = mock_project_upload.return_value.create_plan.return_value
+        mock_upload_plan.files = ['file1', 'file2']
+        cmd.run(args)
+
+        mock_upload_plan.write.assert_called_with('/shared/plan.json')
+        mock_project_upload.return_value.run.assert_not_called()
+        mock_print.assert_called_with('Wrote upload plan for 2 files to /shared/plan.json.')
+
+    @patch("ddsc.ddsclient.ProjectUpload")
+    @patch("ddsc.ddsclient.UploadPlan")
+    @patch("ddsc.ddsclient.ProjectNameOrId")
+    @patch('ddsc.ddsclient.RemoteStore')
+    @patch('ddsc.ddsclient.print')
+    def test_plan(self, mock_print, mock_remote_store, mock_project_name_or_id, mock_upload_plan,
+                  mock_project_upload):
+        mock_config = MagicMock()
+        cmd = UploadCommand(mock_config)
+        args = Mock()
+        args.project_name = None
+        args.project_id = None
+        args.folders = []
+        args.dry_run = False
+        args.check = False
+        args.write_plan = None
+        args.plan = '/shared/plan.json'
+        args.shard = Mock()
+        cmd.run(args)
+
+        mock_upload_plan.read.assert_called_with('/shared/plan.json')
+        mock_upload_plan.read.return_value.create_local_project.assert_called_with(shard=args.shard)
+        local_project = mock_upload_plan.read.return_value.create_local_project.return_value
+        mock_project_name_or_id.create_from_project_id.assert_called_with(mock_upload_plan.read.return_value.project_id)
+        local_project.update_remote_ids.assert_called_with(
+            mock_remote_store.return_value.fetch_remote_project.return_value)
+        mock_project_upload.assert_called_with(mock_config, mock_project_name_or_id.create_from_project_id.return_value,
+                                               local_project, local_project.count_items_to_send.return_value)
+        mock_project_upload.return_value.run.assert_called_with()
+
+    @patch('ddsc.ddsclient.RemoteStore')
+    def test_plan_with_project(self, mock_remote_store):
+        cmd = UploadCommand(MagicMock())
+        args = Mock()
+        args.project_name = "test"
+        args.project_id = None
+        args.folders = []
+        args.plan = '/shared/plan.json'
+        with self.assertRaises(DDSUserException) as raised_exception:
+            cmd.run(args)
+        self.assertEqual(str(raised_exception.exception), UPLOAD_PLAN_ARGS_MSG)
+
+    @patch('ddsc.ddsclient.RemoteStore')
+    def test_missing_project_or_plan(self, mock_remote_store):
+        cmd = UploadCommand(MagicMock())
+        args = Mock()
+        args.project_name = None
+        args.project_id = None
+        args.folders = ["data"]
+        args.plan = None
+        args.shard = None
+        with self.assertRaises(DDSUserException) as raised_exception:
+            cmd.run(args)
+        self.assertEqual(str(raised_exception.exception), UPLOAD_PROJECT_REQUIRED_MSG)
+
+    @patch('ddsc.ddsclient.RemoteStore')
+    def test_shard_without_plan(self, mock_remote_store):
+        cmd = UploadCommand(MagicMock())
+        args = Mock()
+        args.project_name = "test"
+        args.project_id = None
+        args.folders = ["data"]
+        args.plan = None
+        args.shard = Mock()
+        with self.assertRaises(DDSUserException) as raised_exception:
+            cmd.run(args)
+        self.assertEqual(str(raised_exception.exception), UPLOAD_SHARD_WITHOUT_PLAN_MSG)
+
 
 class TestDownloadCommand(TestCase):
     @patch('ddsc.ddsclient.Client')
@@ -219,6 +324,9 @@ class TestDownloadCommand(TestCase):
         args.include_paths = None
         args.exclude_paths = None
         args.folder = '/tmp/data'
+        args.verify = False
+        args.dedupe = False
+        args.shard = None
         cmd.run(args)
 
         mock_client.return_value.get_project_by_name.assert_called_with('mouse')
@@ -226,7 +334,10 @@ class TestDownloadCommand(TestCase):
             cmd.config,
             '/tmp/data',
             mock_client.return_value.get_project_by_name.return_value,
-            path_filter=None
+            path_filter=None,
+            verify=False,
+            dedupe=False,
+            shard=None
         )
         mock_project_file_downloader.return_value.run.assert_called()
 
@@ -240,6 +351,9 @@ class TestDownloadCommand(TestCase):
         args.include_paths = None
         args.exclude_paths = None
         args.folder = '/tmp/stuff'
+        args.verify = False
+        args.dedupe = False
+        args.shard = None
         cmd.run(args)
 
         mock_client.return_value.get_project_by_id.assert_called_with('123')
@@ -247,7 +361,10 @@ class TestDownloadCommand(TestCase):
             cmd.config,
             '/tmp/stuff',
             mock_client.return_value.get_project_by_id.return_value,
-            path_filter=None
+            path_filter=None,
+            verify=False,
+            dedupe=False,
+            shard=None
         )
         mock_project_file_downloader.return_value.run.assert_called()
 
@@ -477,6 +594,18 @@ class TestListCommand(TestCase):
         ]
         self.assertEqual(expected_calls, mock_print.call_args_list)
 
+    @patch('sys.stdout.write')
+    @patch('ddsc.ddsclient.RemoteStore')
+    def test_print_project_list_details_with_auth_role_none_found(self, mock_remote_store, mock_print):
+        mock_remote_store.return_value.get_projects_with_auth_role.return_value = iter([])
+        cmd = ListCommand(MagicMock())
+        cmd.print_project_list_details(filter_auth_role='project_admin', long_format=False)
+        expected_calls = [
+            call("No projects found."),
+            call("\n"),
+        ]
+        self.assertEqual(expected_calls, mock_print.call_args_list)
+
     @patch('sys.stdout.write')
     @patch('ddsc.ddsclient.RemoteStore')
     def test_print_project_list_details_with_auth_role_long_format(self, mock_remote_store, mock_print):